@@ -0,0 +1,76 @@
+"""
+Microbenchmark of the calls/second API can make into the nrfjprog DLL for read_u32 and write_u32. The DLL is loaded but not opened, so every call returns immediately with an error code and only the Python and ctypes overhead is measured. Compares the previous calling convention, which wrapped every argument in a new ctypes object, with calls through the declared prototypes looked up on the library and through the prototyped functions API binds once for these functions.
+
+Run with: python benchmarks/ctypes_calls.py [path to JLinkARM DLL]
+"""
+
+from __future__ import print_function
+
+import ctypes
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynrfjprog import API
+
+NUMBER = 100000
+
+
+def operations(api):
+    legacy_lib = ctypes.cdll.LoadLibrary(api._lib._name)
+    lib = api._lib
+    read_u32_thunk = api._read_u32_thunk
+    write_u32_thunk = api._write_u32_thunk
+
+    def legacy_read_u32(addr):
+        addr = ctypes.c_uint32(addr)
+        data = ctypes.c_uint32()
+        legacy_lib.NRFJPROG_read_u32(addr, ctypes.byref(data))
+        return data.value
+
+    def legacy_write_u32(addr, data, control):
+        addr = ctypes.c_uint32(addr)
+        data = ctypes.c_uint32(data)
+        control = ctypes.c_bool(control)
+        legacy_lib.NRFJPROG_write_u32(addr, data, control)
+
+    def declared_read_u32(addr):
+        data = ctypes.c_uint32()
+        lib.NRFJPROG_read_u32(addr, ctypes.byref(data))
+        return data.value
+
+    def declared_write_u32(addr, data, control):
+        lib.NRFJPROG_write_u32(addr, data, control)
+
+    def read_u32(addr):
+        data = ctypes.c_uint32()
+        read_u32_thunk(addr, ctypes.byref(data))
+        return data.value
+
+    def write_u32(addr, data, control):
+        write_u32_thunk(addr, data, bool(control))
+
+    return [
+        ('read_u32', lambda: legacy_read_u32(0x20000000), lambda: declared_read_u32(0x20000000), lambda: read_u32(0x20000000)),
+        ('write_u32', lambda: legacy_write_u32(0x20000000, 0x12345678, False), lambda: declared_write_u32(0x20000000, 0x12345678, False), lambda: write_u32(0x20000000, 0x12345678, False)),
+    ]
+
+
+def run(jlink_arm_dll_path='DUMMY', number=NUMBER):
+    api = API.API('NRF52', jlink_arm_dll_path=jlink_arm_dll_path)
+    results = []
+    for name, legacy, declared, current in operations(api):
+        legacy_s = min(timeit.repeat(legacy, number=number, repeat=3))
+        declared_s = min(timeit.repeat(declared, number=number, repeat=3))
+        current_s = min(timeit.repeat(current, number=number, repeat=3))
+        results.append({'operation': name, 'legacy_calls_per_s': number / legacy_s, 'declared_calls_per_s': number / declared_s, 'current_calls_per_s': number / current_s})
+    return results
+
+
+if __name__ == '__main__':
+    results = run(*sys.argv[1:2])
+    print('{:>12} {:>16} {:>16} {:>16} {:>8}'.format('operation', 'legacy [1/s]', 'declared [1/s]', 'bound [1/s]', 'speedup'))
+    for r in results:
+        print('{operation:>12} {legacy_calls_per_s:>16.0f} {declared_calls_per_s:>16.0f} {current_calls_per_s:>16.0f} {speedup:>7.2f}x'.format(speedup=r['current_calls_per_s'] / r['legacy_calls_per_s'], **r))
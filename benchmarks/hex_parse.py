@@ -0,0 +1,93 @@
+"""
+Benchmark of Hex.Hex parse time against the size of the hex file. Compares the current parser with the previous one, which converted every data byte with int(..., 16) into a list.
+
+Run with: python benchmarks/hex_parse.py
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynrfjprog import Hex
+
+SIZES = [256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+REPEAT = 3
+
+
+def write_hex_file(path, size, record_len=16):
+    """
+    Writes an Intel HEX file of size data bytes starting at address 0, with an extended linear address record every 64 kB.
+
+    """
+    def record(record_type, address, data):
+        rec = bytearray([len(data), (address >> 8) & 0xFF, address & 0xFF, record_type]) + data
+        rec.append((-sum(rec)) & 0xFF)
+        return ':' + ''.join('{:02X}'.format(b) for b in rec) + '\n'
+
+    payload = bytearray((i * 7) & 0xFF for i in range(record_len))
+    with open(path, 'w') as f:
+        for address in range(0, size, record_len):
+            if address % 0x10000 == 0:
+                f.write(record(Hex.EXTENDED_LINEAR_ADDRESS_RECORD, 0, bytearray([(address >> 24) & 0xFF, (address >> 16) & 0xFF])))
+            f.write(record(Hex.DATA_RECORD, address & 0xFFFF, payload))
+        f.write(record(Hex.END_OF_FILE_RECORD, 0, bytearray()))
+
+
+def legacy_parse(filename):
+    """
+    The parser used by Hex.Hex before it was rewritten, kept for comparison.
+
+    """
+    segment_list = []
+    high_address = 0
+    with open(filename) as file:
+        high_address_changed = False
+        for line in file:
+            record_type = line[7:9]
+            record_address = int(line[3:7], 16)
+            record_data = [int(line[9 + i * 2:11 + i * 2], 16) for i in range(int(line[1:3], 16))]
+            if record_type == '04':
+                high_address = record_data[0] * 0x1000000 + record_data[1] * 0x10000
+                high_address_changed = True
+            elif record_type == '02':
+                high_address = ((record_data[0] << 8) | record_data[1]) * 16
+                high_address_changed = True
+            elif record_type == '00':
+                if not segment_list or high_address_changed:
+                    segment_list.append([high_address + record_address, record_data])
+                    high_address_changed = False
+                elif segment_list[-1][0] + len(segment_list[-1][1]) == high_address + record_address:
+                    segment_list[-1][1].extend(record_data)
+                else:
+                    segment_list.append([high_address + record_address, record_data])
+    return segment_list
+
+
+def run():
+    tmp_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for size in SIZES:
+            path = os.path.join(tmp_dir, 'image_{}.hex'.format(size))
+            write_hex_file(path, size)
+
+            legacy = min(timeit.repeat(lambda: legacy_parse(path), number=1, repeat=REPEAT))
+            current = min(timeit.repeat(lambda: Hex.Hex(path), number=1, repeat=REPEAT))
+            streaming = min(timeit.repeat(lambda: sum(1 for segment in Hex.iter_segments(path)), number=1, repeat=REPEAT))
+            results.append({'size': size, 'legacy_s': legacy, 'current_s': current, 'streaming_s': streaming})
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return results
+
+
+if __name__ == '__main__':
+    print('{:>10} {:>12} {:>12} {:>12} {:>8}'.format('bytes', 'legacy [s]', 'Hex [s]', 'stream [s]', 'speedup'))
+    for r in run():
+        print('{size:>10} {legacy_s:>12.3f} {current_s:>12.3f} {streaming_s:>12.3f} {speedup:>7.1f}x'.format(speedup=r['legacy_s'] / r['current_s'], **r))
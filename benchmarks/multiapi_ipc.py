@@ -0,0 +1,142 @@
+"""
+Microbenchmark of the MultiAPI round-trip latency per method. The subprocess runs a loopback API that answers without calling the nrfjprog DLL, so only the IPC cost is measured. The previous transport, which pickled command objects through two multiprocessing queues, is included for comparison.
+
+Run with: python benchmarks/multiapi_ipc.py
+"""
+
+from __future__ import print_function
+
+import inspect
+import multiprocessing
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynrfjprog import API, MultiAPI
+
+BULK_SIZE = 64 * 1024
+
+
+class LoopbackAPI(API.API):
+    """
+    API that keeps a memory image in the subprocess instead of loading the nrfjprog DLL.
+
+    """
+    def __init__(self, *args, **kwargs):
+        self._mem = bytearray(0x100000)
+
+    def read_u32(self, addr):
+        return 0
+
+    def write_u32(self, addr, data, control):
+        pass
+
+    def write(self, addr, data, control):
+        data = self._byte_view(data) if self._byte_view(data) is not None else bytearray(data)
+        self._mem[addr:addr + len(data)] = data
+
+    def read(self, addr, data_len, as_bytes=False):
+        data = self._mem[addr:addr + data_len]
+        return data if as_bytes else list(data)
+
+    def read_into(self, addr, buf):
+        view = self._byte_view(buf)
+        view[:] = self._mem[addr:addr + len(view)]
+
+    def rtt_read(self, channel_index, length, encoding='utf-8'):
+        return bytearray(length) if encoding is None else ' ' * length
+
+
+class LoopbackMultiAPI(MultiAPI.MultiAPI):
+
+    def _api_setup(self, *args):
+        return LoopbackAPI()
+
+
+class _Command(object):
+    def __init__(self, cmd, *args):
+        self.cmd = cmd
+        self.args = args
+
+
+class _CommandAck(object):
+    def __init__(self, exception=None, result=None):
+        self.exception = exception
+        self.result = result
+
+
+def _legacy_runner(cmd_queue, ack_queue):
+    api = LoopbackAPI()
+    api_functions = dict(inspect.getmembers(api, inspect.ismethod))
+    while True:
+        cmd = cmd_queue.get()
+        try:
+            res = api_functions[cmd.cmd](*cmd.args)
+        except Exception as e:
+            ack_queue.put(_CommandAck(exception=e))
+        else:
+            ack_queue.put(_CommandAck(result=res))
+
+
+class LegacyLoopbackMultiAPI(object):
+    """
+    The queue based transport MultiAPI used before, kept for comparison.
+
+    """
+    def __init__(self):
+        self.CmdQueue = multiprocessing.Queue()
+        self.CmdAckQueue = multiprocessing.Queue()
+        self.runner = multiprocessing.Process(target=_legacy_runner, args=(self.CmdQueue, self.CmdAckQueue))
+        self.runner.daemon = True
+        self.runner.start()
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.CmdQueue.put(_Command(name, *args))
+            ack = self.CmdAckQueue.get()
+            if ack.exception is not None:
+                raise ack.exception
+            return ack.result
+        return call
+
+
+def operations(api):
+    payload = bytes(bytearray(BULK_SIZE))
+    return [
+        ('read_u32', lambda: api.read_u32(0x1000)),
+        ('write_u32', lambda: api.write_u32(0x1000, 0x12345678, False)),
+        ('read 4 B', lambda: api.read(0x1000, 4)),
+        ('rtt_read 64 B', lambda: api.rtt_read(0, 64, None)),
+        ('read 64 kB', lambda: api.read(0x0, BULK_SIZE, True)),
+        ('write 64 kB', lambda: api.write(0x0, payload, True)),
+    ]
+
+
+def measure(api, number=2000):
+    results = {}
+    for name, operation in operations(api):
+        count = number if 'kB' not in name else max(1, number // 20)
+        results[name] = min(timeit.repeat(operation, number=count, repeat=3)) / count
+    return results
+
+
+def run():
+    legacy = LegacyLoopbackMultiAPI()
+    current = LoopbackMultiAPI('NRF52')
+    try:
+        return {'legacy': measure(legacy), 'current': measure(current)}
+    finally:
+        for api in (legacy, current):
+            api.runner.terminate()
+            api.runner.join()
+
+
+if __name__ == '__main__':
+    results = run()
+    print('{:>16} {:>14} {:>14} {:>8}'.format('operation', 'legacy [us]', 'current [us]', 'speedup'))
+    for name in results['current']:
+        legacy_us = results['legacy'][name] * 1e6
+        current_us = results['current'][name] * 1e6
+        print('{:>16} {:>14.1f} {:>14.1f} {:>7.1f}x'.format(name, legacy_us, current_us, legacy_us / current_us))
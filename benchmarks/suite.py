@@ -0,0 +1,188 @@
+"""
+Benchmark suite of the hot paths of Hex, API and MultiAPI, for tracking their performance across releases. The API and MultiAPI instances use a Simulator.Simulator as backend with no simulated transfer time, so no emulator or device is needed and the times measured are the host-side work of pynrfjprog: argument checking, ctypes marshalling, the subprocess round trips of MultiAPI and the copies in and out of the simulated memory.
+
+The results are written as JSON together with the pynrfjprog and Python versions. Given the results of an earlier run as baseline, the metrics that got worse by more than the tolerance are listed and the exit status is 1.
+
+Run with: python benchmarks/suite.py [-o results.json] [--baseline baseline.json] [--tolerance 0.2]
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pynrfjprog
+from pynrfjprog import API, Hex, MultiAPI, Simulator
+
+from hex_parse import write_hex_file
+
+HEX_SIZES = [256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+MB = 1024 * 1024
+RAM_ADDR = 0x20000000
+RAM_CHUNK_SIZE = 0x10000
+RTT_READ_SIZE = 0x400
+REPEAT = 3
+
+
+def metric(name, value, unit, higher_is_better):
+    return {'name': name, 'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def best(operation, number, repeat=REPEAT):
+    """
+    Returns the shortest time [s] one call to operation took, over repeat runs of number calls.
+
+    """
+    return min(timeit.repeat(operation, number=number, repeat=repeat)) / number
+
+
+def hex_parse():
+    tmp_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for size in HEX_SIZES:
+            path = os.path.join(tmp_dir, 'image_{}.hex'.format(size))
+            write_hex_file(path, size)
+            results.append(metric('hex_parse_{}k'.format(size // 1024), best(lambda: Hex.Hex(path), 1) * 1000, 'ms', False))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def memory_transfers(api, prefix):
+    """
+    Measures 1 MB written to and read back from RAM in 64 kB calls, and the rate of read_u32() calls.
+
+    """
+    payload = bytes(bytearray(i & 0xFF for i in range(RAM_CHUNK_SIZE)))
+    buf = bytearray(RAM_CHUNK_SIZE)
+
+    def write_mb():
+        for _ in range(MB // RAM_CHUNK_SIZE):
+            api.write(RAM_ADDR, payload, False)
+
+    def read_mb():
+        for _ in range(MB // RAM_CHUNK_SIZE):
+            api.read_into(RAM_ADDR, buf)
+
+    return [
+        metric(prefix + '_write_per_mb', best(write_mb, 5) * 1000, 'ms', False),
+        metric(prefix + '_read_per_mb', best(read_mb, 5) * 1000, 'ms', False),
+        metric(prefix + '_read_u32', 1 / best(lambda: api.read_u32(RAM_ADDR), 2000), 'calls/s', True),
+    ]
+
+
+def rtt_polling(api, prefix, simulator=None):
+    """
+    Measures the rate of rtt_read() polls of an idle channel and, when the simulator is in this process, the throughput of draining a channel kept full by the target.
+
+    """
+    api.rtt_start()
+    results = [metric(prefix + '_rtt_poll_idle', 1 / best(lambda: api.rtt_read(0, RTT_READ_SIZE, None), 2000), 'polls/s', True)]
+
+    if simulator is not None:
+        chunk = bytes(bytearray(RTT_READ_SIZE - 1))
+
+        def poll_full():
+            simulator.target_rtt_write(0, chunk)
+            api.rtt_read(0, RTT_READ_SIZE, None)
+
+        results.append(metric(prefix + '_rtt_drain', len(chunk) / best(poll_full, 2000) / MB, 'MB/s', True))
+
+    api.rtt_stop()
+    return results
+
+
+def api_suite():
+    simulator = Simulator.Simulator()
+    with API.API('NRF52', backend=simulator) as api:
+        api.connect_to_emu_without_snr()
+        return memory_transfers(api, 'api') + rtt_polling(api, 'api', simulator)
+
+
+def multiapi_suite():
+    """
+    Measures the round-trip latency of one read_u32() call, the bulk throughput through the shared buffer and the rate of RTT polls, all through the subprocess.
+
+    """
+    with MultiAPI.MultiAPI('NRF52', backend=Simulator.Simulator()) as api:
+        api.connect_to_emu_without_snr()
+        results = [metric('multiapi_round_trip', best(lambda: api.read_u32(RAM_ADDR), 2000) * 1e6, 'us', False)]
+        for result in memory_transfers(api, 'multiapi'):
+            if result['unit'] == 'ms':
+                results.append(metric(result['name'].replace('_per_mb', '_throughput'), 1000 / result['value'], 'MB/s', True))
+        return results + rtt_polling(api, 'multiapi')
+
+
+def multiapi_startup():
+    """
+    Measures the time from the construction of a MultiAPI to its first call returning, i.e. the subprocess start, the import of pynrfjprog in it and the setup of its API instance.
+
+    """
+    durations = []
+    for _ in range(REPEAT):
+        start = time.time()
+        with MultiAPI.MultiAPI('NRF52', backend=Simulator.Simulator()) as api:
+            api.is_connected_to_emu()
+            durations.append(time.time() - start)
+    return [metric('multiapi_startup', min(durations) * 1000, 'ms', False)]
+
+
+def run():
+    return hex_parse() + api_suite() + multiapi_suite() + multiapi_startup()
+
+
+def regressions(results, baseline, tolerance):
+    """
+    Returns the (result, baseline value) of the metrics that are worse than in the baseline by more than the tolerance, a fraction of the baseline value.
+
+    """
+    baseline = dict((result['name'], result['value']) for result in baseline['results'])
+    worse = []
+    for result in results:
+        if result['name'] not in baseline:
+            continue
+        change = (result['value'] - baseline[result['name']]) / baseline[result['name']]
+        if (-change if result['higher_is_better'] else change) > tolerance:
+            worse.append((result, baseline[result['name']]))
+    return worse
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Runs the pynrfjprog benchmark suite against the simulator.')
+    parser.add_argument('-o', '--output', help='JSON file the results are written to.')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare the results with.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Fraction by which a metric may be worse than in the baseline. Default 0.2.')
+    args = parser.parse_args(argv)
+
+    results = run()
+
+    print('{:>28} {:>14} {:>8}'.format('metric', 'value', 'unit'))
+    for r in results:
+        print('{name:>28} {value:>14.2f} {unit:>8}'.format(**r))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'pynrfjprog': pynrfjprog.__version__, 'python': platform.python_version(), 'platform': platform.platform(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            worse = regressions(results, json.load(f), args.tolerance)
+        for result, baseline_value in worse:
+            print('Regression: {} {:.2f} {} (baseline {:.2f})'.format(result['name'], result['value'], result['unit'], baseline_value))
+        return 1 if worse else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
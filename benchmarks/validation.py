@@ -0,0 +1,64 @@
+"""
+Microbenchmark of the share of API.write() spent validating and converting its data parameter, for a 1 MB image given as bytes, bytearray, array('B') and list. The DLL is loaded but not opened, so the write itself returns immediately with an error code and the time measured is all the host-side work done before the data reaches the DLL. The previous validation, which called _is_u8() on every item, is included for comparison.
+
+Run with: python benchmarks/validation.py [path to JLinkARM DLL]
+"""
+
+from __future__ import print_function
+
+import array
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynrfjprog import API
+
+IMAGE_SIZE = 0x100000
+NUMBER = 5
+
+
+def legacy_is_valid_buf(api, buf):
+    view = api._byte_view(buf)
+    if view is not None:
+        return len(view) > 0
+    for value in buf:
+        if not api._is_u8(value):
+            return False
+    return len(buf) > 0
+
+
+def images():
+    data = bytes(bytearray(i & 0xFF for i in range(IMAGE_SIZE)))
+    return [
+        ('bytes', data),
+        ('bytearray', bytearray(data)),
+        ('array', array.array('B', data)),
+        ('list', list(bytearray(data))),
+    ]
+
+
+def write(api, data):
+    try:
+        api.write(0x0, data, True)
+    except API.APIError:
+        pass
+
+
+def run(jlink_arm_dll_path='DUMMY', number=NUMBER):
+    api = API.API('NRF52', jlink_arm_dll_path=jlink_arm_dll_path)
+    results = []
+    for name, data in images():
+        write_s = min(timeit.repeat(lambda: write(api, data), number=number, repeat=3)) / number
+        validation_s = min(timeit.repeat(lambda: api._is_valid_buf(data), number=number, repeat=3)) / number
+        legacy_s = min(timeit.repeat(lambda: legacy_is_valid_buf(api, data), number=number, repeat=3)) / number
+        results.append({'input': name, 'write_ms': write_s * 1000, 'validation_ms': validation_s * 1000, 'validation_fraction': validation_s / write_s, 'legacy_validation_ms': legacy_s * 1000})
+    return results
+
+
+if __name__ == '__main__':
+    results = run(*sys.argv[1:2])
+    print('{:>10} {:>12} {:>16} {:>10} {:>20}'.format('input', 'write [ms]', 'validation [ms]', 'fraction', 'legacy valid. [ms]'))
+    for r in results:
+        print('{input:>10} {write_ms:>12.3f} {validation_ms:>16.3f} {validation_fraction:>10.1%} {legacy_validation_ms:>20.3f}'.format(**r))
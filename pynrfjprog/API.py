@@ -8,16 +8,23 @@ from __future__ import print_function
 
 from builtins import int
 
+import array
 import codecs
+import collections
 import ctypes
 import enum
 import os
+import struct
 import sys
+import time
+import zlib
 
 try:
     from . import JLink
+    from . import MemoryDump
 except Exception:
     import JLink
+    import MemoryDump
 
 """
 Deprecated: Do not use, use log parameter in API constructor instead.
@@ -282,6 +289,22 @@ class CpuRegister(enum.IntEnum):
     PSP                       = 18
 
 
+class ProgramProgress(object):
+    """
+    Progress information given to the on_progress callback of program_image().
+
+    """
+    def __init__(self, bytes_done, bytes_total, elapsed):
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.elapsed = elapsed
+        self.bytes_per_second = bytes_done / elapsed if elapsed > 0 else 0.0
+        self.eta = (bytes_total - bytes_done) / self.bytes_per_second if self.bytes_per_second > 0 else None
+
+    def __repr__(self):
+        return 'ProgramProgress({}/{} bytes, {:.0f} B/s, ETA {})'.format(self.bytes_done, self.bytes_total, self.bytes_per_second, 'unknown' if self.eta is None else '{:.1f} s'.format(self.eta))
+
+
 class APIError(Exception):
     """
     nrfjprog DLL exception class, inherits from the built-in Exception class.
@@ -302,6 +325,345 @@ class APIError(Exception):
 
         Exception.__init__(self, err_str)
 
+    def __reduce__(self):
+        """
+        Pickles the error code rather than the message, so that err_code survives the trip from a MultiAPI subprocess.
+
+        """
+        return (type(self), (self.err_code,))
+
+
+class VerifyError(Exception):
+    """
+    Exception raised when data read back from the device does not match the data written, inherits from the built-in Exception class.
+
+    """
+
+    def __init__(self, address):
+        """
+        Constructs a new object.
+
+        @param int address: Start address of the first block that does not match.
+        """
+        self.address = address
+
+        Exception.__init__(self, address)
+
+    def __str__(self):
+        return 'The data read back does not match the data written, starting in the block at address 0x{:08X}.'.format(self.address)
+
+
+class ScriptError(Exception):
+    """
+    Exception raised by execute_script() when one of the steps fails, inherits from the built-in Exception class.
+
+    """
+
+    def __init__(self, index, cmd, results, error):
+        """
+        Constructs a new object.
+
+        @param int index: Index of the step that failed.
+        @param str cmd: Name of the function called by the step that failed.
+        @param list results: Results of the steps executed before the failing one.
+        @param Exception error: Exception raised by the failing step.
+        """
+        self.index = index
+        self.cmd = cmd
+        self.results = results
+        self.error = error
+
+        Exception.__init__(self, index, cmd, results, error)
+
+    def __str__(self):
+        return 'Step {} ({}) of the script failed: {}'.format(self.index, self.cmd, self.error)
+
+
+"""
+Typecode of array.array for unsigned 32-bit values on this platform.
+"""
+U32_TYPECODE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+
+"""
+Prototypes of the functions exported by the nrfjprog DLL, as declared in nrfjprogdll.h. Declared on the loaded library by API.__init__() so that ctypes converts plain Python ints and bools directly and rejects arguments of the wrong type.
+"""
+_err = ctypes.c_int
+_enum = ctypes.c_int
+_u32 = ctypes.c_uint32
+_u8 = ctypes.c_uint8
+_bool = ctypes.c_bool
+_ptr = ctypes.c_void_p
+
+NRFJPROG_PROTOTYPES = {
+    'NRFJPROG_dll_version': (_err, [_ptr, _ptr, _ptr]),
+    'NRFJPROG_is_dll_open': (_err, [_ptr]),
+    'NRFJPROG_open_dll': (_err, [_ptr, _ptr, _enum]),
+    'NRFJPROG_close_dll': (None, []),
+    'NRFJPROG_enum_emu_snr': (_err, [_ptr, _u32, _ptr]),
+    'NRFJPROG_is_connected_to_emu': (_err, [_ptr]),
+    'NRFJPROG_connect_to_emu_with_snr': (_err, [_u32, _u32]),
+    'NRFJPROG_connect_to_emu_without_snr': (_err, [_u32]),
+    'NRFJPROG_read_connected_emu_snr': (_err, [_ptr]),
+    'NRFJPROG_read_connected_emu_fwstr': (_err, [_ptr, _u32]),
+    'NRFJPROG_disconnect_from_emu': (_err, []),
+    'NRFJPROG_recover': (_err, []),
+    'NRFJPROG_is_connected_to_device': (_err, [_ptr]),
+    'NRFJPROG_connect_to_device': (_err, []),
+    'NRFJPROG_disconnect_from_device': (_err, []),
+    'NRFJPROG_readback_protect': (_err, [_enum]),
+    'NRFJPROG_readback_status': (_err, [_ptr]),
+    'NRFJPROG_read_region_0_size_and_source': (_err, [_ptr, _ptr]),
+    'NRFJPROG_debug_reset': (_err, []),
+    'NRFJPROG_sys_reset': (_err, []),
+    'NRFJPROG_pin_reset': (_err, []),
+    'NRFJPROG_disable_bprot': (_err, []),
+    'NRFJPROG_erase_all': (_err, []),
+    'NRFJPROG_erase_page': (_err, [_u32]),
+    'NRFJPROG_erase_uicr': (_err, []),
+    'NRFJPROG_write_u32': (_err, [_u32, _u32, _bool]),
+    'NRFJPROG_read_u32': (_err, [_u32, _ptr]),
+    'NRFJPROG_write': (_err, [_u32, _ptr, _u32, _bool]),
+    'NRFJPROG_read': (_err, [_u32, _ptr, _u32]),
+    'NRFJPROG_is_halted': (_err, [_ptr]),
+    'NRFJPROG_halt': (_err, []),
+    'NRFJPROG_run': (_err, [_u32, _u32]),
+    'NRFJPROG_go': (_err, []),
+    'NRFJPROG_step': (_err, []),
+    'NRFJPROG_read_ram_sections_count': (_err, [_ptr]),
+    'NRFJPROG_read_ram_sections_size': (_err, [_ptr, _u32]),
+    'NRFJPROG_read_ram_sections_power_status': (_err, [_ptr, _u32]),
+    'NRFJPROG_is_ram_powered': (_err, [_ptr, _u32, _ptr, _ptr]),
+    'NRFJPROG_power_ram_all': (_err, []),
+    'NRFJPROG_unpower_ram_section': (_err, [_u32]),
+    'NRFJPROG_read_cpu_register': (_err, [_enum, _ptr]),
+    'NRFJPROG_write_cpu_register': (_err, [_enum, _u32]),
+    'NRFJPROG_read_device_version': (_err, [_ptr]),
+    'NRFJPROG_read_device_family': (_err, [_ptr]),
+    'NRFJPROG_read_debug_port_register': (_err, [_u8, _ptr]),
+    'NRFJPROG_write_debug_port_register': (_err, [_u8, _u32]),
+    'NRFJPROG_read_access_port_register': (_err, [_u8, _u8, _ptr]),
+    'NRFJPROG_write_access_port_register': (_err, [_u8, _u8, _u32]),
+    'NRFJPROG_is_rtt_started': (_err, [_ptr]),
+    'NRFJPROG_rtt_set_control_block_address': (_err, [_u32]),
+    'NRFJPROG_rtt_start': (_err, []),
+    'NRFJPROG_rtt_is_control_block_found': (_err, [_ptr]),
+    'NRFJPROG_rtt_stop': (_err, []),
+    'NRFJPROG_rtt_read': (_err, [_u32, _ptr, _u32, _ptr]),
+    'NRFJPROG_rtt_write': (_err, [_u32, _ptr, _u32, _ptr]),
+    'NRFJPROG_rtt_read_channel_count': (_err, [_ptr, _ptr]),
+    'NRFJPROG_rtt_read_channel_info': (_err, [_u32, _enum, _ptr, _u32, _ptr]),
+    'NRFJPROG_is_qspi_init': (_err, [_ptr]),
+    'NRFJPROG_qspi_init': (_err, [_bool, _ptr]),
+    'NRFJPROG_qspi_uninit': (_err, []),
+    'NRFJPROG_qspi_read': (_err, [_u32, _ptr, _u32]),
+    'NRFJPROG_qspi_write': (_err, [_u32, _ptr, _u32]),
+    'NRFJPROG_qspi_erase': (_err, [_u32, _enum]),
+    'NRFJPROG_qspi_custom': (_err, [_u8, _u8, _ptr, _ptr]),
+}
+
+
+"""
+Thumb machine code run on the device by API.verify_image(), for every ARMv6-M and ARMv7-M core. Computes the CRC32 (as zlib.crc32()) of each block of a table of {address, length, crc32} descriptors, with r0 = table address, r1 = number of descriptors and r2 = address of a 256-word CRC32 lookup table, then halts on a breakpoint:
+
+        cpsid   i
+    block_loop:
+        cmp     r1, #0
+        beq     done
+        ldr     r3, [r0, #0]
+        ldr     r4, [r0, #4]
+        movs    r5, #0
+        mvns    r5, r5
+        cmp     r4, #0
+        beq     block_end
+    byte_loop:
+        ldrb    r6, [r3]
+        adds    r3, #1
+        eors    r6, r5
+        uxtb    r6, r6
+        lsls    r6, r6, #2
+        ldr     r6, [r2, r6]
+        lsrs    r5, r5, #8
+        eors    r5, r6
+        subs    r4, #1
+        bne     byte_loop
+    block_end:
+        mvns    r5, r5
+        str     r5, [r0, #8]
+        adds    r0, #12
+        subs    r1, #1
+        b       block_loop
+    done:
+        bkpt    #0
+        b       done
+"""
+CRC32_STUB = bytes(bytearray([
+    0x72, 0xB6, 0x00, 0x29, 0x14, 0xD0, 0x03, 0x68, 0x44, 0x68, 0x00, 0x25, 0xED, 0x43, 0x00, 0x2C,
+    0x09, 0xD0, 0x1E, 0x78, 0x01, 0x33, 0x6E, 0x40, 0xF6, 0xB2, 0xB6, 0x00, 0x96, 0x59, 0x2D, 0x0A,
+    0x75, 0x40, 0x01, 0x3C, 0xF5, 0xD1, 0xED, 0x43, 0x85, 0x60, 0x0C, 0x30, 0x01, 0x39, 0xE8, 0xE7,
+    0x00, 0xBE, 0xFD, 0xE7,
+]))
+
+
+def _crc32_table():
+    table = []
+    for value in range(256):
+        for bit in range(8):
+            value = (value >> 1) ^ 0xEDB88320 if value & 1 else value >> 1
+        table.append(value)
+    return struct.pack('<256I', *table)
+
+
+"""
+Thumb machine code of the flash loader used by API.program_image() with ram_loader, for every ARMv6-M and ARMv7-M core. Programs the chunks of two alternating {state, address, length, buffer} descriptors at r0 and r0 + 16, with the addresses of the NVMC CONFIG and READY registers at r0 + 32 and r0 + 36. A descriptor in state 1 is programmed word by word, skipping erased (0xFFFFFFFF) words, and set back to state 0. Any other state ends the loader on a breakpoint:
+
+        cpsid   i
+        ldr     r1, [r0, #32]
+        movs    r2, #1
+        str     r2, [r1]
+        ldr     r7, [r0, #36]
+        movs    r6, r0
+    wait:
+        ldr     r2, [r6, #0]
+        cmp     r2, #0
+        beq     wait
+        cmp     r2, #1
+        bne     exit
+        ldr     r3, [r6, #4]
+        ldr     r4, [r6, #8]
+        ldr     r5, [r6, #12]
+        adds    r4, r5, r4
+    word_loop:
+        cmp     r5, r4
+        beq     chunk_done
+        ldr     r2, [r5]
+        adds    r5, #4
+        adds    r1, r2, #1
+        beq     next_word
+        str     r2, [r3]
+    wait_ready:
+        ldr     r1, [r7]
+        cmp     r1, #0
+        beq     wait_ready
+    next_word:
+        adds    r3, #4
+        b       word_loop
+    chunk_done:
+        movs    r2, #0
+        str     r2, [r6, #0]
+        cmp     r6, r0
+        bne     first
+        adds    r6, #16
+        b       wait
+    first:
+        movs    r6, r0
+        b       wait
+    exit:
+        ldr     r1, [r0, #32]
+        movs    r2, #0
+        str     r2, [r1]
+        bkpt    #0
+    halt:
+        b       halt
+"""
+FLASH_LOADER_STUB = bytes(bytearray([
+    0x72, 0xB6, 0x01, 0x6A, 0x01, 0x22, 0x0A, 0x60, 0x47, 0x6A, 0x06, 0x00, 0x32, 0x68, 0x00, 0x2A,
+    0xFC, 0xD0, 0x01, 0x2A, 0x17, 0xD1, 0x73, 0x68, 0xB4, 0x68, 0xF5, 0x68, 0x2C, 0x19, 0xA5, 0x42,
+    0x09, 0xD0, 0x2A, 0x68, 0x04, 0x35, 0x51, 0x1C, 0x03, 0xD0, 0x1A, 0x60, 0x39, 0x68, 0x00, 0x29,
+    0xFC, 0xD0, 0x04, 0x33, 0xF3, 0xE7, 0x00, 0x22, 0x32, 0x60, 0x86, 0x42, 0x01, 0xD1, 0x10, 0x36,
+    0xE4, 0xE7, 0x06, 0x00, 0xE2, 0xE7, 0x01, 0x6A, 0x00, 0x22, 0x0A, 0x60, 0x00, 0xBE, 0xFE, 0xE7,
+]))
+
+
+class _FlashLoader(object):
+    """
+    Streams code flash chunks to FLASH_LOADER_STUB running on the device. Each chunk is written into one of two RAM buffers while the loader programs the other one, so the transfer over SWD and the flash write time overlap and the NVMC is never driven word by word over SWD.
+
+    """
+    _NVMC_CONFIG_ADDR = 0x4001E504
+    _NVMC_READY_ADDR = 0x4001E400
+    _DESCRIPTORS_OFFSET = 0x50
+    _BUFFERS_OFFSET = 0x78
+    _STACK_SIZE = 0x40
+
+    _STATE_EMPTY = 0
+    _STATE_FULL = 1
+    _STATE_EXIT = 2
+
+    def __init__(self, api, ram_addr, chunk_size, timeout):
+        buffer_size = chunk_size + 6
+        buffer_size += (-buffer_size) % 4
+
+        self._api = api
+        self._ram_addr = ram_addr
+        self._timeout = timeout
+        self._descriptors = [ram_addr + self._DESCRIPTORS_OFFSET, ram_addr + self._DESCRIPTORS_OFFSET + 16]
+        self._buffers = [ram_addr + self._BUFFERS_OFFSET, ram_addr + self._BUFFERS_OFFSET + buffer_size]
+        self._sp = self._buffers[1] + buffer_size + self._STACK_SIZE
+        self._sp += (-self._sp) % 8
+        self._index = 0
+        self._running = False
+
+    @property
+    def ram_end(self):
+        return self._sp
+
+    def start(self):
+        self._api.halt()
+        self._api.write(self._ram_addr, FLASH_LOADER_STUB, False)
+        self._api.write(self._descriptors[0], struct.pack('<10I', self._STATE_EMPTY, 0, 0, self._buffers[0], self._STATE_EMPTY, 0, 0, self._buffers[1], self._NVMC_CONFIG_ADDR, self._NVMC_READY_ADDR), False)
+        self._api.write_cpu_register(CpuRegister.R0, self._descriptors[0])
+        self._api.run(self._ram_addr, self._sp)
+        self._index = 0
+        self._running = True
+
+    def write(self, address, data):
+        """
+        Queues data to be programmed at address. The data is padded with 0xFF to whole words.
+
+        """
+        start = address - address % 4
+        end = address + len(data)
+        end += (-end) % 4
+        chunk = bytearray(b'\xFF') * (end - start)
+        chunk[address - start:address - start + len(data)] = data
+
+        descriptor = self._descriptors[self._index]
+        self._wait(lambda: self._api.read_u32(descriptor) == self._STATE_EMPTY)
+        self._api.write(self._buffers[self._index], chunk, False)
+        self._api.write(descriptor + 4, struct.pack('<II', start, len(chunk)), False)
+        self._api.write_u32(descriptor, self._STATE_FULL, False)
+        self._index ^= 1
+
+    def stop(self):
+        """
+        Waits until every queued chunk is programmed and ends the loader, leaving the CPU halted.
+
+        """
+        if not self._running:
+            return
+
+        self._wait(lambda: self._api.read_u32(self._descriptors[self._index ^ 1]) == self._STATE_EMPTY)
+        self._api.write_u32(self._descriptors[self._index], self._STATE_EXIT, False)
+        self._wait(self._api.is_halted)
+        self._running = False
+
+    def abort(self):
+        """
+        Halts the loader and disables flash writes without waiting for queued chunks.
+
+        """
+        if self._running:
+            self._running = False
+            self._api.halt()
+            self._api.write_u32(self._NVMC_CONFIG_ADDR, 0, False)
+
+    def _wait(self, condition):
+        deadline = time.time() + self._timeout
+        while not condition():
+            if time.time() > deadline:
+                raise RuntimeError('The flash loader did not respond within {} s.'.format(self._timeout))
+
 
 class API(object):
     """
@@ -311,8 +673,24 @@ class API(object):
     """
 
     _DEFAULT_JLINK_SPEED_KHZ = 2000
-
-    def __init__(self, device_family, jlink_arm_dll_path=None, log_str_cb=None, log=False, log_str=None, log_file_path=None):
+    _DEFAULT_PROGRAM_CHUNK_SIZE = 0x1000
+
+    _FICR_CODEPAGESIZE_ADDR = 0x10000010
+    _CODE_FLASH_END_ADDR = 0x10000000
+    _ENUM_LOOKUPS = {}
+    _QSPI_SECTOR_SIZE = 0x1000
+    _QSPI_ERASE_SIZES = [(0x10000, QSPIEraseLen.ERASE64KB), (0x8000, QSPIEraseLen.ERASE32KB), (0x1000, QSPIEraseLen.ERASE4KB)]
+    _DEFAULT_QSPI_CHUNK_SIZE = 0x10000
+    _DEFAULT_VERIFY_BLOCK_SIZE = 0x1000
+    _DEFAULT_STUB_RAM_ADDR = 0x20000000
+    _CRC32_STUB_TABLE_OFFSET = 0x40
+    _CRC32_STUB_BLOCKS_OFFSET = 0x440
+    _STUB_STACK_SIZE = 0x40
+    _SRAM_START = 0x20000000
+    _SRAM_END = 0x40000000
+    _FLASH_LOADER_TIMEOUT = 5.0
+
+    def __init__(self, device_family, jlink_arm_dll_path=None, log_str_cb=None, log=False, log_str=None, log_file_path=None, backend=None):
         """
         Constructor.
 
@@ -322,31 +700,40 @@ class API(object):
         @param (optional) bool log: If present and true, will enable logging to sys.stderr with the default log string appended to the beginning of each debug output line.
         @param (optional) str log_str: If present, will enable logging to sys.stderr with overwriten default log string appended to the beginning of each debug output line.
         @param (optional) str log_file_path: If present, will enable logging to log_file specified. This file will be opened in write mode in API.__init__() and closed when api.close() is called.
+        @param (optional) object backend: If present, used in place of the nrfjprog DLL, i.e. a Simulator.Simulator. Any object with the NRFJPROG_* functions of nrfjprogdll.h as attributes, also accessible by item like those of a ctypes library, is valid as input. The functions are called with the same ctypes arguments as the DLL functions.
         """
         self._device_family = None
         self._jlink_arm_dll_path = None
         self._lib = None
         self._log_str_cb = None
         self._log_file = None
+        self._rtt_up_channels = None
+        self._rtt_buffers = {}
 
         self._device_family = self._decode_enum(device_family, DeviceFamily)
         if self._device_family is None:
             raise ValueError('Parameter device_family must be of type int, str or DeviceFamily enumeration.')
 
-        if jlink_arm_dll_path is None:
+        if jlink_arm_dll_path is None and backend is None:
             jlink_arm_dll_path = JLink.find_latest_dll()
             if jlink_arm_dll_path is None:
                 raise RuntimeError('Could not locate a JLinkARM.dll in the default SEGGER installation path.')
-        else:
+        elif jlink_arm_dll_path is not None:
             if not isinstance(jlink_arm_dll_path, str):
                 raise ValueError('Parameter jlink_arm_dll_path must be a string.')
 
-        self._jlink_arm_dll_path = os.path.abspath(jlink_arm_dll_path).encode('ascii')
+        if jlink_arm_dll_path is not None:
+            self._jlink_arm_dll_path = os.path.abspath(jlink_arm_dll_path).encode('ascii')
 
         if DEBUG_OUTPUT:
             log = True
         self._log_str_cb = self._generate_log_str_cb(log_str_cb, log, log_str, log_file_path)
 
+        if backend is not None:
+            self._lib = backend
+            self._declare_prototypes()
+            return
+
         this_dir = os.path.dirname(__file__)
 
         if sys.platform.lower().startswith('win'):
@@ -378,6 +765,8 @@ class API(object):
             except Exception as error:
                 raise RuntimeError("Failed to load the NRFJPROG DLL by name: '{}.'".format(error))
 
+        self._declare_prototypes()
+
     """
     nrfjprog.DLL functions.
 
@@ -482,9 +871,6 @@ class API(object):
         if not self._is_u32(jlink_speed_khz):
             raise ValueError('The jlink_speed_khz parameter must be an unsigned 32-bit value.')
 
-        serial_number = ctypes.c_uint32(serial_number)
-        jlink_speed_khz = ctypes.c_uint32(jlink_speed_khz)
-
         result = self._lib.NRFJPROG_connect_to_emu_with_snr(serial_number, jlink_speed_khz)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -498,8 +884,6 @@ class API(object):
         if not self._is_u32(jlink_speed_khz):
             raise ValueError('The jlink_speed_khz parameter must be an unsigned 32-bit value.')
 
-        jlink_speed_khz = ctypes.c_uint32(jlink_speed_khz)
-
         result = self._lib.NRFJPROG_connect_to_emu_without_snr(jlink_speed_khz)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -596,8 +980,6 @@ class API(object):
         if desired_protection_level is None:
             raise ValueError('Parameter desired_protection_level must be of type int, str or ReadbackProtection enumeration.')
 
-        desired_protection_level = ctypes.c_int(desired_protection_level.value)
-
         result = self._lib.NRFJPROG_readback_protect(desired_protection_level)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -685,8 +1067,6 @@ class API(object):
         if not self._is_u32(addr):
             raise ValueError('The addr parameter must be an unsigned 32-bit value.')
 
-        addr = ctypes.c_uint32(addr)
-
         result = self._lib.NRFJPROG_erase_page(addr)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -717,11 +1097,7 @@ class API(object):
         if not self._is_bool(control):
             raise ValueError('The control parameter must be a boolean value.')
 
-        addr = ctypes.c_uint32(addr)
-        data = ctypes.c_uint32(data)
-        control = ctypes.c_bool(control)
-
-        result = self._lib.NRFJPROG_write_u32(addr, data, control)
+        result = self._write_u32_thunk(addr, data, bool(control))
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
@@ -735,10 +1111,9 @@ class API(object):
         if not self._is_u32(addr):
             raise ValueError('The addr parameter must be an unsigned 32-bit value.')
 
-        addr = ctypes.c_uint32(addr)
         data = ctypes.c_uint32()
 
-        result = self._lib.NRFJPROG_read_u32(addr, ctypes.byref(data))
+        result = self._read_u32_thunk(addr, ctypes.byref(data))
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
@@ -749,34 +1124,34 @@ class API(object):
         Writes data from the array into the device starting at the given address.
 
         @param int addr: Start address of the memory block to write.
-        @param sequence data: Data to write. Any type that implements the sequence API (i.e. string, list, bytearray...) is valid as input.
+        @param sequence data: Data to write. Any type that implements the sequence API (i.e. string, list, bytearray...) is valid as input. Objects that implement the buffer protocol (bytes, bytearray, memoryview, mmap, array('B'), numpy uint8 arrays...) are passed to the dll without being unpacked.
         @param boolean control: True for automatic control of NVMC by the function.
         """
         if not self._is_u32(addr):
             raise ValueError('The addr parameter must be an unsigned 32-bit value.')
 
-        if not self._is_valid_buf(data):
+        data = self._bytes_buf(data)
+        if data is None:
             raise ValueError('The data parameter must be a sequence type with at least one item.')
 
         if not self._is_bool(control):
             raise ValueError('The control parameter must be a boolean value.')
 
-        addr = ctypes.c_uint32(addr)
-        data_len = ctypes.c_uint32(len(data))
-        data = (ctypes.c_uint8 * data_len.value)(*data)
-        control = ctypes.c_bool(control)
+        data = self._to_ctypes_buf(data)
+        data_len = len(data)
 
-        result = self._lib.NRFJPROG_write(addr, ctypes.byref(data), data_len, control)
+        result = self._write_thunk(addr, ctypes.byref(data), data_len, bool(control))
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
-    def read(self, addr, data_len):
+    def read(self, addr, data_len, as_bytes=False):
         """
         Reads data_len bytes from the device starting at the given address.
 
         @param int addr: Start address of the memory block to read.
         @param int data_len: Number of bytes to read.
-        @return [int]: List of values read.
+        @param (optional) bool as_bytes: If True, the data is returned as a bytearray instead of a list of ints.
+        @return [int] or bytearray: Data read. Return type depends on as_bytes optional parameter.
         """
         if not self._is_u32(addr):
             raise ValueError('The addr parameter must be an unsigned 32-bit value.')
@@ -784,16 +1159,35 @@ class API(object):
         if not self._is_u32(data_len):
             raise ValueError('The data_len parameter must be an unsigned 32-bit value.')
 
-        addr = ctypes.c_uint32(addr)
-        data_len = ctypes.c_uint32(data_len)
-        data = (ctypes.c_uint8 * data_len.value)()
+        if not self._is_bool(as_bytes):
+            raise ValueError('The as_bytes parameter must be a boolean value.')
+
+        buf = bytearray(data_len)
+        if data_len > 0:
+            self.read_into(addr, buf)
+
+        return buf if as_bytes else list(buf)
+
+    def read_into(self, addr, buf):
+        """
+        Reads len(buf) bytes from the device starting at the given address directly into a caller provided buffer.
+
+        @param int addr: Start address of the memory block to read.
+        @param writable buffer buf: Destination of the data read. Any writable, contiguous object that implements the buffer protocol (bytearray, memoryview, mmap, array('B'), numpy uint8 arrays...) is valid as input. Its size in bytes determines the number of bytes read.
+        """
+        if not self._is_u32(addr):
+            raise ValueError('The addr parameter must be an unsigned 32-bit value.')
+
+        if not self._is_writable_buf(buf):
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
 
-        result = self._lib.NRFJPROG_read(addr, ctypes.byref(data), data_len)
+        data = self._to_ctypes_buf(buf)
+        data_len = len(data)
+
+        result = self._read_thunk(addr, ctypes.byref(data), data_len)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
-        return list(data)
-
     def is_halted(self):
         """
         Checks if the device CPU is halted.
@@ -830,9 +1224,6 @@ class API(object):
         if not self._is_u32(sp):
             raise ValueError('The sp parameter must be an unsigned 32-bit value.')
 
-        pc = ctypes.c_uint32(pc)
-        sp = ctypes.c_uint32(sp)
-
         result = self._lib.NRFJPROG_run(pc, sp)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -934,8 +1325,6 @@ class API(object):
         if not self._is_u32(section_index):
             raise ValueError('The section_index parameter must be an unsigned 32-bit value.')
 
-        section_index = ctypes.c_uint32(section_index)
-
         result = self._lib.NRFJPROG_unpower_ram_section(section_index)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -954,7 +1343,6 @@ class API(object):
         if register_name is None:
             raise ValueError('Parameter register_name must be of type int, str or CpuRegister enumeration.')
 
-        register_name = ctypes.c_int(register_name.value)
         value = ctypes.c_uint32()
 
         result = self._lib.NRFJPROG_read_cpu_register(register_name, ctypes.byref(value))
@@ -980,9 +1368,6 @@ class API(object):
         if register_name is None:
             raise ValueError('Parameter register_name must be of type int, str or CpuRegister enumeration.')
 
-        register_name = ctypes.c_int(register_name.value)
-        value = ctypes.c_uint32(value)
-
         result = self._lib.NRFJPROG_write_cpu_register(register_name, value)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -1025,10 +1410,9 @@ class API(object):
         if not self._is_u8(addr):
             raise ValueError('The addr parameter must be an unsigned 8-bit value.')
 
-        addr = ctypes.c_uint8(addr)
         data = ctypes.c_uint32()
 
-        result = self._lib.NRFJPROG_read_debug_port_register(addr, ctypes.byref(data))
+        result = self._read_debug_port_register_thunk(addr, ctypes.byref(data))
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
@@ -1047,10 +1431,7 @@ class API(object):
         if not self._is_u32(data):
             raise ValueError('The data parameter must be an unsigned 32-bit value.')
 
-        addr = ctypes.c_uint8(addr)
-        data = ctypes.c_uint32(data)
-
-        result = self._lib.NRFJPROG_write_debug_port_register(addr, data)
+        result = self._write_debug_port_register_thunk(addr, data)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
@@ -1068,11 +1449,9 @@ class API(object):
         if not self._is_u8(addr):
             raise ValueError('The addr parameter must be an unsigned 8-bit value.')
 
-        ap_index = ctypes.c_uint8(ap_index)
-        addr = ctypes.c_uint8(addr)
         data = ctypes.c_uint32()
 
-        result = self._lib.NRFJPROG_read_access_port_register(ap_index, addr, ctypes.byref(data))
+        result = self._read_access_port_register_thunk(ap_index, addr, ctypes.byref(data))
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
@@ -1095,11 +1474,7 @@ class API(object):
         if not self._is_u32(data):
             raise ValueError('The data parameter must be an unsigned 32-bit value.')
 
-        ap_index = ctypes.c_uint8(ap_index)
-        addr = ctypes.c_uint8(addr)
-        data = ctypes.c_uint32(data)
-
-        result = self._lib.NRFJPROG_write_access_port_register(ap_index, addr, data)
+        result = self._write_access_port_register_thunk(ap_index, addr, data)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
@@ -1126,8 +1501,6 @@ class API(object):
         if not self._is_u32(addr):
             raise ValueError('The address parameter must be an unsigned 32-bit value.')
 
-        addr = ctypes.c_uint32(addr)
-
         result = self._lib.NRFJPROG_rtt_set_control_block_address(addr)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -1137,6 +1510,8 @@ class API(object):
         Starts RTT.
 
         """
+        self._rtt_up_channels = None
+
         result = self._lib.NRFJPROG_rtt_start()
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -1160,6 +1535,8 @@ class API(object):
         Stops RTT.
 
         """
+        self._rtt_up_channels = None
+
         result = self._lib.NRFJPROG_rtt_stop()
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -1182,16 +1559,34 @@ class API(object):
         if encoding is not None and not self._is_valid_encoding(encoding):
             raise ValueError('The encoding parameter must be either None or a standard encoding in python.')
 
-        channel_index = ctypes.c_uint32(channel_index)
-        length = ctypes.c_uint32(length)
-        data = (ctypes.c_uint8 * length.value)()
+        data = bytearray(length)
+        if length > 0:
+            del data[self.rtt_read_into(channel_index, data):]
+
+        return data if encoding is None else data.decode(encoding).encode('utf-8') if sys.version_info[0] == 2 else data.decode(encoding)
+
+    def rtt_read_into(self, channel_index, buf):
+        """
+        Reads from an RTT channel directly into a caller provided buffer, without allocating or decoding anything.
+
+        @param int channel_index: RTT channel to read.
+        @param writable buffer buf: Destination of the data read. Any writable, contiguous object that implements the buffer protocol (bytearray, memoryview, mmap, array('B')...) is valid as input. Its size in bytes is the maximum number of bytes read.
+        @return int: Number of bytes read into the beginning of buf.
+        """
+        if not self._is_u32(channel_index):
+            raise ValueError('The channel_index parameter must be an unsigned 32-bit value.')
+
+        if not self._is_writable_buf(buf):
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
+
+        data = self._to_ctypes_buf(buf)
         data_read = ctypes.c_uint32()
 
-        result = self._lib.NRFJPROG_rtt_read(channel_index, ctypes.byref(data), length, ctypes.byref(data_read))
+        result = self._rtt_read_thunk(channel_index, ctypes.byref(data), len(data), ctypes.byref(data_read))
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
-        return bytearray(data[0:data_read.value]) if encoding is None else bytearray(data[0:data_read.value]).decode(encoding).encode('utf-8') if sys.version_info[0] == 2 else bytearray(data[0:data_read.value]).decode(encoding)
+        return data_read.value
 
     def rtt_write(self, channel_index, msg, encoding='utf-8'):
         """
@@ -1212,12 +1607,11 @@ class API(object):
         if not self._is_valid_buf(msg):
             raise ValueError('The msg parameter must be a sequence type with at least one item.')
 
-        channel_index = ctypes.c_uint32(channel_index)
-        length = ctypes.c_uint32(len(msg))
-        data = (ctypes.c_uint8 * length.value)(*msg)
+        length = len(msg)
+        data = self._to_ctypes_buf(msg)
         data_written = ctypes.c_uint32()
 
-        result = self._lib.NRFJPROG_rtt_write(channel_index, ctypes.byref(data), length, ctypes.byref(data_written))
+        result = self._rtt_write_thunk(channel_index, ctypes.byref(data), length, ctypes.byref(data_written))
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
 
@@ -1256,8 +1650,6 @@ class API(object):
         if direction is None:
             raise ValueError('Parameter direction must be of type int, str or RTTChannelDirection enumeration.')
 
-        channel_index = ctypes.c_uint32(channel_index)
-        direction = ctypes.c_int(direction.value)
         name_len = ctypes.c_uint32(32)
         name = (ctypes.c_uint8 * 32)()
         size = ctypes.c_uint32()
@@ -1268,6 +1660,37 @@ class API(object):
 
         return ''.join(chr(i) for i in name if i != 0), size.value
         
+    def rtt_up_channels(self, refresh=False):
+        """
+        Lists the RTT up channels that have a buffer. The list is read from the device once and cached until RTT is started or stopped again.
+
+        @param (optional) bool refresh: If True, the list is read from the device again.
+        @return [(int, str, int)]: List of (channel_index, name, size) tuples.
+        """
+        if self._rtt_up_channels is None or refresh:
+            down_channel_number, up_channel_number = self.rtt_read_channel_count()
+            channels = [(index,) + self.rtt_read_channel_info(index, RTTChannelDirection.UP_DIRECTION) for index in range(up_channel_number)]
+            self._rtt_up_channels = [(index, name, size) for index, name, size in channels if size > 0]
+
+        return self._rtt_up_channels
+
+    def rtt_read_all(self):
+        """
+        Drains every RTT up channel in one pass. Each channel is read into a buffer of the size of its buffer on the device, allocated once and reused, so one read takes all the data it holds.
+
+        @return {int: bytes}: Data read, by channel index. Channels without data are left out.
+        """
+        data = {}
+        for index, name, size in self.rtt_up_channels():
+            buf = self._rtt_buffers.get(index)
+            if buf is None or len(buf) != size:
+                buf = self._rtt_buffers[index] = bytearray(size)
+            length = self.rtt_read_into(index, buf)
+            if length:
+                data[index] = memoryview(buf)[:length].tobytes()
+
+        return data
+
     def is_qspi_init(self):
         """
         Checks if the QSPI peripheral is initialized.
@@ -1301,7 +1724,6 @@ class API(object):
         if init_params is None:
             init_params = QSPIInitParams()
         
-        retain_ram = ctypes.c_bool(retain_ram)
         qspi_init_params = _CtypesQSPIInitParams(init_params.read_mode, init_params.write_mode, init_params.address_mode, init_params.frequency, init_params.spi_mode, init_params.sck_delay, init_params.custom_instruction_io2_level, init_params.custom_instruction_io3_level, init_params.CSN_pin, init_params.CSN_port, init_params.SCK_pin, init_params.SCK_port, init_params.DIO0_pin, init_params.DIO0_port, init_params.DIO1_pin, init_params.DIO1_port, init_params.DIO2_pin, init_params.DIO2_port, init_params.DIO3_pin, init_params.DIO3_port, init_params.WIP_index)
         
         result = self._lib.NRFJPROG_qspi_init(retain_ram, ctypes.byref(qspi_init_params))
@@ -1331,32 +1753,68 @@ class API(object):
         if not self._is_u32(length):
             raise ValueError('The length parameter must be an unsigned 32-bit value.')
         
-        addr = ctypes.c_uint32(addr)
-        length = ctypes.c_uint32(length)
-        data = (ctypes.c_uint8 * length.value)()
-        
-        result = self._lib.NRFJPROG_qspi_read(addr, ctypes.byref(data), length)
+        data = bytearray(length)
+        if length:
+            self.qspi_read_into(addr, data)
+            
+        return data
+
+    def qspi_read_into(self, addr, buf):
+        """
+        Reads len(buf) bytes from the external QSPI-connected memory directly into a caller provided buffer.
+
+        @param int addr: Address to read from.
+        @param writable buffer buf: Destination of the data read. Any writable, contiguous object that implements the buffer protocol (bytearray, memoryview, mmap, array('B')...) is valid as input. Its size in bytes determines the number of bytes read.
+        """
+        if not self._is_u32(addr):
+            raise ValueError('The addr parameter must be an unsigned 32-bit value.')
+
+        if not self._is_writable_buf(buf):
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
+
+        data = self._to_ctypes_buf(buf)
+        data_len = len(data)
+
+        result = self._lib.NRFJPROG_qspi_read(addr, ctypes.byref(data), data_len)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
-            
-        return bytearray(data)
+
+    def qspi_read_chunks(self, addr, length, chunk_size=_DEFAULT_QSPI_CHUNK_SIZE):
+        """
+        Reads from the external QSPI-connected memory one chunk at a time, i.e. to stream a dump of the memory to a file or a hash function. Only one chunk is held in memory.
+
+        @param int addr: Address to read from.
+        @param int length: Number of bytes to read.
+        @param (optional) int chunk_size: Maximum number of bytes read with each call to the dll.
+        @return iterator: Iterator over the chunks read, as bytearrays. The same bytearray is reused for every chunk, copy it to keep a chunk after the next one is read.
+        """
+        if not self._is_u32(addr):
+            raise ValueError('The addr parameter must be an unsigned 32-bit value.')
+
+        if not self._is_u32(length) or addr + length > 0x100000000:
+            raise ValueError('The length parameter must be an unsigned 32-bit value and addr + length must not exceed the 32-bit address space.')
+
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError('The chunk_size parameter must be a positive integer.')
+
+        return self._read_chunks(self.qspi_read_into, addr, length, chunk_size)
             
     def qspi_write(self, addr, data):
         """
         Writes to the external QSPI-connected memory.
         
         @param int addr: Address to write to.
-        @param sequence data: Data to write. Any type that implements the sequence API (i.e. string, list, bytearray...) is valid as input.
+        @param sequence data: Data to write. Any type that implements the sequence API (i.e. string, list, bytearray...) is valid as input. Objects that implement the buffer protocol are passed to the dll without being unpacked.
         """
         if not self._is_u32(addr):
             raise ValueError('The addr parameter must be an unsigned 32-bit value.')
         
-        if not self._is_valid_buf(data):
+        data = self._bytes_buf(data)
+        if data is None:
             raise ValueError('The data parameter must be a sequence type with at least one item.')
         
-        addr = ctypes.c_uint32(addr)
-        data_len = ctypes.c_uint32(len(data))
-        data = (ctypes.c_uint8 * data_len.value)(*data)
+        data = self._to_ctypes_buf(data)
+        data_len = len(data)
         
         result = self._lib.NRFJPROG_qspi_write(addr, ctypes.byref(data), data_len)
         if result != NrfjprogdllErr.SUCCESS:
@@ -1379,9 +1837,6 @@ class API(object):
         if length is None:
             raise ValueError('Parameter length must be of type int, str or QSPIEraseLen enumeration.')
         
-        addr = ctypes.c_uint32(addr)
-        length = ctypes.c_int(length)
-        
         result = self._lib.NRFJPROG_qspi_erase(addr, length)
         if result != NrfjprogdllErr.SUCCESS:
             raise APIError(result)
@@ -1408,8 +1863,6 @@ class API(object):
         if not self._is_bool(output):
             raise ValueError('The output parameter must be a boolean value.')
         
-        code = ctypes.c_uint8(code)
-        length = ctypes.c_uint8(length)
         data_in = (ctypes.c_uint8 * 8)(*data_in) if data_in is not None else (ctypes.c_uint8 * 8)(*[0 for i in range(8)])
         data_out = (ctypes.c_uint8 * 8)()
         
@@ -1420,10 +1873,435 @@ class API(object):
         if output:
             return bytearray(data_out)
 
+    """
+    Higher level functions built on top of the nrfjprog.DLL functions.
+
+    """
+    def program_image(self, segments, chunk_size=_DEFAULT_PROGRAM_CHUNK_SIZE, on_progress=None, page_size=None, ram_loader=False):
+        """
+        Programs an image into the device. Only the code flash pages touched by the image are erased before the image is written in chunks that never cross a page boundary. UICR is not erased, call erase_uicr() beforehand if the image contains UICR data.
+
+        @param iterable segments: Image to program. A Hex.Hex object, any iterable of objects with address and data attributes (i.e. Hex.Segment) or of (address, data) tuples, or a bytes-like object holding an image that starts at address 0.
+        @param (optional) int chunk_size: Maximum number of bytes written with each call to the dll.
+        @param (optional) callable on_progress: If present, called after each chunk is written with a ProgramProgress object as the only parameter.
+        @param (optional) int page_size: Size of a code flash page in bytes. If not given, it is read from the FICR of the device.
+        @param (optional) bool or int ram_loader: If True, or the word-aligned RAM address to load it to, code flash is programmed by a flash loader running from RAM at 0x20000000 or the given address, which the image is streamed to in double-buffered chunks. The CPU is left halted, and its registers and the RAM used by the loader, 0xD0 bytes plus twice chunk_size, are overwritten.
+        @return int: Number of bytes written.
+        """
+        self._check_program_params(chunk_size, on_progress)
+        page_size = self._code_page_size(page_size)
+        pages, others = self._image_pages(self._image_segments(segments), page_size)
+        loader = self._flash_loader(ram_loader, chunk_size, pages)
+
+        for page in pages:
+            self.erase_page(page)
+
+        return self._program_pieces([piece for pieces in pages.values() for piece in pieces] + others, chunk_size, on_progress, loader)
+
+    def diff_program_image(self, segments, chunk_size=_DEFAULT_PROGRAM_CHUNK_SIZE, on_progress=None, page_size=None, ram_loader=False):
+        """
+        Programs an image into the device, skipping the code flash pages that already hold the expected contents. Each code flash page touched by the image is read back and compared with the image, with bytes not covered by the image expected to be erased (0xFF). Only the pages that differ are erased and written. Data outside code flash, i.e. UICR, is read back as well and only written where it differs, so that repeated runs do not use up the limited number of writes per flash word. UICR is not erased, call erase_uicr() beforehand if the image contains UICR data.
+
+        @param iterable segments: Image to program. A Hex.Hex object, any iterable of objects with address and data attributes (i.e. Hex.Segment) or of (address, data) tuples, or a bytes-like object holding an image that starts at address 0.
+        @param (optional) int chunk_size: Maximum number of bytes written with each call to the dll.
+        @param (optional) callable on_progress: If present, called after each chunk is written with a ProgramProgress object as the only parameter.
+        @param (optional) int page_size: Size of a code flash page in bytes. If not given, it is read from the FICR of the device.
+        @param (optional) bool or int ram_loader: If True, or the word-aligned RAM address to load it to, code flash is programmed by a flash loader running from RAM at 0x20000000 or the given address, which the image is streamed to in double-buffered chunks. The CPU is left halted, and its registers and the RAM used by the loader, 0xD0 bytes plus twice chunk_size, are overwritten.
+        @return (int, int): Tuple containing the number of code flash pages written and the number of code flash pages skipped.
+        """
+        self._check_program_params(chunk_size, on_progress)
+        page_size = self._code_page_size(page_size)
+        pages, others = self._image_pages(self._image_segments(segments), page_size)
+        loader = self._flash_loader(ram_loader, chunk_size, pages)
+
+        current = bytearray(page_size)
+        changed = []
+        for page, pieces in pages.items():
+            expected = bytearray(b'\xFF') * page_size
+            for address, data in pieces:
+                expected[address - page:address - page + len(data)] = data
+
+            self.read_into(page, current)
+            if current != expected:
+                changed.append(page)
+
+        changed_others = []
+        for address, data in others:
+            if len(current) != len(data):
+                current = bytearray(len(data))
+            self.read_into(address, current)
+            if current != data:
+                changed_others.append((address, data))
+
+        for page in changed:
+            self.erase_page(page)
+
+        self._program_pieces([piece for page in changed for piece in pages[page]] + changed_others, chunk_size, on_progress, loader)
+
+        return len(changed), len(pages) - len(changed)
+
+    def verify_image(self, segments, block_size=_DEFAULT_VERIFY_BLOCK_SIZE, ram_addr=_DEFAULT_STUB_RAM_ADDR, timeout=5.0):
+        """
+        Verifies that the device holds an image without reading it back. The image is split into blocks and the CPU computes the CRC32 of every block with a small routine loaded into RAM, only the checksums are read back. Blocks whose checksum differs, or all blocks if the routine does not finish in time, are then read back and compared. The CPU is halted and left halted, and its registers and the RAM used by the routine are overwritten.
+
+        @param iterable segments: Image to verify. A Hex.Hex object, any iterable of objects with address and data attributes (i.e. Hex.Segment) or of (address, data) tuples, or a bytes-like object holding an image that starts at address 0.
+        @param (optional) int block_size: Size of the blocks whose checksums are computed, in bytes. Also the granularity at which data is read back.
+        @param (optional) int ram_addr: Word-aligned address of the RAM used by the routine. 0x480 bytes plus 12 bytes per block must not overlap the image.
+        @param (optional) float timeout: Time [s] to wait for the routine to finish.
+        @raise VerifyError: The device does not hold the image.
+        """
+        if not self._is_u32(block_size) or block_size == 0:
+            raise ValueError('The block_size parameter must be a positive unsigned 32-bit value.')
+
+        if not self._is_u32(ram_addr) or ram_addr % 4:
+            raise ValueError('The ram_addr parameter must be a word-aligned unsigned 32-bit value.')
+
+        blocks = [(address + offset, data[offset:offset + block_size]) for address, data in self._image_segments(segments) for offset in range(0, len(data), block_size)]
+
+        blocks_addr = ram_addr + self._CRC32_STUB_BLOCKS_OFFSET
+        sp = blocks_addr + 12 * len(blocks) + self._STUB_STACK_SIZE
+        sp += (-sp) % 8
+        if ram_addr < self._SRAM_START or sp > self._SRAM_END:
+            raise ValueError('The RAM used by the routine must lie within the SRAM region, 0x{:08X} to 0x{:08X}.'.format(self._SRAM_START, self._SRAM_END - 1))
+
+        for address, data in blocks:
+            if address < sp and ram_addr < address + len(data):
+                raise ValueError('The RAM used by the routine overlaps the image at address 0x{:08X}.'.format(address))
+
+        self.halt()
+        self.write(ram_addr, CRC32_STUB, False)
+        self.write(ram_addr + self._CRC32_STUB_TABLE_OFFSET, _crc32_table(), False)
+        self.write(blocks_addr, struct.pack('<' + 'III' * len(blocks), *[value for address, data in blocks for value in (address, len(data), 0)]), False)
+
+        self.write_cpu_register(CpuRegister.R0, blocks_addr)
+        self.write_cpu_register(CpuRegister.R1, len(blocks))
+        self.write_cpu_register(CpuRegister.R2, ram_addr + self._CRC32_STUB_TABLE_OFFSET)
+        self.run(ram_addr, sp)
+
+        deadline = time.time() + timeout
+        while not self.is_halted():
+            if time.time() > deadline:
+                self.halt()
+                crcs = [None] * len(blocks)
+                break
+            time.sleep(0.001)
+        else:
+            table = bytearray(12 * len(blocks))
+            self.read_into(blocks_addr, table)
+            crcs = struct.unpack_from('<' + 'III' * len(blocks), table)[2::3]
+
+        current = bytearray(block_size)
+        for (address, data), crc in zip(blocks, crcs):
+            if crc == zlib.crc32(data if sys.version_info[0] != 2 else data.tobytes()) & 0xFFFFFFFF:
+                continue
+
+            if len(current) != len(data):
+                current = bytearray(len(data))
+            self.read_into(address, current)
+            if current != data:
+                raise VerifyError(address)
+
+    def read_u32_many(self, addrs):
+        """
+        Reads one uint32_t from each of the given addresses. The addresses are read in ascending order, each run of consecutive words with a single read of the whole run.
+
+        @param sequence addrs: Word-aligned addresses to read. An address may be given more than once.
+        @return array('I'): Values read, in the order of addrs.
+        """
+        addrs = list(addrs) if not isinstance(addrs, list) else addrs
+        for addr in addrs:
+            if not self._is_u32(addr) or addr % 4:
+                raise ValueError('The addrs parameter must be a sequence of word-aligned unsigned 32-bit values.')
+
+        values = {}
+        for addr, count in self._word_runs(sorted(set(addrs))):
+            if count == 1:
+                values[addr] = self.read_u32(addr)
+                continue
+
+            words = bytearray(4 * count)
+            self.read_into(addr, words)
+            values.update(zip(range(addr, addr + 4 * count, 4), struct.unpack('<{}I'.format(count), words)))
+
+        return array.array(U32_TYPECODE, [values[addr] for addr in addrs])
+
+    def write_u32_many(self, pairs, control):
+        """
+        Writes one uint32_t into each of the given addresses. The values are written in the given order, each run of pairs with consecutive word addresses with a single write of the whole run.
+
+        @param sequence pairs: (addr, data) tuples to write, with word-aligned addresses. An address given more than once is written each time, the last value is kept.
+        @param boolean control: True for automatic control of NVMC by the function.
+        """
+        pairs = list(pairs) if not isinstance(pairs, list) else pairs
+        for pair in pairs:
+            if not isinstance(pair, tuple) or len(pair) != 2 or not self._is_u32(pair[0]) or not self._is_u32(pair[1]) or pair[0] % 4:
+                raise ValueError('The pairs parameter must be a sequence of (addr, data) tuples of unsigned 32-bit values with word-aligned addresses.')
+
+        if not self._is_bool(control):
+            raise ValueError('The control parameter must be a boolean value.')
+
+        index = 0
+        for addr, count in self._word_runs([addr for addr, data in pairs]):
+            if count == 1:
+                self.write_u32(addr, pairs[index][1], control)
+            else:
+                self.write(addr, struct.pack('<{}I'.format(count), *[data for addr, data in pairs[index:index + count]]), control)
+            index += count
+
+    def dump_regions(self, path, regions, chunk_size=MemoryDump.DEFAULT_CHUNK_SIZE):
+        """
+        Reads memory regions of the device into a dump file that can be opened with MemoryDump.MemoryDump. Each chunk is read straight into the memory-mapped file, see MemoryDump.dump_regions().
+
+        @param str path: Path of the dump file. Overwritten if it exists.
+        @param sequence regions: Regions to dump. MemoryDump.Region objects or (name, address, length) tuples.
+        @param (optional) int chunk_size: Maximum number of bytes read with each call to the dll.
+        @return [MemoryDump.DumpedRegion]: Regions dumped, with their CRC32 but without their data.
+        """
+        return MemoryDump.dump_regions(self, path, regions, chunk_size)
+
+    def qspi_program_image(self, addr, data, chunk_size=_DEFAULT_QSPI_CHUNK_SIZE, on_progress=None, verify=True):
+        """
+        Programs data into the external QSPI-connected memory. The 4 kB sectors touched by the data are erased with the fewest 64 kB, 32 kB and 4 kB erases, and the bytes of those sectors outside the data are read beforehand and written back. QSPI must have been initialized with qspi_init().
+
+        @param int addr: Address to write the data to.
+        @param sequence data: Data to write. Objects that implement the buffer protocol are written without being copied as a whole.
+        @param (optional) int chunk_size: Maximum number of bytes written, and read back, with each call to the dll.
+        @param (optional) callable on_progress: If present, called after each chunk is written with a ProgramProgress object as the only parameter.
+        @param (optional) bool verify: If True, the data is read back chunk by chunk and compared, raising VerifyError on the first chunk that differs.
+        @return int: Number of bytes written, including the bytes written back around the data.
+        """
+        if not self._is_u32(addr):
+            raise ValueError('The addr parameter must be an unsigned 32-bit value.')
+
+        data = self._bytes_buf(data)
+        if data is None:
+            raise ValueError('The data parameter must be a sequence type with at least one item.')
+
+        self._check_program_params(chunk_size, on_progress)
+
+        view = self._byte_view(data)
+
+        data_end = addr + len(view)
+        start = addr - addr % self._QSPI_SECTOR_SIZE
+        end = data_end + (-data_end) % self._QSPI_SECTOR_SIZE
+        if end > 0x100000000:
+            raise ValueError('The data must fit below the 4 GB limit of the QSPI address space.')
+
+        pieces = [(addr, view)]
+        if start < addr:
+            pieces.insert(0, (start, memoryview(self.qspi_read(start, addr - start))))
+        if data_end < end:
+            pieces.append((data_end, memoryview(self.qspi_read(data_end, end - data_end))))
+
+        for erase_addr, erase_len in self._qspi_erase_plan(start, end):
+            self.qspi_erase(erase_addr, erase_len)
+
+        written = self._write_pieces(pieces, chunk_size, on_progress, self.qspi_write)
+
+        if verify:
+            offset = 0
+            for chunk in self.qspi_read_chunks(addr, len(view), chunk_size):
+                if chunk != view[offset:offset + len(chunk)]:
+                    raise VerifyError(addr + offset)
+                offset += len(chunk)
+
+        return written
+
+    def execute_script(self, steps):
+        """
+        Executes a sequence of API calls back to back, stopping at the first one that fails.
+
+        @param sequence steps: Calls to execute. Each step is a tuple with the name of an API function followed by its parameters, i.e. ('write_u32', addr, data, True).
+        @return list: Results of the steps, in order.
+        """
+        functions = []
+        for step in steps:
+            if not isinstance(step, (tuple, list)) or len(step) == 0 or not isinstance(step[0], str) or step[0].startswith('_') or step[0] == 'execute_script' or not callable(getattr(self, step[0], None)):
+                raise ValueError('Each step must be a tuple with the name of an API function followed by its parameters.')
+            functions.append(getattr(self, step[0]))
+
+        results = []
+        for index, step in enumerate(steps):
+            try:
+                results.append(functions[index](*step[1:]))
+            except Exception as error:
+                raise ScriptError(index, step[0], results, error)
+
+        return results
+
     """
     Internal helper functions.
 
     """
+    def _word_runs(self, addrs):
+        """
+        Groups a sequence of addresses into [start, count] runs of consecutive words, keeping the order of the sequence.
+
+        """
+        runs = []
+        for addr in addrs:
+            if runs and runs[-1][0] + 4 * runs[-1][1] == addr:
+                runs[-1][1] += 1
+            else:
+                runs.append([addr, 1])
+        return runs
+
+    def _image_segments(self, segments):
+        """
+        Normalizes the segments of an image into a list of (address, memoryview) tuples.
+
+        """
+        if self._byte_view(segments) is not None:
+            segments = [(0, segments)]
+
+        image = []
+        for segment in segments:
+            if isinstance(segment, tuple):
+                address, data = segment
+            else:
+                address, data = segment.address, segment.data
+
+            if not self._is_u32(address):
+                raise ValueError('The address of each segment must be an unsigned 32-bit value.')
+
+            data = self._bytes_buf(data)
+            if data is None:
+                raise ValueError('The data of each segment must be a sequence type with at least one item.')
+
+            image.append((address, self._byte_view(data)))
+
+        return image
+
+    def _image_pages(self, segments, page_size):
+        """
+        Splits the image segments at code flash page boundaries. Returns a dictionary with the start address of each code flash page touched by the image, sorted by address, mapped to the (address, memoryview) pieces of the image that fall within that page. Image data outside code flash is returned unsplit in a separate list.
+
+        """
+        pages = {}
+        others = []
+        for address, data in segments:
+            offset = 0
+            while offset < len(data) and address + offset < self._CODE_FLASH_END_ADDR:
+                piece_addr = address + offset
+                page = piece_addr - piece_addr % page_size
+                piece_len = min(len(data) - offset, page + page_size - piece_addr)
+                pages.setdefault(page, []).append((piece_addr, data[offset:offset + piece_len]))
+                offset += piece_len
+
+            if offset < len(data):
+                others.append((address + offset, data[offset:]))
+
+        return collections.OrderedDict(sorted(pages.items())), others
+
+    def _flash_loader(self, ram_loader, chunk_size, pages):
+        """
+        Returns the _FlashLoader requested by the ram_loader parameter of program_image(), or None.
+
+        """
+        if ram_loader is False or ram_loader is None:
+            return None
+
+        ram_addr = self._DEFAULT_STUB_RAM_ADDR if ram_loader is True else ram_loader
+        if not self._is_u32(ram_addr) or ram_addr % 4:
+            raise ValueError('The ram_loader parameter must be a boolean value or a word-aligned unsigned 32-bit value.')
+
+        loader = _FlashLoader(self, ram_addr, chunk_size, self._FLASH_LOADER_TIMEOUT)
+        if ram_addr < self._SRAM_START or loader.ram_end > self._SRAM_END:
+            raise ValueError('The RAM used by the flash loader must lie within the SRAM region, 0x{:08X} to 0x{:08X}.'.format(self._SRAM_START, self._SRAM_END - 1))
+
+        for address, data in [piece for pieces in pages.values() for piece in pieces]:
+            if address < loader.ram_end and ram_addr < address + len(data):
+                raise ValueError('The RAM used by the flash loader overlaps the image at address 0x{:08X}.'.format(address))
+
+        return loader
+
+    def _program_pieces(self, pieces, chunk_size, on_progress, loader):
+        """
+        Writes the pieces of an image with _write_pieces(), programming code flash through the flash loader if one is given. The pieces outside code flash come last and are written with write() once the loader has ended.
+
+        """
+        if loader is None:
+            return self._write_pieces(pieces, chunk_size, on_progress)
+
+        def write_chunk(address, data):
+            if address < self._CODE_FLASH_END_ADDR:
+                loader.write(address, data)
+            else:
+                loader.stop()
+                self.write(address, data, True)
+
+        try:
+            loader.start()
+            written = self._write_pieces(pieces, chunk_size, on_progress, write_chunk)
+            loader.stop()
+        except Exception:
+            loader.abort()
+            raise
+
+        return written
+
+    def _write_pieces(self, pieces, chunk_size, on_progress, write_chunk=None):
+        """
+        Writes (address, memoryview) pieces to the device in chunks of at most chunk_size bytes, reporting progress after every chunk. The chunks are written to code flash with write() unless another write_chunk(address, data) function is given.
+
+        """
+        if write_chunk is None:
+            write_chunk = lambda address, data: self.write(address, data, True)
+
+        bytes_total = sum(len(data) for address, data in pieces)
+        bytes_done = 0
+        start = time.time()
+
+        for address, data in pieces:
+            for offset in range(0, len(data), chunk_size):
+                chunk = data[offset:offset + chunk_size]
+                write_chunk(address + offset, chunk)
+                bytes_done += len(chunk)
+
+                if on_progress is not None:
+                    on_progress(ProgramProgress(bytes_done, bytes_total, time.time() - start))
+
+        return bytes_done
+
+    def _read_chunks(self, read_into, addr, length, chunk_size):
+        buf = bytearray(min(chunk_size, length))
+        for offset in range(0, length, chunk_size):
+            if length - offset < len(buf):
+                buf = bytearray(length - offset)
+            read_into(addr + offset, buf)
+            yield buf
+
+    def _qspi_erase_plan(self, start, end):
+        """
+        Returns the (address, QSPIEraseLen) erases that cover the sectors from start to end, using the largest aligned erase at each step.
+
+        """
+        erases = []
+        addr = start
+        while addr < end:
+            for size, erase_len in self._QSPI_ERASE_SIZES:
+                if addr % size == 0 and addr + size <= end:
+                    erases.append((addr, erase_len))
+                    addr += size
+                    break
+        return erases
+
+    def _check_program_params(self, chunk_size, on_progress):
+        if not self._is_u32(chunk_size) or chunk_size == 0:
+            raise ValueError('The chunk_size parameter must be a positive unsigned 32-bit value.')
+
+        if on_progress is not None and not callable(on_progress):
+            raise ValueError('The on_progress parameter must be callable.')
+
+    def _code_page_size(self, page_size):
+        if page_size is None:
+            page_size = self.read_u32(self._FICR_CODEPAGESIZE_ADDR)
+
+        if not self._is_u32(page_size) or page_size == 0:
+            raise ValueError('The page_size parameter must be a positive unsigned 32-bit value.')
+
+        return page_size
+
     def _generate_log_str_cb(self, log_str_cb, log, log_str, log_file):
         """
         Setup API's debug output logging mechanism.
@@ -1445,6 +2323,30 @@ class API(object):
 
             return ctypes.CFUNCTYPE(None, ctypes.c_char_p)(lambda x: print(log_str + '{}'.format(x.strip()), file=self._log_file)) if sys.version_info[0] == 2 else ctypes.CFUNCTYPE(None, ctypes.c_char_p)(lambda x: print(log_str + '{}'.format(x.strip().decode('utf-8')), file=self._log_file))
 
+    def _declare_prototypes(self):
+        """
+        Declares argtypes and restype of the nrfjprog DLL functions. Functions missing from older DLLs are left undeclared.
+
+        """
+        if isinstance(self._lib, ctypes.CDLL):
+            for name, (restype, argtypes) in NRFJPROG_PROTOTYPES.items():
+                function = getattr(self._lib, name, None)
+                if function is not None:
+                    function.restype = restype
+                    function.argtypes = argtypes
+
+        # The functions used in register, memory access and RTT polling loops are bound once, so each call skips the lookup on the library. They are the function objects declared above, so ctypes still checks and converts every argument against the prototype.
+        self._read_u32_thunk = self._lib.NRFJPROG_read_u32
+        self._write_u32_thunk = self._lib.NRFJPROG_write_u32
+        self._read_thunk = self._lib.NRFJPROG_read
+        self._write_thunk = self._lib.NRFJPROG_write
+        self._read_debug_port_register_thunk = self._lib.NRFJPROG_read_debug_port_register
+        self._write_debug_port_register_thunk = self._lib.NRFJPROG_write_debug_port_register
+        self._read_access_port_register_thunk = self._lib.NRFJPROG_read_access_port_register
+        self._write_access_port_register_thunk = self._lib.NRFJPROG_write_access_port_register
+        self._rtt_read_thunk = self._lib.NRFJPROG_rtt_read
+        self._rtt_write_thunk = self._lib.NRFJPROG_rtt_write
+
     def _is_u32(self, value):
         return isinstance(value, int) and 0 <= value <= 0xFFFFFFFF
 
@@ -1455,12 +2357,71 @@ class API(object):
         return isinstance(value, bool) or 0 <= value <= 1
 
     def _is_valid_buf(self, buf):
+        return self._bytes_buf(buf) is not None
+
+    def _bytes_buf(self, buf):
+        """
+        Returns buf if it is a buffer of bytes, a bytearray with its items if it is a sequence of unsigned 8-bit integers, or None if it is neither or empty. Validating and converting in one step means a sequence is only converted once; the result can be passed on to _to_ctypes_buf() or _byte_view() as is.
+
+        """
         if buf is None:
-            return False
-        for value in buf:
-            if not self._is_u8(value):
-                return False
-        return len(buf) > 0
+            return None
+        view = self._byte_view(buf)
+        if view is not None:
+            return buf if len(view) > 0 else None
+        data = self._sequence_bytes(buf)
+        return data if data else None
+
+    def _sequence_bytes(self, buf):
+        """
+        Returns a bytearray with the items of a sequence of unsigned 8-bit integers, or None if any item is not one. The items are converted and range checked by bytearray() in a single pass in C instead of one Python call per item.
+
+        """
+        if isinstance(buf, (str, int)):
+            return None
+        try:
+            return bytearray(buf)
+        except (TypeError, ValueError):
+            return None
+
+    def _is_writable_buf(self, buf):
+        view = self._byte_view(buf)
+        return view is not None and not view.readonly and len(view) > 0
+
+    def _byte_view(self, buf):
+        """
+        Returns a flat memoryview of unsigned bytes over buf, or None if buf does not implement the buffer protocol with a contiguous layout.
+
+        """
+        if isinstance(buf, (bytes, bytearray)):
+            return memoryview(buf)
+        if sys.version_info[0] == 2 or isinstance(buf, str):
+            return None
+        try:
+            view = memoryview(buf)
+            if not view.c_contiguous:
+                return None
+            return view if view.format == 'B' and view.ndim == 1 else view.cast('B')
+        except (TypeError, ValueError):
+            return None
+
+    def _to_ctypes_buf(self, buf):
+        """
+        Returns a ctypes uint8 array with the contents of buf. Writable buffers are shared with the array without a copy, read-only buffers are copied with a single memcpy and any other sequence is converted to a bytearray first.
+
+        """
+        view = self._byte_view(buf)
+        if view is None:
+            data = bytearray(buf)
+            return (ctypes.c_uint8 * len(data)).from_buffer(data)
+
+        array_type = ctypes.c_uint8 * len(view)
+        if not view.readonly:
+            try:
+                return array_type.from_buffer(buf)
+            except (TypeError, ValueError):
+                pass
+        return array_type.from_buffer_copy(buf)
 
     def _is_valid_encoding(self, encoding):
         try:
@@ -1476,20 +2437,24 @@ class API(object):
         return isinstance(instance, class_type)
             
     def _is_enum(self, param, enum_type):
-        if isinstance(param, int) and param in [member for name, member in enum_type.__members__.items()]:
-            return True
-        elif isinstance(param, str) and param in [name for name, member in enum_type.__members__.items()]:
-            return True
-        return False
+        return isinstance(param, (int, str)) and param in self._enum_lookup(enum_type)
 
     def _decode_enum(self, param, enum_type):
-        if not self._is_enum(param, enum_type):
+        if not isinstance(param, (int, str)):
             return None
+        return self._enum_lookup(enum_type).get(param)
+
+    def _enum_lookup(self, enum_type):
+        """
+        Returns a dict that maps both the values and the names of the members of enum_type to the members, built on first use and shared by all instances.
 
-        if isinstance(param, int):
-            return enum_type(param)
-        elif isinstance(param, str):
-            return enum_type[param]
+        """
+        lookup = self._ENUM_LOOKUPS.get(enum_type)
+        if lookup is None:
+            lookup = dict((int(member), member) for member in enum_type)
+            lookup.update(enum_type.__members__)
+            self._ENUM_LOOKUPS[enum_type] = lookup
+        return lookup
 
     def __enter__(self):
         """
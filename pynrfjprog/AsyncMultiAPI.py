@@ -0,0 +1,343 @@
+"""
+AsyncMultiAPI module. Requires Python 3.5 or later.
+
+"""
+
+import asyncio
+import pickle
+
+try:
+    from . import API
+    from . import MultiAPI
+    from . import RTT
+except Exception:
+    import API
+    import MultiAPI
+    import RTT
+
+
+class _AsyncBatch(MultiAPI._Batch):
+    """
+    Records API calls to be executed by AsyncMultiAPI.execute_script(), used with 'async with'.
+
+    """
+    def __enter__(self):
+        raise TypeError('Use "async with" with the batch of an AsyncMultiAPI.')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        if type is None:
+            self.results = await self._api.execute_script(self._steps)
+
+
+class AsyncChunkReader(object):
+    """
+    Asynchronous iterator over the chunks of a memory read, returned by AsyncMultiAPI.qspi_read_chunks(). The same bytearray is reused for every chunk.
+
+    """
+    def __init__(self, read_into, addr, length, chunk_size):
+        self._read_into = read_into
+        self._addr = addr
+        self._length = length
+        self._chunk_size = chunk_size
+        self._offset = 0
+        self._buf = bytearray(min(chunk_size, length))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._offset >= self._length:
+            raise StopAsyncIteration
+
+        if self._length - self._offset < len(self._buf):
+            self._buf = bytearray(self._length - self._offset)
+        await self._read_into(self._addr + self._offset, self._buf)
+        self._offset += len(self._buf)
+        return self._buf
+
+
+class AsyncRTTChannel(object):
+    """
+    Asynchronous iterator over the data of an RTT up channel and writer to the down channel with the same index, returned by AsyncMultiAPI.rtt_channel().
+
+    The channel is polled from the event loop: each poll is one awaited call to the subprocess, and while the channel is idle the poll interval backs off exponentially up to max_interval, so many channels and devices can be tailed from one event loop.
+    """
+    def __init__(self, api, channel_index, read_size, min_interval, max_interval):
+        self._api = api
+        self._channel_index = channel_index
+        self._buf = bytearray(read_size)
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        interval = 0.0
+        while not self._closed:
+            length = await self._api.rtt_read_into(self._channel_index, self._buf)
+            if length:
+                return bytes(self._buf[:length])
+            interval = self._next_interval(interval)
+            await asyncio.sleep(interval)
+        raise StopAsyncIteration
+
+    async def write(self, data):
+        """
+        Writes data to the down channel. Waits while the down buffer of the device is full, so a fast producer is slowed down to the rate at which the device consumes the data.
+
+        @param bytes-like data: Data to write.
+        """
+        data = memoryview(bytes(data))
+        interval = 0.0
+        while len(data) and not self._closed:
+            written = await self._api.rtt_write(self._channel_index, data.tobytes(), None)
+            data = data[written:]
+            interval = 0.0 if written else self._next_interval(interval)
+            if len(data):
+                await asyncio.sleep(interval)
+
+    def close(self):
+        """
+        Ends the iteration and any pending write.
+
+        """
+        self._closed = True
+
+    def _next_interval(self, interval):
+        return min(max(interval * 2, self._min_interval), self._max_interval)
+
+
+class AsyncMultiAPI(MultiAPI.MultiAPI):
+    """
+    Asyncio front-end for MultiAPI. Every method of MultiAPI is a coroutine function here. The replies of the subprocess are awaited by watching the pipe connected to it from the event loop, so a single event loop can drive many devices without a thread per device or per call.
+
+    Calls on the same instance are serialized, calls on different instances run concurrently.
+    """
+
+    def __init__(self, device_family, jlink_arm_dll_path=None, log=False, log_str=None, log_file_path=None, backend=None):
+        """
+        Constructor. Creates a subprocess for the API instance and runs it.
+
+        @param enum, string or int device_family: The series of device pynrfjprog will interact with.
+        @param (optional) string jlink_arm_dll_path: Absolute path to the JLinkARM DLL that you want nrfjprog to use.
+        @param (optional) bool log: If present and true, will enable logging to sys.stderr with the default log string appended to the beginning of each debug output line.
+        @param (optional) string log_str: If present, will enable logging to sys.stderr with overwriten default log string appended to the beginning of each debug output line.
+        @param (optional) string log_file_path: If present, will enable logging to log_file specified. This file will be opened in write mode in API.__init__() and closed when api.close() is called.
+        @param (optional) object backend: If present, used in place of the nrfjprog DLL by the API instance in the subprocess, i.e. a Simulator.Simulator. It is copied into the subprocess, see API.__init__().
+        """
+        MultiAPI.MultiAPI.__init__(self, device_family, jlink_arm_dll_path, log, log_str, log_file_path, backend)
+        self._async_lock = None
+        self._pending = None
+
+    @property
+    def _lock(self):
+        """
+        Lock serializing the calls. Created on first use, so that it belongs to the event loop the calls are made from and not to the one current when the instance was constructed.
+
+        """
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+    async def write(self, addr, data, control):
+        view = self._bulk_view(data)
+        async with self._lock:
+            if view is None:
+                return await self._request('write', addr, self._picklable_buf(data), control)
+
+            for offset, length in self._shared_chunks(addr, len(view)):
+                self._to_shared(view[offset:offset + length])
+                await self._request('write', addr + offset, MultiAPI._SharedBuffer(length), control)
+
+    async def read(self, addr, length, as_bytes=False):
+        if not isinstance(length, int) or not 0 < length <= 0xFFFFFFFF:
+            return await self._call('read', addr, length, as_bytes)
+
+        buf = bytearray(length)
+        await self.read_into(addr, buf)
+        return buf if as_bytes else list(buf)
+
+    async def read_into(self, addr, buf):
+        view = self._bulk_view(buf)
+        if view is None or view.readonly:
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
+
+        async with self._lock:
+            for offset, length in self._shared_chunks(addr, len(view)):
+                await self._request('_read_shared', addr + offset, length)
+                view[offset:offset + length] = self._shared_view[:length]
+
+    async def qspi_read(self, addr, length):
+        if not isinstance(length, int) or not 0 < length <= 0xFFFFFFFF:
+            return await self._call('qspi_read', addr, length)
+
+        buf = bytearray(length)
+        async with self._lock:
+            for offset, chunk_length in self._shared_chunks(addr, length):
+                await self._request('_qspi_read_shared', addr + offset, chunk_length)
+                buf[offset:offset + chunk_length] = self._shared_view[:chunk_length]
+        return buf
+
+    async def qspi_read_into(self, addr, buf):
+        view = self._bulk_view(buf)
+        if view is None or view.readonly:
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
+
+        async with self._lock:
+            for offset, length in self._shared_chunks(addr, len(view)):
+                await self._request('_qspi_read_shared', addr + offset, length)
+                view[offset:offset + length] = self._shared_view[:length]
+
+    def qspi_read_chunks(self, addr, length, chunk_size=API.API._DEFAULT_QSPI_CHUNK_SIZE):
+        """
+        Returns an asynchronous iterator over the chunks read from the external QSPI-connected memory, i.e. 'async for chunk in api.qspi_read_chunks(0, 0x800000)'.
+
+        """
+        return AsyncChunkReader(self.qspi_read_into, addr, length, chunk_size)
+
+    async def qspi_write(self, addr, data):
+        view = self._bulk_view(data)
+        async with self._lock:
+            if view is None:
+                return await self._request('qspi_write', addr, self._picklable_buf(data))
+
+            for offset, length in self._shared_chunks(addr, len(view)):
+                self._to_shared(view[offset:offset + length])
+                await self._request('qspi_write', addr + offset, MultiAPI._SharedBuffer(length))
+
+    async def rtt_read_into(self, channel_index, buf):
+        view = self._bulk_view(buf)
+        if view is None or view.readonly:
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
+
+        async with self._lock:
+            data_read = await self._request('_rtt_read_shared', channel_index, min(len(view), self._SHARED_BUFFER_SIZE))
+            view[:data_read] = self._shared_view[:data_read]
+        return data_read
+
+    async def program_image(self, segments, chunk_size=API.API._DEFAULT_PROGRAM_CHUNK_SIZE, on_progress=None, page_size=None, ram_loader=False):
+        segments = [(address, self._picklable_buf(data)) for address, data in self._segment_tuples(segments)]
+        async with self._lock:
+            return await self._request('program_image', segments, chunk_size, MultiAPI._ProgressCallback() if on_progress is not None else None, page_size, ram_loader, on_progress=on_progress)
+
+    async def diff_program_image(self, segments, chunk_size=API.API._DEFAULT_PROGRAM_CHUNK_SIZE, on_progress=None, page_size=None, ram_loader=False):
+        segments = [(address, self._picklable_buf(data)) for address, data in self._segment_tuples(segments)]
+        async with self._lock:
+            return await self._request('diff_program_image', segments, chunk_size, MultiAPI._ProgressCallback() if on_progress is not None else None, page_size, ram_loader, on_progress=on_progress)
+
+    async def qspi_program_image(self, addr, data, chunk_size=API.API._DEFAULT_QSPI_CHUNK_SIZE, on_progress=None, verify=True):
+        async with self._lock:
+            return await self._request('qspi_program_image', addr, self._picklable_buf(data), chunk_size, MultiAPI._ProgressCallback() if on_progress is not None else None, verify, on_progress=on_progress)
+
+    def rtt_channel(self, channel_index, read_size=RTT.DEFAULT_READ_SIZE, min_interval=RTT.DEFAULT_MIN_INTERVAL, max_interval=RTT.DEFAULT_MAX_INTERVAL):
+        """
+        Returns an asynchronous iterator over the data of an RTT up channel, i.e. 'async for chunk in api.rtt_channel(0)', with a write() coroutine for the down channel with the same index. RTT must have been started.
+
+        @param int channel_index: RTT channel to read and write.
+        @param (optional) int read_size: Maximum number of bytes read with each poll.
+        @param (optional) float min_interval: Poll interval [s] after the first idle poll.
+        @param (optional) float max_interval: Maximum poll interval [s] while the channel is idle.
+        @return AsyncRTTChannel: The channel.
+        """
+        if read_size < 1:
+            raise ValueError('The read_size parameter must be at least 1.')
+
+        if not 0 < min_interval <= max_interval:
+            raise ValueError('The min_interval and max_interval parameters must satisfy 0 < min_interval <= max_interval.')
+
+        return AsyncRTTChannel(self, channel_index, read_size, min_interval, max_interval)
+
+    def batch(self):
+        """
+        Returns an asynchronous context manager that records the API calls made on it and executes them in the subprocess in one round trip when the block exits, stopping at the first call that fails. The results are available in its results attribute afterwards.
+
+        """
+        return _AsyncBatch(self)
+
+    async def terminate(self):
+        """
+        Closes the dll and terminates the subprocess.
+
+        """
+        if self.runner.is_alive():
+            await self.close()
+            self.runner.terminate()
+            self.runner.join()
+
+    async def _call(self, cmd, *args):
+        async with self._lock:
+            return await self._request(cmd, *args)
+
+    async def _request(self, cmd, *args, on_progress=None):
+        """
+        Sends a command and awaits its acknowledgement. Must be called with self._lock held.
+
+        The acknowledgement is received by a separate task. If the caller is cancelled, i.e. by asyncio.wait_for(), the task keeps running and the next call waits for it to consume the stale acknowledgement before sending its own command.
+        """
+        if self._pending is not None:
+            await asyncio.wait([self._pending])
+            self._pending = None
+
+        self._send(cmd, *args)
+        receive = asyncio.ensure_future(self._receive(on_progress))
+        self._pending = receive
+        try:
+            return await asyncio.shield(receive)
+        finally:
+            if receive.done():
+                self._pending = None
+
+    async def _receive(self, on_progress):
+        while True:
+            await self._wait_readable()
+            ack = self._conn.recv_bytes()
+            if ack[:1] != MultiAPI._ACK_PROGRESS:
+                return self._decode_ack(ack)
+            if on_progress is not None:
+                on_progress(pickle.loads(ack[1:]))
+
+    async def _wait_readable(self):
+        """
+        Waits until the subprocess has written to the pipe. Event loops that cannot watch file descriptors (i.e. the proactor loop on Windows) poll the pipe from the default executor instead.
+
+        """
+        if self._conn.poll():
+            return
+
+        loop = asyncio.get_event_loop()
+        readable = loop.create_future()
+
+        def on_readable():
+            if not readable.done():
+                readable.set_result(None)
+
+        try:
+            loop.add_reader(self._conn.fileno(), on_readable)
+        except NotImplementedError:
+            await loop.run_in_executor(None, self._conn.poll, None)
+            return
+
+        try:
+            await readable
+        finally:
+            loop.remove_reader(self._conn.fileno())
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.terminate()
+
+    def __enter__(self):
+        raise TypeError('Use "async with" with AsyncMultiAPI.')
+
+    def __del__(self):
+        if self.runner.is_alive():
+            self.runner.terminate()
+            self.runner.join()
@@ -0,0 +1,168 @@
+"""
+GangProgrammer module. Programs one image onto many devices in parallel.
+
+"""
+
+import threading
+import time
+
+try:
+    from . import API
+    from . import Hex
+    from . import MultiAPI
+except Exception:
+    import API
+    import Hex
+    import MultiAPI
+
+
+class GangResult(object):
+    """
+    Outcome of programming one device.
+
+    """
+    def __init__(self, serial_number, success, duration, bytes_written=0, pages_skipped=0, error=None):
+        self.serial_number = serial_number
+        self.success = success
+        self.duration = duration
+        self.bytes_written = bytes_written
+        self.pages_skipped = pages_skipped
+        self.error = error
+
+    def __repr__(self):
+        return 'GangResult({}, {}, {:.2f} s{})'.format(self.serial_number, 'OK' if self.success else 'FAILED', self.duration, '' if self.error is None else ', {}'.format(self.error))
+
+
+class GangReport(object):
+    """
+    Outcome of programming a set of devices, with one GangResult per device in the order the serial numbers were given.
+
+    """
+    def __init__(self, results, duration):
+        self.results = results
+        self.duration = duration
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.success]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.success]
+
+    def __str__(self):
+        lines = ['{:>12} {:>8} {:>10} {:>10}  {}'.format('serial', 'result', 'time [s]', 'bytes', 'error')]
+        for result in self.results:
+            lines.append('{:>12} {:>8} {:>10.2f} {:>10}  {}'.format(result.serial_number, 'OK' if result.success else 'FAILED', result.duration, result.bytes_written, '' if result.error is None else result.error))
+        lines.append('{} of {} devices programmed in {:.2f} s.'.format(len(self.succeeded), len(self.results), self.duration))
+        return '\n'.join(lines)
+
+
+class GangProgrammer(object):
+    """
+    Programs one image onto several devices at the same time. Each device is programmed by a MultiAPIPool worker with the whole sequence sent in one round trip, at most max_concurrency devices at a time.
+
+    """
+
+    def __init__(self, device_family, max_concurrency=8, jlink_arm_dll_path=None, jlink_speed_khz=API.API._DEFAULT_JLINK_SPEED_KHZ, log=False, log_str=None, log_file_path=None, backend=None):
+        """
+        Constructor. The worker processes are started when they are first needed, so no more than the number of devices programmed at the same time are started.
+
+        @param enum, string or int device_family: The series of device pynrfjprog will interact with.
+        @param (optional) int max_concurrency: Maximum number of devices programmed at the same time. USB hubs and hosts saturate with too many active J-Links.
+        @param (optional) string jlink_arm_dll_path: Absolute path to the JLinkARM DLL that you want nrfjprog to use.
+        @param (optional) int jlink_speed_khz: SWDCLK speed [kHz].
+        @param (optional) bool log: If present and true, will enable logging to sys.stderr with the default log string appended to the beginning of each debug output line.
+        @param (optional) string log_str: If present, will enable logging to sys.stderr with overwriten default log string appended to the beginning of each debug output line.
+        @param (optional) string log_file_path: If present, will enable logging to log_file specified.
+        @param (optional) object backend: If present, used in place of the nrfjprog DLL by every worker, i.e. a Simulator.Simulator, see MultiAPI.MultiAPIPool.
+        """
+        self._max_concurrency = max_concurrency
+        self._jlink_speed_khz = jlink_speed_khz
+        self._pool = MultiAPI.MultiAPIPool(device_family, max_concurrency, jlink_arm_dll_path, log=log, log_str=log_str, log_file_path=log_file_path, backend=backend, lazy=True)
+
+    def program(self, image, serial_numbers='all', erase_all=False, diff=False, reset=True, on_result=None, verify=False, ram_loader=False):
+        """
+        Programs the image onto every given device.
+
+        @param str, Hex.Hex, iterable or bytes image: Image to program. Path of an Intel HEX file, a Hex.Hex object, any iterable of objects with address and data attributes or of (address, data) tuples, or a bytes-like object holding an image that starts at address 0. On Python 2, where bytes is str, a str is always taken as a path.
+        @param (optional) [int] or str serial_numbers: Serial numbers of the emulators to program, or 'all' for every connected emulator. Each serial number must be given only once.
+        @param (optional) bool erase_all: If True, the whole device is erased with erase_all() before programming. Otherwise only the code flash pages touched by the image are erased.
+        @param (optional) bool diff: If True, the code flash pages that already hold the image are skipped, see API.diff_program_image().
+        @param (optional) bool reset: If True, the device is reset and started after programming.
+        @param (optional) callable on_result: If present, called with the GangResult of each device as soon as it is done. Called from a worker thread.
+        @param (optional) bool verify: If True, the image is verified after programming with API.verify_image(), a device that does not hold the image is reported as failed.
+        @param (optional) bool ram_loader: If True, code flash is programmed by a flash loader running from RAM, see API.program_image().
+        @return GangReport: Per-device results and timings.
+        """
+        if isinstance(image, str):
+            image = Hex.load(image)
+
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = [(0, image)]
+        segments = [(address, bytes(data)) for address, data in (segment if isinstance(segment, tuple) else (segment.address, segment.data) for segment in image)]
+
+        if serial_numbers == 'all':
+            serial_numbers = self._pool.enum_emu_snr() or []
+        serial_numbers = list(serial_numbers)
+        if len(set(serial_numbers)) != len(serial_numbers):
+            raise ValueError('The serial_numbers parameter must not contain the same serial number twice.')
+
+        steps = [('erase_all',)] if erase_all else []
+        program_step = len(steps)
+        steps.append(('diff_program_image' if diff else 'program_image', segments, API.API._DEFAULT_PROGRAM_CHUNK_SIZE, None, None, ram_loader))
+        if verify:
+            steps.append(('verify_image', segments))
+        if reset:
+            steps.extend([('sys_reset',), ('go',)])
+
+        results = {}
+        pending = list(serial_numbers)
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    serial_number = pending.pop(0)
+
+                result = self._program_device(serial_number, steps, program_step)
+                with lock:
+                    results[serial_number] = result
+                if on_result is not None:
+                    on_result(result)
+
+        start = time.time()
+        threads = [threading.Thread(target=worker) for i in range(min(self._max_concurrency, len(serial_numbers)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return GangReport([results[serial_number] for serial_number in serial_numbers], time.time() - start)
+
+    def close(self):
+        """
+        Terminates the worker processes.
+
+        """
+        self._pool.close()
+
+    def _program_device(self, serial_number, steps, program_step):
+        start = time.time()
+        try:
+            with self._pool.lease(serial_number, self._jlink_speed_khz) as session:
+                written = session.execute_script(steps)[program_step]
+        except Exception as error:
+            return GangResult(serial_number, False, time.time() - start, error=error.error if isinstance(error, API.ScriptError) else error)
+
+        if isinstance(written, tuple):
+            return GangResult(serial_number, True, time.time() - start, pages_skipped=written[1])
+        return GangResult(serial_number, True, time.time() - start, bytes_written=written)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
@@ -3,109 +3,303 @@ Deprecated: This module will not be supported in the future and should not be us
 """
 
 from builtins import int
+import collections
+import hashlib
+import mmap
+import os
+import struct
 import sys
+import tempfile
+import threading
 
 py2 = sys.version_info[0] == 2
 py3 = sys.version_info[0] == 3
 
 
+DATA_RECORD = 0x00
+END_OF_FILE_RECORD = 0x01
+EXTENDED_SEGMENT_ADDRESS_RECORD = 0x02
+START_SEGMENT_ADDRESS_RECORD = 0x03
+EXTENDED_LINEAR_ADDRESS_RECORD = 0x04
+START_LINEAR_ADDRESS_RECORD = 0x05
+
+
 class Segment(object):
     """Memory segment for use with API.write() method."""
 
     def __init__(self, addr, vals):
         self.address = addr
-        self.data = vals
-        self.length = len(vals)
+        self.data = vals if isinstance(vals, (bytearray, memoryview)) else bytearray(vals)
+        self.length = len(self.data)
 
     def append(self, vals):
         self.data.extend(vals)
         self.length += len(vals)
 
 
+def iter_records(lines):
+    """
+    Parses the records of an Intel HEX file. Stops at the end of file record.
+
+    @param iterable lines: Lines of the file, i.e. an open file object.
+    @return generator: Yields (record_type, address, data) tuples. For data records the address includes the offset of the last extended address record, data is a bytearray.
+    """
+    high_address = 0
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        if line[0] != ':':
+            raise ValueError('Line {} is not an Intel HEX record.'.format(line_number))
+
+        try:
+            record = bytearray.fromhex(line[1:])
+        except ValueError:
+            raise ValueError('Line {} contains invalid hex digits.'.format(line_number))
+
+        if len(record) < 5 or len(record) != record[0] + 5:
+            raise ValueError('Line {} has an invalid record length.'.format(line_number))
+
+        if sum(record) & 0xFF != 0:
+            raise ValueError('Line {} has an invalid checksum.'.format(line_number))
+
+        record_type = record[3]
+        record_address = (record[1] << 8) | record[2]
+        record_data = record[4:-1]
+
+        if record_type in (EXTENDED_SEGMENT_ADDRESS_RECORD, EXTENDED_LINEAR_ADDRESS_RECORD) and len(record_data) != 2:
+            raise ValueError('Line {} has an invalid extended address record.'.format(line_number))
+
+        if record_type == DATA_RECORD:
+            yield record_type, high_address + record_address, record_data
+        elif record_type == END_OF_FILE_RECORD:
+            return
+        elif record_type == EXTENDED_SEGMENT_ADDRESS_RECORD:
+            high_address = ((record_data[0] << 8) | record_data[1]) * 16
+            yield record_type, record_address, record_data
+        elif record_type == EXTENDED_LINEAR_ADDRESS_RECORD:
+            high_address = ((record_data[0] << 8) | record_data[1]) << 16
+            yield record_type, record_address, record_data
+        else:
+            yield record_type, record_address, record_data
+
+
+def iter_segments(filename):
+    """
+    Streams the segments of an Intel HEX file. Only one segment is held in memory at a time.
+
+    @param str filename: Path of the Intel HEX file.
+    @return generator: Yields a Segment for each block of contiguous data in the file.
+    """
+    segment = None
+    with open(filename) as file:
+        for record_type, address, data in iter_records(file):
+            if record_type != DATA_RECORD:
+                continue
+
+            if segment is not None and segment.address + segment.length == address:
+                segment.append(data)
+            else:
+                if segment is not None:
+                    yield segment
+                segment = Segment(address, data)
+
+    if segment is not None:
+        yield segment
+
+
 class Hex(object):
     """Parsed hex file."""
 
     def __init__(self, filename):
 
         self._segment_list = []
-        self._high_address = 0
+        self.start_address = None
 
         with open(filename) as file:
-            
-            high_address_changed = False
-            for line in file:
-
-                record_data_length, record_address, record_type, record_data, record_checksum = self._intel_hex_recored_parse(line)
-                if record_type == "extended_linear_address_record":
-                    self._high_address = record_data[0] * 0x1000000 + record_data[1] * 0x10000
-                    high_address_changed = True # Set this to true so that a new segment is added for the next line
-                elif record_type == "extended_segment_address_record":
-                    self._high_address = ((record_data[0] << 8) | record_data[1]) * 16
-                    high_address_changed = True
-                elif record_type == "data_record":
-                    # Check if segment_list is empty
-                    if (len(self._segment_list) == 0 or high_address_changed):
-                        self._segment_list.append(Segment(self._high_address + record_address, record_data))
-                        high_address_changed = False # Set to false so next lines are check for appending
+            for record_type, address, data in iter_records(file):
+                if record_type == DATA_RECORD:
+                    if self._segment_list and self._segment_list[-1].address + self._segment_list[-1].length == address:
+                        self._segment_list[-1].append(data)
                     else:
-                        # Check if data_record is the next address in current segment
-                        current_segment = self._segment_list[-1]
-                        record_full_address = self._high_address + record_address
-                        if ( ( current_segment.address + current_segment.length ) == record_full_address ) :
-                            # Append line to current segment
-                            current_segment.append(record_data)
-                        else:
-                            # Add new segment
-                            self._segment_list.append(Segment(self._high_address + record_address, record_data))
-                else:
-                    #implement more if desired or necessary
-                    pass
-
-    def _intel_hex_recored_parse(self, line):
-
-        record_data_length = int(line[1:3], 16)
-
-        record_address = int(line[3:7], 16)
-
-        if line[7:9] == '00':
-            record_type = "data_record"
-        elif line[7:9] == '02':
-            record_type = "extended_segment_address_record"
-        elif line[7:9] == '04':
-            record_type = "extended_linear_address_record"
-        else:
-            # implement more if desired or necessary
-            record_type = "other"
+                        self._segment_list.append(Segment(address, data))
+                elif record_type == START_LINEAR_ADDRESS_RECORD:
+                    self.start_address = (data[0] << 24) | (data[1] << 16) | (data[2] << 8) | data[3]
+                elif record_type == START_SEGMENT_ADDRESS_RECORD:
+                    self.start_address = ((data[0] << 8) | data[1]) * 16 + ((data[2] << 8) | data[3])
 
-        record_data = []
-        for i in range(record_data_length):
-            record_data.append(int(line[9+i*2:11+i*2], 16))
+    @classmethod
+    def from_segments(cls, segments, start_address=None):
+        """
+        Builds a Hex object from already parsed segments.
 
-        record_checksum = int(line[9+record_data_length*2:11+record_data_length*2], 16)
+        @param [Segment] segments: Segments of the image, sorted by address.
+        @param (optional) int start_address: Start address of the image.
+        @return Hex: The image.
+        """
+        hex_file = cls.__new__(cls)
+        hex_file._segment_list = list(segments)
+        hex_file.start_address = start_address
+        return hex_file
 
-        return record_data_length, record_address, record_type, record_data, record_checksum
+    def __iter__(self):
+        return iter(self._segment_list)
 
 
-    def __iter__(self):
-        self._iter_index = 0
-        return self
+class HexCache(object):
+    """
+    Cache of parsed hex files. Parsed images are kept in memory with a least recently used bound and can optionally be persisted to disk, so that a file that has not changed is never parsed twice.
+
+    Note: Images returned by the cache are shared between callers and must not be modified. Images loaded from the disk cache are backed by a read-only memory-mapped file, their segment data are memoryviews.
+    """
+
+    _FILE_MAGIC = b'PYNRFHEX'
+    _FILE_VERSION = 1
+    _FILE_HEADER = struct.Struct('<8sIII')
+    _FILE_SEGMENT = struct.Struct('<IQI')
+    _NO_START_ADDRESS = 0xFFFFFFFF
+
+    def __init__(self, max_entries=16, cache_dir=None, content_hash=False):
+        """
+        Constructor.
+
+        @param (optional) int max_entries: Maximum number of images kept in memory.
+        @param (optional) str cache_dir: If present, parsed images are also stored in this directory and memory-mapped from it when not found in memory.
+        @param (optional) bool content_hash: If True, images are identified by a SHA-1 hash of the file contents. Otherwise they are identified by the file path, modification time and size, which does not require reading the file.
+        """
+        if max_entries < 1:
+            raise ValueError('The max_entries parameter must be at least 1.')
+
+        self._max_entries = max_entries
+        self._cache_dir = cache_dir
+        self._content_hash = content_hash
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def load(self, filename):
+        """
+        Returns the parsed image of a hex file, parsing it only if it is not cached.
+
+        @param str filename: Path of the Intel HEX file.
+        @return Hex: Parsed image.
+        """
+        key = self._key(filename)
+
+        with self._lock:
+            hex_file = self._entries.pop(key, None)
+            if hex_file is not None:
+                self._entries[key] = hex_file
+                return hex_file
+
+        hex_file = self._load_from_disk(key)
+        if hex_file is None:
+            hex_file = Hex(filename)
+            self._store_to_disk(key, hex_file)
+
+        with self._lock:
+            self._entries[key] = hex_file
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+        return hex_file
+
+    def clear(self):
+        """
+        Drops all images kept in memory. The disk cache is left untouched.
+
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _key(self, filename):
+        if self._content_hash:
+            digest = hashlib.sha1()
+            with open(filename, 'rb') as file:
+                for block in iter(lambda: file.read(1024 * 1024), b''):
+                    digest.update(block)
+            return digest.hexdigest()
+
+        stat = os.stat(filename)
+        key = '{}|{}|{}'.format(os.path.abspath(filename), stat.st_mtime, stat.st_size)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _cache_file_path(self, key):
+        return os.path.join(self._cache_dir, key + '.bin')
+
+    def _load_from_disk(self, key):
+        """
+        Returns the image stored in the disk cache, or None if there is none or the file is not a complete cache file, i.e. empty or truncated, in which case the hex file is parsed again.
+
+        """
+        if self._cache_dir is None or not os.path.isfile(self._cache_file_path(key)):
+            return None
+
+        with open(self._cache_file_path(key), 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < self._FILE_HEADER.size:
+                return None
+            blob = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, start_address, segment_count = self._FILE_HEADER.unpack_from(blob, 0)
+        if magic != self._FILE_MAGIC or version != self._FILE_VERSION or self._FILE_HEADER.size + segment_count * self._FILE_SEGMENT.size > size:
+            return None
+
+        view = memoryview(blob) if sys.version_info[0] != 2 else None
+        segments = []
+        for i in range(segment_count):
+            address, offset, length = self._FILE_SEGMENT.unpack_from(blob, self._FILE_HEADER.size + i * self._FILE_SEGMENT.size)
+            if offset + length > size:
+                return None
+            segments.append(Segment(address, view[offset:offset + length] if view is not None else buffer(blob, offset, length)))
+
+        return Hex.from_segments(segments, None if start_address == self._NO_START_ADDRESS else start_address)
+
+    def _store_to_disk(self, key, hex_file):
+        """
+        Writes the image as a header, a table of (address, offset, length) entries and the raw segment data. The file is written under a unique temporary name and renamed so that concurrent readers never see a partial file. A file that cannot be written, e.g. in a full or read-only cache directory, is skipped and the image is parsed again next time.
+
+        """
+        if self._cache_dir is None:
+            return
+
+        segments = list(hex_file)
+        start_address = self._NO_START_ADDRESS if hex_file.start_address is None else hex_file.start_address
+        offset = self._FILE_HEADER.size + len(segments) * self._FILE_SEGMENT.size
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=key + '.', dir=self._cache_dir)
+        except (IOError, OSError):
+            return
 
-    # Define __next__() method for iterables only if we are running under python 3.
-    if py3:
-        def __next__(self):
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(self._FILE_HEADER.pack(self._FILE_MAGIC, self._FILE_VERSION, start_address, len(segments)))
+                for segment in segments:
+                    file.write(self._FILE_SEGMENT.pack(segment.address, offset, segment.length))
+                    offset += segment.length
+                for segment in segments:
+                    file.write(segment.data)
+            getattr(os, 'replace', os.rename)(tmp_path, self._cache_file_path(key))
+        except (IOError, OSError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
-            if self._iter_index == len(self._segment_list):
-                raise StopIteration
 
-            self._iter_index = self._iter_index + 1
-            return self._segment_list[self._iter_index - 1]
+_default_cache = HexCache()
 
-    # Define next() method for iterables only if we are running under python 2.
-    if py2:
-        def next(self):
 
-            if self._iter_index == len(self._segment_list):
-                raise StopIteration
+def load(filename, cache=None):
+    """
+    Returns the parsed image of a hex file. Repeated loads of a file that has not changed return the cached image instead of parsing the file again.
 
-            self._iter_index = self._iter_index + 1
-            return self._segment_list[self._iter_index - 1]
+    @param str filename: Path of the Intel HEX file.
+    @param (optional) HexCache cache: Cache to use. The module's default in-memory cache is used if not given.
+    @return Hex: Parsed image. Shared between callers, must not be modified.
+    """
+    return (cache if cache is not None else _default_cache).load(filename)
@@ -0,0 +1,207 @@
+"""
+MemoryDump module. Dumps memory regions of a device into a memory-mapped file and loads them back.
+
+A dump file is a header, an index with the name, address, length, file offset and CRC32 of every region, and the raw data of the regions.
+"""
+
+from builtins import int
+import mmap
+import struct
+import sys
+import zlib
+
+_FILE_MAGIC = b'PYNRFDMP'
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct('<8sII')
+_FILE_REGION = struct.Struct('<32sIIQI')
+
+DEFAULT_CHUNK_SIZE = 0x10000
+
+
+class Region(object):
+    """
+    Memory region of a device.
+
+    """
+    def __init__(self, name, address, length):
+        self.name = name
+        self.address = address
+        self.length = length
+
+    def __repr__(self):
+        return 'Region({!r}, 0x{:08X}, 0x{:X})'.format(self.name, self.address, self.length)
+
+
+class DumpedRegion(Region):
+    """
+    Memory region of a dump file, with its data and the CRC32 computed when it was dumped.
+
+    """
+    def __init__(self, name, address, length, crc32, data):
+        Region.__init__(self, name, address, length)
+        self.crc32 = crc32
+        self.data = data
+
+
+def dump_regions(api, path, regions, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reads memory regions of the device into a dump file. Every chunk is read straight into the memory-mapped file, so the memory used does not grow with the size of the regions. The header is written last, a dump that did not complete is never loaded.
+
+    @param API api: Connected API instance to read from.
+    @param str path: Path of the dump file. Overwritten if it exists.
+    @param sequence regions: Regions to dump. Region objects or (name, address, length) tuples, i.e. [('flash', 0x0, 0x100000), ('uicr', 0x10001000, 0x1000), ('ram', 0x20000000, 0x40000)].
+    @param (optional) int chunk_size: Maximum number of bytes read with each call to api.read_into().
+    @return [DumpedRegion]: Regions dumped, without their data.
+    """
+    regions = _check_regions(regions)
+
+    if not isinstance(chunk_size, int) or chunk_size <= 0:
+        raise ValueError('The chunk_size parameter must be a positive integer.')
+
+    offset = _FILE_HEADER.size + len(regions) * _FILE_REGION.size
+    size = offset + sum(region.length for region in regions)
+
+    with open(path, 'w+b') as file:
+        file.truncate(size)
+        dump = mmap.mmap(file.fileno(), size)
+
+    dumped = []
+    try:
+        for index, region in enumerate(regions):
+            crc32 = 0
+            for start in range(0, region.length, chunk_size):
+                length = min(chunk_size, region.length - start)
+                crc32 = _read_chunk(api, dump, offset + start, region.address + start, length, crc32)
+
+            _FILE_REGION.pack_into(dump, _FILE_HEADER.size + index * _FILE_REGION.size, region.name.encode('utf-8'), region.address, region.length, offset, crc32)
+            dumped.append(DumpedRegion(region.name, region.address, region.length, crc32, None))
+            offset += region.length
+
+        _FILE_HEADER.pack_into(dump, 0, _FILE_MAGIC, _FILE_VERSION, len(regions))
+        dump.flush()
+    finally:
+        dump.close()
+
+    return dumped
+
+
+class MemoryDump(object):
+    """
+    Dump file written by dump_regions(). The file is memory-mapped, the data of the regions are read-only memoryviews of it (read-only buffers on Python 2, which cannot take a memoryview of an mmap) and are only read from disk when accessed.
+
+    """
+    def __init__(self, path):
+        """
+        Constructor. Opens a dump file.
+
+        @param str path: Path of the dump file.
+        """
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _FILE_HEADER.size:
+            raise ValueError('{} is not a complete memory dump.'.format(path))
+
+        magic, version, region_count = _FILE_HEADER.unpack_from(self._mmap, 0)
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            raise ValueError('{} is not a complete memory dump.'.format(path))
+
+        self._view = memoryview(self._mmap) if sys.version_info[0] != 2 else None
+        self.regions = []
+        for index in range(region_count):
+            name, address, length, offset, crc32 = _FILE_REGION.unpack_from(self._mmap, _FILE_HEADER.size + index * _FILE_REGION.size)
+            data = self._view[offset:offset + length] if self._view is not None else buffer(self._mmap, offset, length)
+            self.regions.append(DumpedRegion(name.rstrip(b'\0').decode('utf-8'), address, length, crc32, data))
+
+    def __getitem__(self, name):
+        """
+        Returns the data of a region.
+
+        @param str name: Name of the region.
+        @return memoryview: Data of the region.
+        """
+        for region in self.regions:
+            if region.name == name:
+                return region.data
+        raise KeyError(name)
+
+    def read(self, address, length):
+        """
+        Returns the dumped data at a device address.
+
+        @param int address: Device address to read.
+        @param int length: Number of bytes to read. The bytes must all lie within one region.
+        @return memoryview: Data read.
+        """
+        for region in self.regions:
+            if region.address <= address and address + length <= region.address + region.length:
+                return region.data[address - region.address:address - region.address + length]
+        raise ValueError('The dump does not contain 0x{:X} bytes at address 0x{:08X}.'.format(length, address))
+
+    def verify(self):
+        """
+        Checks the data of every region against the CRC32 computed when it was dumped.
+
+        @return [str]: Names of the regions whose data does not match.
+        """
+        return [region.name for region in self.regions if zlib.crc32(region.data) & 0xFFFFFFFF != region.crc32]
+
+    def close(self):
+        """
+        Closes the dump file. The data of the regions and the views returned by __getitem__() and read() become invalid. A view returned by read() that is still referenced keeps the file mapped until it is garbage collected.
+
+        """
+        if self._view is not None:
+            for region in self.regions:
+                region.data.release()
+            self._view.release()
+            self._view = None
+        self.regions = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+def _check_regions(regions):
+    checked = []
+    for region in regions:
+        if isinstance(region, tuple) and len(region) == 3:
+            region = Region(*region)
+        if not isinstance(region, Region) or not isinstance(region.name, str) or len(region.name.encode('utf-8')) > 32:
+            raise ValueError('Each region must be a Region or a (name, address, length) tuple with a name of at most 32 bytes.')
+        if not isinstance(region.address, int) or not isinstance(region.length, int) or region.address < 0 or region.length <= 0 or region.address + region.length > 0x100000000:
+            raise ValueError('Region {} must have a positive length and lie within the 32-bit address space.'.format(region.name))
+        if region.name in [other.name for other in checked]:
+            raise ValueError('Region {} is given more than once.'.format(region.name))
+        checked.append(region)
+
+    if not checked:
+        raise ValueError('The regions parameter must contain at least one region.')
+
+    return checked
+
+
+def _read_chunk(api, dump, offset, address, length, crc32):
+    """
+    Reads one chunk into the dump at offset and returns the running CRC32. Python 2 cannot take a memoryview of an mmap, so the chunk is read into a bytearray and copied.
+
+    """
+    if sys.version_info[0] == 2:
+        chunk = bytearray(length)
+        api.read_into(address, chunk)
+        dump[offset:offset + length] = bytes(chunk)
+        return zlib.crc32(bytes(chunk), crc32) & 0xFFFFFFFF
+
+    view = memoryview(dump)[offset:offset + length]
+    try:
+        api.read_into(address, view)
+        return zlib.crc32(view, crc32) & 0xFFFFFFFF
+    finally:
+        view.release()
@@ -3,13 +3,21 @@ MultiAPI module.
 
 """
 
+import ctypes
 import inspect
 import multiprocessing
+import pickle
+import struct
+import sys
+import threading
+import time
 
 try:
     from . import API
+    from . import MemoryDump
 except Exception:
     import API
+    import MemoryDump
 
 
 """
@@ -18,16 +26,146 @@ Deprecated: Do not use, use log parameter in MultiAPI constructor instead.
 DEBUG_OUTPUT = False
 
 
-class _Command(object):
-    def __init__(self, cmd, *args):
-        self.cmd = cmd
-        self.args = args
+"""
+Wire format of the messages exchanged with the subprocess.
+
+A command is a little-endian uint16 opcode, the index of the command in _COMMANDS, followed by the encoded arguments. An acknowledgement is a status byte followed by the encoded result, a pickled exception or a pickled progress report. Each value is encoded as a one byte tag followed by its payload, values of types without a dedicated tag are pickled. Bulk payloads do not travel through the pipe at all, they are copied into a buffer shared by both processes and referenced by a _SharedBuffer argument.
+"""
+_COMMANDS = sorted(name for name, member in inspect.getmembers(API.API) if not name.startswith('_') and callable(member)) + ['_read_shared', '_qspi_read_shared', '_rtt_read_shared']
+_OPCODES = dict((name, struct.pack('<H', opcode)) for opcode, name in enumerate(_COMMANDS))
+
+_ACK_RESULT = b'R'
+_ACK_EXCEPTION = b'E'
+_ACK_PROGRESS = b'P'
+
+_TAG_NONE = b'N'
+_TAG_TRUE = b'T'
+_TAG_FALSE = b'F'
+_TAG_U32 = b'I'
+_TAG_BYTES = b'B'
+_TAG_BYTEARRAY = b'A'
+_TAG_STR = b'S'
+_TAG_SHARED = b'M'
+_TAG_PROGRESS = b'C'
+_TAG_PICKLE = b'P'
+
+_U32 = struct.Struct('<I')
+
+
+class _SharedBuffer(object):
+    """
+    Argument referencing the first length bytes of the buffer shared with the subprocess.
+
+    """
+    def __init__(self, length):
+        self.length = length
+
+
+class _ProgressCallback(object):
+    """
+    Placeholder sent to the subprocess in place of a progress callback. The subprocess forwards the progress reports to the parent process.
 
+    """
+    pass
+
+
+def _shared_bytes(shared):
+    """
+    Returns a byte view of the shared buffer. Python 2 cannot cast the memoryview of a ctypes array, so the buffer is viewed as a ctypes char array instead, which supports the same slice reads and writes of str data.
+
+    """
+    if sys.version_info[0] == 2:
+        return (ctypes.c_char * len(shared)).from_buffer(shared)
+    return memoryview(shared).cast('B')
+
+
+def _encode_values(values):
+    parts = []
+    for value in values:
+        if value is None:
+            parts.append(_TAG_NONE)
+        elif value is True:
+            parts.append(_TAG_TRUE)
+        elif value is False:
+            parts.append(_TAG_FALSE)
+        elif isinstance(value, int) and 0 <= value <= 0xFFFFFFFF:
+            parts.append(_TAG_U32 + _U32.pack(value))
+        elif isinstance(value, _SharedBuffer):
+            parts.append(_TAG_SHARED + _U32.pack(value.length))
+        elif isinstance(value, _ProgressCallback):
+            parts.append(_TAG_PROGRESS)
+        elif isinstance(value, bytearray):
+            parts.extend((_TAG_BYTEARRAY, _U32.pack(len(value)), value))
+        elif isinstance(value, bytes):
+            parts.extend((_TAG_BYTES, _U32.pack(len(value)), value))
+        elif isinstance(value, str):
+            value = value.encode('utf-8')
+            parts.extend((_TAG_STR, _U32.pack(len(value)), value))
+        else:
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            parts.extend((_TAG_PICKLE, _U32.pack(len(value)), value))
+    return b''.join(parts)
+
+
+def _decode_values(message, offset, shared=None, progress=None):
+    values = []
+    while offset < len(message):
+        tag = message[offset:offset + 1]
+        offset += 1
+        if tag == _TAG_NONE:
+            values.append(None)
+        elif tag == _TAG_TRUE:
+            values.append(True)
+        elif tag == _TAG_FALSE:
+            values.append(False)
+        elif tag == _TAG_U32:
+            values.append(_U32.unpack_from(message, offset)[0])
+            offset += _U32.size
+        elif tag == _TAG_SHARED:
+            values.append(shared[:_U32.unpack_from(message, offset)[0]])
+            offset += _U32.size
+        elif tag == _TAG_PROGRESS:
+            values.append(progress)
+        else:
+            length = _U32.unpack_from(message, offset)[0]
+            offset += _U32.size
+            payload = message[offset:offset + length]
+            offset += length
+            if tag == _TAG_BYTEARRAY:
+                values.append(bytearray(payload))
+            elif tag == _TAG_BYTES:
+                values.append(payload)
+            elif tag == _TAG_STR:
+                values.append(payload.decode('utf-8'))
+            else:
+                values.append(pickle.loads(payload))
+    return values
 
-class _CommandAck(object):
-    def __init__(self, exception=None, result=None):
-        self.exception = exception
-        self.result = result
+
+class _Batch(object):
+    """
+    Records API calls to be executed by MultiAPI.execute_script().
+
+    """
+    def __init__(self, api):
+        self._api = api
+        self._steps = []
+        self.results = None
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in _OPCODES:
+            raise AttributeError(name)
+
+        def record(*args):
+            self._steps.append((name,) + args)
+        return record
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.results = self._api.execute_script(self._steps)
 
 
 class MultiAPI(object):
@@ -37,313 +175,461 @@ class MultiAPI(object):
     Note: A copy of nrfjprog.dll must be found in the working directory.
     """
 
-    def __init__(self, device_family, jlink_arm_dll_path=None, log=False, log_str=None, log_file_path=None):
+    _SHARED_BUFFER_SIZE = 0x40000
+
+    def __init__(self, device_family, jlink_arm_dll_path=None, log=False, log_str=None, log_file_path=None, backend=None):
         """
-        Constructor. Initializes multiprocessing queues, creates a subprocess for the API instance and runs it.
+        Constructor. Initializes the pipe and the shared buffer used to talk to the subprocess, creates a subprocess for the API instance and runs it.
 
         @param enum, string or int device_family: The series of device pynrfjprog will interact with.
         @param (optional) string jlink_arm_dll_path: Absolute path to the JLinkARM DLL that you want nrfjprog to use.
         @param (optional) bool log: If present and true, will enable logging to sys.stderr with the default log string appended to the beginning of each debug output line.
         @param (optional) string log_str: If present, will enable logging to sys.stderr with overwriten default log string appended to the beginning of each debug output line.
         @param (optional) string log_file_path: If present, will enable logging to log_file specified. This file will be opened in write mode in API.__init__() and closed when api.close() is called.
+        @param (optional) object backend: If present, used in place of the nrfjprog DLL by the API instance in the subprocess, i.e. a Simulator.Simulator. It is copied into the subprocess, see API.__init__().
         """
-        self.CmdQueue = multiprocessing.Queue()
-        self.CmdAckQueue = multiprocessing.Queue()
+        self._conn, runner_conn = multiprocessing.Pipe()
+        self._shared = multiprocessing.RawArray(ctypes.c_uint8, self._SHARED_BUFFER_SIZE)
+        self._shared_view = _shared_bytes(self._shared)
 
         if DEBUG_OUTPUT:
             log = True
 
-        self.runner = multiprocessing.Process(target=self._runner, args=(device_family, jlink_arm_dll_path, log, log_str, log_file_path))
+        self.runner = multiprocessing.Process(target=self._runner, args=(runner_conn, self._shared, device_family, jlink_arm_dll_path, log, log_str, log_file_path, backend))
         self.runner.daemon = True
         self.runner.start()
 
     def dll_version(self):
-        self.CmdQueue.put(_Command('dll_version'))
-        return self._wait_for_completion()
+        return self._call('dll_version')
     
     def is_open(self):
-        self.CmdQueue.put(_Command('is_open'))
-        return self._wait_for_completion()
+        return self._call('is_open')
     
     def open(self):
-        self.CmdQueue.put(_Command('open'))
-        return self._wait_for_completion()
+        return self._call('open')
 
     def close(self):
-        self.CmdQueue.put(_Command('close'))
-        return self._wait_for_completion()
+        return self._call('close')
 
     def enum_emu_snr(self):
-        self.CmdQueue.put(_Command('enum_emu_snr'))
-        return self._wait_for_completion()
+        return self._call('enum_emu_snr')
 
     def is_connected_to_emu(self):
-        self.CmdQueue.put(_Command('is_connected_to_emu'))
-        return self._wait_for_completion()
+        return self._call('is_connected_to_emu')
 
     def connect_to_emu_with_snr(self, serial_number, jlink_speed_khz=API.API._DEFAULT_JLINK_SPEED_KHZ):
-        self.CmdQueue.put(_Command('connect_to_emu_with_snr', serial_number, jlink_speed_khz))
-        return self._wait_for_completion()
+        return self._call('connect_to_emu_with_snr', serial_number, jlink_speed_khz)
 
     def connect_to_emu_without_snr(self, jlink_speed_khz=API.API._DEFAULT_JLINK_SPEED_KHZ):
-        self.CmdQueue.put(_Command('connect_to_emu_without_snr', jlink_speed_khz))
-        return self._wait_for_completion()
+        return self._call('connect_to_emu_without_snr', jlink_speed_khz)
 
     def read_connected_emu_snr(self):
-        self.CmdQueue.put(_Command('read_connected_emu_snr'))
-        return self._wait_for_completion()
+        return self._call('read_connected_emu_snr')
 
     def read_connected_emu_fwstr(self):
-        self.CmdQueue.put(_Command('read_connected_emu_fwstr'))
-        return self._wait_for_completion()
+        return self._call('read_connected_emu_fwstr')
     
     def disconnect_from_emu(self):
-        self.CmdQueue.put(_Command('disconnect_from_emu'))
-        return self._wait_for_completion()
+        return self._call('disconnect_from_emu')
 
     def recover(self):
-        self.CmdQueue.put(_Command('recover'))
-        return self._wait_for_completion()
+        return self._call('recover')
 
     def is_connected_to_device(self):
-        self.CmdQueue.put(_Command('is_connected_to_device'))
-        return self._wait_for_completion()
+        return self._call('is_connected_to_device')
 
     def connect_to_device(self):
-        self.CmdQueue.put(_Command('connect_to_device'))
-        return self._wait_for_completion()
+        return self._call('connect_to_device')
 
     def disconnect_from_device(self):
-        self.CmdQueue.put(_Command('disconnect_from_device'))
-        return self._wait_for_completion()
+        return self._call('disconnect_from_device')
         
     def readback_protect(self, desired_protection_level):
-        self.CmdQueue.put(_Command('readback_protect', desired_protection_level))
-        return self._wait_for_completion()
+        return self._call('readback_protect', desired_protection_level)
 
     def readback_status(self):
-        self.CmdQueue.put(_Command('readback_status'))
-        return self._wait_for_completion()
+        return self._call('readback_status')
 
     def read_region_0_size_and_source(self):
-        self.CmdQueue.put(_Command('read_region_0_size_and_source'))
-        return self._wait_for_completion()
+        return self._call('read_region_0_size_and_source')
 
     def debug_reset(self):
-        self.CmdQueue.put(_Command('debug_reset'))
-        return self._wait_for_completion()
+        return self._call('debug_reset')
 
     def sys_reset(self):
-        self.CmdQueue.put(_Command('sys_reset'))
-        return self._wait_for_completion()
+        return self._call('sys_reset')
 
     def pin_reset(self):
-        self.CmdQueue.put(_Command('pin_reset'))
-        return self._wait_for_completion()
+        return self._call('pin_reset')
 
     def disable_bprot(self):
-        self.CmdQueue.put(_Command('disable_bprot'))
-        return self._wait_for_completion()
+        return self._call('disable_bprot')
 
     def erase_all(self):
-        self.CmdQueue.put(_Command('erase_all'))
-        return self._wait_for_completion()
+        return self._call('erase_all')
 
     def erase_page(self, addr):
-        self.CmdQueue.put(_Command('erase_page', addr))
-        return self._wait_for_completion()
+        return self._call('erase_page', addr)
 
     def erase_uicr(self):
-        self.CmdQueue.put(_Command('erase_uicr'))
-        return self._wait_for_completion()
+        return self._call('erase_uicr')
 
     def write_u32(self, addr, data, control):
-        self.CmdQueue.put(_Command('write_u32', addr, data, control))
-        return self._wait_for_completion()
+        return self._call('write_u32', addr, data, control)
 
     def read_u32(self, addr):
-        self.CmdQueue.put(_Command('read_u32', addr))
-        return self._wait_for_completion()
+        return self._call('read_u32', addr)
+
+    def read_u32_many(self, addrs):
+        return self._call('read_u32_many', list(addrs))
+
+    def write_u32_many(self, pairs, control):
+        return self._call('write_u32_many', list(pairs), control)
 
     def write(self, addr, data, control):
-        self.CmdQueue.put(_Command('write', addr, data, control))
-        return self._wait_for_completion()
+        view = self._bulk_view(data)
+        if view is None:
+            return self._call('write', addr, self._picklable_buf(data), control)
 
-    def read(self, addr, length):
-        self.CmdQueue.put(_Command('read', addr, length))
-        return self._wait_for_completion()
+        for offset, length in self._shared_chunks(addr, len(view)):
+            self._to_shared(view[offset:offset + length])
+            self._call('write', addr + offset, _SharedBuffer(length), control)
+
+    def read(self, addr, length, as_bytes=False):
+        if not isinstance(length, int) or not 0 < length <= 0xFFFFFFFF:
+            return self._call('read', addr, length, as_bytes)
+
+        buf = bytearray(length)
+        self.read_into(addr, buf)
+        return buf if as_bytes else list(buf)
+
+    def read_into(self, addr, buf):
+        view = self._bulk_view(buf)
+        if view is None or view.readonly:
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
+
+        for offset, length in self._shared_chunks(addr, len(view)):
+            self._call('_read_shared', addr + offset, length)
+            view[offset:offset + length] = self._shared_view[:length]
 
     def is_halted(self):
-        self.CmdQueue.put(_Command('is_halted'))
-        return self._wait_for_completion()
+        return self._call('is_halted')
 
     def halt(self):
-        self.CmdQueue.put(_Command('halt'))
-        return self._wait_for_completion()
+        return self._call('halt')
 
     def run(self, pc, sp):
-        self.CmdQueue.put(_Command('run', pc, sp))
-        return self._wait_for_completion()
+        return self._call('run', pc, sp)
 
     def go(self):
-        self.CmdQueue.put(_Command('go'))
-        return self._wait_for_completion()
+        return self._call('go')
 
     def step(self):
-        self.CmdQueue.put(_Command('step'))
-        return self._wait_for_completion()
+        return self._call('step')
 
     def read_ram_sections_count(self):
-        self.CmdQueue.put(_Command('read_ram_sections_count'))
-        return self._wait_for_completion()
+        return self._call('read_ram_sections_count')
 
     def read_ram_sections_size(self):
-        self.CmdQueue.put(_Command('read_ram_sections_size'))
-        return self._wait_for_completion()
+        return self._call('read_ram_sections_size')
 
     def read_ram_sections_power_status(self):
-        self.CmdQueue.put(_Command('read_ram_sections_power_status'))
-        return self._wait_for_completion()
+        return self._call('read_ram_sections_power_status')
 
     def is_ram_powered(self):
-        self.CmdQueue.put(_Command('is_ram_powered'))
-        return self._wait_for_completion()
+        return self._call('is_ram_powered')
 
     def power_ram_all(self):
-        self.CmdQueue.put(_Command('power_ram_all'))
-        return self._wait_for_completion()
+        return self._call('power_ram_all')
 
     def unpower_ram_section(self, section_index):
-        self.CmdQueue.put(_Command('unpower_ram_section', section_index))
-        return self._wait_for_completion()
+        return self._call('unpower_ram_section', section_index)
 
     def read_cpu_register(self, register_name):
-        self.CmdQueue.put(_Command('read_cpu_register', register_name))
-        return self._wait_for_completion()
+        return self._call('read_cpu_register', register_name)
 
     def write_cpu_register(self, register_name, value):
-        self.CmdQueue.put(_Command('write_cpu_register', register_name, value))
-        return self._wait_for_completion()
+        return self._call('write_cpu_register', register_name, value)
 
     def read_device_version(self):
-        self.CmdQueue.put(_Command('read_device_version'))
-        return self._wait_for_completion()
+        return self._call('read_device_version')
 
     def read_device_family(self):
-        self.CmdQueue.put(_Command('read_device_family'))
-        return self._wait_for_completion()
+        return self._call('read_device_family')
         
     def read_debug_port_register(self, reg_addr):
-        self.CmdQueue.put(_Command('read_debug_port_register', reg_addr))
-        return self._wait_for_completion()
+        return self._call('read_debug_port_register', reg_addr)
 
     def write_debug_port_register(self, reg_addr, data):
-        self.CmdQueue.put(_Command('write_debug_port_register', reg_addr, data))
-        return self._wait_for_completion()
+        return self._call('write_debug_port_register', reg_addr, data)
 
     def read_access_port_register(self, ap_index, reg_addr):
-        self.CmdQueue.put(_Command('read_access_port_register', ap_index, reg_addr))
-        return self._wait_for_completion()
+        return self._call('read_access_port_register', ap_index, reg_addr)
 
     def write_access_port_register(self, ap_index, reg_addr, data):
-        self.CmdQueue.put(_Command('write_access_port_register', ap_index, reg_addr, data))
-        return self._wait_for_completion()
+        return self._call('write_access_port_register', ap_index, reg_addr, data)
 
     def rtt_set_control_block_address(self, address):
-        self.CmdQueue.put(_Command('rtt_set_control_block_address', address))
-        return self._wait_for_completion()
+        return self._call('rtt_set_control_block_address', address)
 
     def rtt_start(self):
-        self.CmdQueue.put(_Command('rtt_start'))
-        return self._wait_for_completion()
+        return self._call('rtt_start')
 
     def is_rtt_started(self):
-        self.CmdQueue.put(_Command('is_rtt_started'))
-        return self._wait_for_completion()
+        return self._call('is_rtt_started')
         
     def rtt_is_control_block_found(self):
-        self.CmdQueue.put(_Command('rtt_is_control_block_found'))
-        return self._wait_for_completion()
+        return self._call('rtt_is_control_block_found')
 
     def rtt_stop(self):
-        self.CmdQueue.put(_Command('rtt_stop'))
-        return self._wait_for_completion()
+        return self._call('rtt_stop')
 
     def rtt_read(self, channel_index, length, encoding='utf-8'):
-        self.CmdQueue.put(_Command('rtt_read', channel_index, length, encoding))
-        return self._wait_for_completion()
+        return self._call('rtt_read', channel_index, length, encoding)
+
+    def rtt_read_into(self, channel_index, buf):
+        view = self._bulk_view(buf)
+        if view is None or view.readonly:
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
+
+        data_read = self._call('_rtt_read_shared', channel_index, min(len(view), self._SHARED_BUFFER_SIZE))
+        view[:data_read] = self._shared_view[:data_read]
+        return data_read
+
+    def rtt_up_channels(self, refresh=False):
+        return self._call('rtt_up_channels', refresh)
+
+    def rtt_read_all(self):
+        return self._call('rtt_read_all')
 
     def rtt_write(self, channel_index, msg, encoding='utf-8'):
-        self.CmdQueue.put(_Command('rtt_write', channel_index, msg, encoding))
-        return self._wait_for_completion()
+        return self._call('rtt_write', channel_index, msg, encoding)
 
     def rtt_read_channel_count(self):
-        self.CmdQueue.put(_Command('rtt_read_channel_count'))
-        return self._wait_for_completion()
+        return self._call('rtt_read_channel_count')
 
     def rtt_read_channel_info(self, channel_index, direction):
-        self.CmdQueue.put(_Command('rtt_read_channel_info', channel_index, direction))
-        return self._wait_for_completion()
+        return self._call('rtt_read_channel_info', channel_index, direction)
     
     def is_qspi_init(self):
-        self.CmdQueue.put(_Command('is_qspi_init'))
-        return self._wait_for_completion()
+        return self._call('is_qspi_init')
         
     def qspi_init(self, retain_ram=False, init_params=None):
-        self.CmdQueue.put(_Command('qspi_init', retain_ram, init_params))
-        return self._wait_for_completion()
+        return self._call('qspi_init', retain_ram, init_params)
         
     def qspi_uninit(self):
-        self.CmdQueue.put(_Command('qspi_uninit'))
-        return self._wait_for_completion()
+        return self._call('qspi_uninit')
         
     def qspi_read(self, addr, length):
-        self.CmdQueue.put(_Command('qspi_read', addr, length))
-        return self._wait_for_completion()
+        if not isinstance(length, int) or not 0 < length <= 0xFFFFFFFF:
+            return self._call('qspi_read', addr, length)
+
+        buf = bytearray(length)
+        for offset, chunk_length in self._shared_chunks(addr, length):
+            self._call('_qspi_read_shared', addr + offset, chunk_length)
+            buf[offset:offset + chunk_length] = self._shared_view[:chunk_length]
+        return buf
      
+    def qspi_read_into(self, addr, buf):
+        view = self._bulk_view(buf)
+        if view is None or view.readonly:
+            raise ValueError('The buf parameter must be a writable, contiguous buffer with at least one byte.')
+
+        for offset, length in self._shared_chunks(addr, len(view)):
+            self._call('_qspi_read_shared', addr + offset, length)
+            view[offset:offset + length] = self._shared_view[:length]
+
+    def qspi_read_chunks(self, addr, length, chunk_size=API.API._DEFAULT_QSPI_CHUNK_SIZE):
+        buf = bytearray(min(chunk_size, length))
+        for offset in range(0, length, chunk_size):
+            if length - offset < len(buf):
+                buf = bytearray(length - offset)
+            self.qspi_read_into(addr + offset, buf)
+            yield buf
+
     def qspi_write(self, addr, data):
-        self.CmdQueue.put(_Command('qspi_write', addr, data))
-        return self._wait_for_completion()
+        view = self._bulk_view(data)
+        if view is None:
+            return self._call('qspi_write', addr, self._picklable_buf(data))
+
+        for offset, length in self._shared_chunks(addr, len(view)):
+            self._to_shared(view[offset:offset + length])
+            self._call('qspi_write', addr + offset, _SharedBuffer(length))
 
     def qspi_erase(self, addr, length):
-        self.CmdQueue.put(_Command('qspi_erase', addr, length))
-        return self._wait_for_completion()
+        return self._call('qspi_erase', addr, length)
         
     def qspi_custom(self, code, length, data_in=None, output=False):
-        self.CmdQueue.put(_Command('qspi_custom', code, length, data_in, output))
-        return self._wait_for_completion()
+        return self._call('qspi_custom', code, length, data_in, output)
         
-    def _wait_for_completion(self):
-        ack = self.CmdAckQueue.get()
+    def program_image(self, segments, chunk_size=API.API._DEFAULT_PROGRAM_CHUNK_SIZE, on_progress=None, page_size=None, ram_loader=False):
+        segments = [(address, self._picklable_buf(data)) for address, data in self._segment_tuples(segments)]
+        self._send('program_image', segments, chunk_size, _ProgressCallback() if on_progress is not None else None, page_size, ram_loader)
+        return self._wait_for_completion(on_progress)
+
+    def diff_program_image(self, segments, chunk_size=API.API._DEFAULT_PROGRAM_CHUNK_SIZE, on_progress=None, page_size=None, ram_loader=False):
+        segments = [(address, self._picklable_buf(data)) for address, data in self._segment_tuples(segments)]
+        self._send('diff_program_image', segments, chunk_size, _ProgressCallback() if on_progress is not None else None, page_size, ram_loader)
+        return self._wait_for_completion(on_progress)
 
-        if ack.exception is not None:
-            raise ack.exception
-        if ack.result is not None:
-            return ack.result
+    def verify_image(self, segments, block_size=API.API._DEFAULT_VERIFY_BLOCK_SIZE, ram_addr=API.API._DEFAULT_STUB_RAM_ADDR, timeout=5.0):
+        segments = [(address, self._picklable_buf(data)) for address, data in self._segment_tuples(segments)]
+        return self._call('verify_image', segments, block_size, ram_addr, timeout)
+
+    def qspi_program_image(self, addr, data, chunk_size=API.API._DEFAULT_QSPI_CHUNK_SIZE, on_progress=None, verify=True):
+        self._send('qspi_program_image', addr, self._picklable_buf(data), chunk_size, _ProgressCallback() if on_progress is not None else None, verify)
+        return self._wait_for_completion(on_progress)
+
+    def dump_regions(self, path, regions, chunk_size=MemoryDump.DEFAULT_CHUNK_SIZE):
+        return self._call('dump_regions', path, list(regions), chunk_size)
+
+    def execute_script(self, steps):
+        return self._call('execute_script', [tuple(self._picklable_buf(arg) for arg in step) for step in steps])
+
+    def batch(self):
+        """
+        Returns a context manager that records the API calls made on it and executes them in the subprocess in one round trip when the block exits, stopping at the first call that fails. The results are available in its results attribute afterwards.
+
+        """
+        return _Batch(self)
+
+    def _segment_tuples(self, segments):
+        if isinstance(segments, (bytes, bytearray, memoryview)):
+            return [(0, segments)]
+        return [segment if isinstance(segment, tuple) else (segment.address, segment.data) for segment in segments]
+
+    def _picklable_buf(self, data):
+        """
+        Buffer objects such as memoryview or mmap cannot be sent to the subprocess, so their contents are copied into a bytes object.
+
+        """
+        if isinstance(data, (bytes, bytearray)):
+            return data
+        try:
+            return memoryview(data).tobytes()
+        except TypeError:
+            return data
+
+    def _bulk_view(self, data):
+        """
+        Returns a flat byte memoryview of data if it can be sent through the shared buffer, None if the command must be sent the normal way. Sequences are converted to a bytearray, which fails for the same invalid values the API would reject.
+
+        """
+        if isinstance(data, (list, tuple)):
+            try:
+                data = bytearray(data)
+            except (TypeError, ValueError):
+                return None
+        try:
+            view = memoryview(data)
+            if view.ndim != 1 or view.itemsize != 1:
+                if sys.version_info[0] == 2:
+                    return None
+                view = view.cast('B')
+        except (TypeError, ValueError):
+            return None
+        return view if len(view) > 0 else None
+
+    def _to_shared(self, view):
+        """
+        Copies a byte memoryview to the start of the shared buffer.
+
+        """
+        if sys.version_info[0] == 2:
+            view = view.tobytes()
+        self._shared_view[:len(view)] = view
+
+    def _shared_chunks(self, addr, length):
+        """
+        Splits a bulk transfer into (offset, length) chunks that fit into the shared buffer. Invalid addresses are sent as a single chunk so that the API reports the error.
 
-    def _runner(self, device_family, jlink_arm_dll_path, log, log_str, log_file):
+        """
+        if not isinstance(addr, int) or not 0 <= addr <= 0xFFFFFFFF:
+            return [(0, min(length, self._SHARED_BUFFER_SIZE))]
+        return [(offset, min(self._SHARED_BUFFER_SIZE, length - offset)) for offset in range(0, length, self._SHARED_BUFFER_SIZE)]
+
+    def _send(self, cmd, *args):
+        self._conn.send_bytes(_OPCODES[cmd] + _encode_values(args))
+
+    def _call(self, cmd, *args):
+        self._send(cmd, *args)
+        return self._wait_for_completion()
+
+    def _wait_for_completion(self, on_progress=None):
+        ack = self._conn.recv_bytes()
+        while ack[:1] == _ACK_PROGRESS:
+            on_progress(pickle.loads(ack[1:]))
+            ack = self._conn.recv_bytes()
+
+        return self._decode_ack(ack)
+
+    def _decode_ack(self, ack):
+        if ack[:1] == _ACK_EXCEPTION:
+            raise pickle.loads(ack[1:])
+
+        result = _decode_values(ack, 1)
+        if result[0] is not None:
+            return result[0]
+
+    def _runner(self, conn, shared, device_family, jlink_arm_dll_path, log, log_str, log_file, backend):
         """
         Function that runs in a subprocess and executes the commands.
 
         """
-        api = self._api_setup(device_family, jlink_arm_dll_path, log, log_str, log_file)
+        api = self._api_setup(device_family, jlink_arm_dll_path, log, log_str, log_file, backend)
         api_functions = dict(inspect.getmembers(api, inspect.ismethod))
+        shared = _shared_bytes(shared)
+
+        def into_shared(read_into, source, length):
+            if sys.version_info[0] != 2:
+                return read_into(source, shared[:length])
+            buf = bytearray(length)
+            result = read_into(source, buf)
+            shared[:length] = bytes(buf)
+            return result
+
+        def read_shared(addr, length):
+            into_shared(api.read_into, addr, length)
+
+        def qspi_read_shared(addr, length):
+            into_shared(api.qspi_read_into, addr, length)
+
+        def rtt_read_shared(channel_index, length):
+            return into_shared(api.rtt_read_into, channel_index, length)
+
+        def send_progress(progress):
+            conn.send_bytes(_ACK_PROGRESS + pickle.dumps(progress, pickle.HIGHEST_PROTOCOL))
+
+        api_functions['_read_shared'] = read_shared
+        api_functions['_qspi_read_shared'] = qspi_read_shared
+        api_functions['_rtt_read_shared'] = rtt_read_shared
 
         while True:
-            cmd = self.CmdQueue.get()
+            message = conn.recv_bytes()
+            cmd = _COMMANDS[struct.unpack_from('<H', message)[0]]
+            args = _decode_values(message, 2, shared, send_progress)
             try:
-                res = api_functions[cmd.cmd](*cmd.args)
+                res = api_functions[cmd](*args)
             except Exception as e:
-                self.CmdAckQueue.put(_CommandAck(exception=e))
+                conn.send_bytes(_ACK_EXCEPTION + pickle.dumps(e, pickle.HIGHEST_PROTOCOL))
             else:
-                self.CmdAckQueue.put(_CommandAck(result=res))
+                conn.send_bytes(_ACK_RESULT + _encode_values([res]))
 
-    def _api_setup(self, device_family, jlink_arm_dll_path, log, log_str, log_file):
+    def _api_setup(self, device_family, jlink_arm_dll_path, log, log_str, log_file, backend):
         """
         Method to instance the class API from the API module.
 
         """
-        return API.API(device_family, jlink_arm_dll_path, log=log, log_str=log_str, log_file_path=log_file)
+        return API.API(device_family, jlink_arm_dll_path, log=log, log_str=log_str, log_file_path=log_file, backend=backend)
+
+    def __getstate__(self):
+        """
+        Memoryviews cannot be pickled, which happens to this object when the subprocess is spawned instead of forked.
+
+        """
+        state = self.__dict__.copy()
+        state.pop('_shared_view', None)
+        return state
 
     def __enter__(self):
         self.open()
@@ -352,8 +638,242 @@ class MultiAPI(object):
     def __exit__(self, type, value, traceback):
         self.close()
         self.runner.terminate()
+        self.runner.join()
 
     def __del__(self):
         if self.runner.is_alive():
             self.close()
             self.runner.terminate()
+            self.runner.join()
+
+
+class MultiAPISession(object):
+    """
+    A MultiAPI worker leased from a MultiAPIPool and connected to one emulator. Has the same interface as MultiAPI, except that open() does nothing and close() returns the worker to the pool instead of closing the dll.
+
+    """
+
+    def __init__(self, pool, worker, serial_number):
+        self._pool = pool
+        self._worker = worker
+        self.serial_number = serial_number
+
+    def open(self):
+        pass
+
+    def close(self):
+        """
+        Disconnects from the emulator and returns the worker to the pool.
+
+        """
+        if self._worker is not None:
+            worker, self._worker = self._worker, None
+            self._pool._release(worker, self.serial_number)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._worker is None:
+            raise RuntimeError('The session has been closed.')
+        return getattr(self._worker, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class MultiAPIPool(object):
+    """
+    Pool of warm MultiAPI workers. Each worker is a subprocess with the nrfjprog DLL loaded and opened, which is leased to a session connected to one emulator and returned to the pool when the session is closed. Opening and closing sessions therefore never spawns a process or loads the dll.
+
+    """
+
+    def __init__(self, device_family, size, jlink_arm_dll_path=None, log=False, log_str=None, log_file_path=None, backend=None, lazy=False):
+        """
+        Constructor. Creates and opens size MultiAPI workers, or none if lazy is True.
+
+        @param enum, string or int device_family: The series of device pynrfjprog will interact with.
+        @param int size: Maximum number of workers, which is the maximum number of sessions open at the same time.
+        @param (optional) string jlink_arm_dll_path: Absolute path to the JLinkARM DLL that you want nrfjprog to use.
+        @param (optional) bool log: If present and true, will enable logging to sys.stderr with the default log string appended to the beginning of each debug output line.
+        @param (optional) string log_str: If present, will enable logging to sys.stderr with overwriten default log string appended to the beginning of each debug output line.
+        @param (optional) string log_file_path: If present, will enable logging to log_file specified.
+        @param (optional) object backend: If present, used in place of the nrfjprog DLL by every worker, each with its own copy, i.e. a Simulator.Simulator.
+        @param (optional) bool lazy: If True, a worker is only created when a lease or enum_emu_snr() finds no idle worker, so no more workers are created than are used at the same time.
+        """
+        if not isinstance(size, int) or size < 1:
+            raise ValueError('The size parameter must be a positive integer.')
+
+        self._worker_args = (device_family, jlink_arm_dll_path, log, log_str, log_file_path, backend)
+        self._size = size
+        self._worker_count = 0
+        self._condition = threading.Condition()
+        self._idle = []
+        self._leased_serial_numbers = set()
+        self._last_serial_number = {}
+        self._closed = False
+
+        if not lazy:
+            for i in range(size):
+                self._idle.append(self._spawn_worker())
+            self._worker_count = size
+
+    def lease(self, serial_number, jlink_speed_khz=API.API._DEFAULT_JLINK_SPEED_KHZ, timeout=None):
+        """
+        Leases a worker and connects it to the given emulator. A worker that served the same emulator before is preferred.
+
+        @param int serial_number: Serial number of the emulator to connect to.
+        @param (optional) int jlink_speed_khz: SWDCLK speed [kHz].
+        @param (optional) float timeout: Maximum time in seconds to wait for a worker to become available. Waits forever if not given.
+        @return MultiAPISession: Session connected to the emulator.
+        """
+        with self._condition:
+            if serial_number in self._leased_serial_numbers:
+                raise ValueError('The emulator {} is already leased.'.format(serial_number))
+
+            worker = self._acquire_worker(serial_number, timeout)
+            self._leased_serial_numbers.add(serial_number)
+
+        if worker is None:
+            try:
+                worker = self._spawn_reserved_worker()
+            except Exception:
+                with self._condition:
+                    self._leased_serial_numbers.discard(serial_number)
+                raise
+
+        try:
+            worker.connect_to_emu_with_snr(serial_number, jlink_speed_khz)
+        except Exception:
+            self._release(worker, serial_number, connected=False)
+            raise
+
+        return MultiAPISession(self, worker, serial_number)
+
+    def enum_emu_snr(self, timeout=None):
+        """
+        Enumerates the serial numbers of connected USB J-Link emulators using an idle worker.
+
+        @param (optional) float timeout: Maximum time in seconds to wait for a worker to become available. Waits forever if not given.
+        @return [int]: A list with the serial numbers.
+        """
+        with self._condition:
+            worker = self._acquire_worker(None, timeout)
+
+        if worker is None:
+            worker = self._spawn_reserved_worker()
+
+        try:
+            return worker.enum_emu_snr()
+        finally:
+            with self._condition:
+                self._idle.append(worker)
+                self._condition.notify()
+
+    def close(self):
+        """
+        Closes the dll in every idle worker and terminates the worker processes. Leased workers are terminated when their session is closed.
+
+        """
+        with self._condition:
+            self._closed = True
+            workers, self._idle = self._idle, []
+            self._condition.notify_all()
+
+        for worker in workers:
+            self._terminate_worker(worker)
+
+    def _acquire_worker(self, serial_number, timeout):
+        """
+        Removes an idle worker from the pool, waiting for one if needed. Returns None if there is no idle worker but the pool may grow, the caller must then create the worker reserved for it with _spawn_reserved_worker(). Must be called with self._condition held.
+
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._idle:
+            if self._closed:
+                raise RuntimeError('The pool has been closed.')
+            if self._worker_count < self._size:
+                self._worker_count += 1
+                return None
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                raise RuntimeError('No worker became available within {} seconds.'.format(timeout))
+            self._condition.wait(remaining)
+
+        if self._closed:
+            raise RuntimeError('The pool has been closed.')
+
+        for worker in self._idle:
+            if serial_number is not None and self._last_serial_number.get(id(worker)) == serial_number:
+                self._idle.remove(worker)
+                return worker
+
+        return self._idle.pop(0)
+
+    def _release(self, worker, serial_number, connected=True):
+        """
+        Disconnects the worker from its emulator, unless the session already did, and returns it to the pool. A worker that fails to disconnect is replaced by a fresh one, which has not served the emulator. If the replacement cannot be created either, its slot is given back to the pool and the error is raised, the emulator is released in any case.
+
+        """
+        leased_worker = worker
+        try:
+            if connected and worker.is_connected_to_emu():
+                worker.disconnect_from_emu()
+        except Exception:
+            self._terminate_worker(worker)
+            worker = None
+
+        closed_worker = None
+        try:
+            if worker is None:
+                worker = self._spawn_reserved_worker()
+        finally:
+            with self._condition:
+                self._leased_serial_numbers.discard(serial_number)
+                if worker is leased_worker:
+                    self._last_serial_number[id(worker)] = serial_number
+                if worker is not None:
+                    if self._closed:
+                        closed_worker = worker
+                    else:
+                        self._idle.append(worker)
+                        self._condition.notify()
+
+        if closed_worker is not None:
+            self._terminate_worker(closed_worker)
+
+    def _spawn_reserved_worker(self):
+        """
+        Creates a worker reserved by _acquire_worker(), or replacing a terminated one. The reservation is given back if the worker cannot be created.
+
+        """
+        try:
+            return self._spawn_worker()
+        except Exception:
+            with self._condition:
+                self._worker_count -= 1
+                self._condition.notify()
+            raise
+
+    def _spawn_worker(self):
+        device_family, jlink_arm_dll_path, log, log_str, log_file_path, backend = self._worker_args
+        worker = MultiAPI(device_family, jlink_arm_dll_path=jlink_arm_dll_path, log=log, log_str=log_str, log_file_path=log_file_path, backend=backend)
+        worker.open()
+        return worker
+
+    def _terminate_worker(self, worker):
+        self._last_serial_number.pop(id(worker), None)
+        try:
+            worker.close()
+        except Exception:
+            pass
+        worker.runner.terminate()
+        worker.runner.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
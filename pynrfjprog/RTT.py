@@ -0,0 +1,791 @@
+"""
+RTT module. Streams data from the RTT up channels of a device in a background thread and splits it into records.
+
+"""
+
+import codecs
+import collections
+import hashlib
+import io
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+
+DEFAULT_BUFFER_SIZE = 0x100000
+DEFAULT_READ_SIZE = 0x4000
+DEFAULT_MIN_INTERVAL = 0.001
+DEFAULT_MAX_INTERVAL = 0.05
+
+CONTROL_BLOCK_ID = b'SEGGER RTT'
+CONTROL_BLOCK_SYMBOL = '_SEGGER_RTT'
+RAM_START = 0x20000000
+
+_CONTROL_BLOCK_HEADER = struct.Struct('<16sii')
+_MAX_BUFFERS = 256
+
+
+class RingBuffer(object):
+    """
+    Fixed size byte ring buffer. When a write does not fit, the oldest data is dropped to make room and counted as an overflow. Not thread safe.
+
+    """
+    def __init__(self, size):
+        """
+        Constructor.
+
+        @param int size: Capacity of the buffer in bytes.
+        """
+        if size < 1:
+            raise ValueError('The size parameter must be at least 1.')
+
+        self._view = memoryview(bytearray(size))
+        self._size = size
+        self._start = 0
+        self._length = 0
+        self.overflow_bytes = 0
+        self.overflow_count = 0
+
+    def __len__(self):
+        return self._length
+
+    def write(self, data):
+        """
+        Appends data to the buffer, dropping the oldest data if it does not fit.
+
+        @param bytes-like data: Data to append.
+        """
+        data = memoryview(data)
+        length = len(data)
+        if length > self._size:
+            self._drop(self._length)
+            self.overflow_bytes += length - self._size
+            data = data[length - self._size:]
+            length = self._size
+        elif length > self._size - self._length:
+            self._drop(length - (self._size - self._length))
+
+        end = (self._start + self._length) % self._size
+        first = min(length, self._size - end)
+        self._view[end:end + first] = data[:first]
+        self._view[:length - first] = data[first:]
+        self._length += length
+
+    def readinto(self, buf):
+        """
+        Moves the oldest data of the buffer into buf.
+
+        @param writable buffer buf: Destination of the data.
+        @return int: Number of bytes moved.
+        """
+        view = memoryview(buf)
+        if view.format != 'B':
+            view = view.cast('B')
+        length = min(self._length, len(view))
+        first = min(length, self._size - self._start)
+        view[:first] = self._view[self._start:self._start + first]
+        view[first:length] = self._view[:length - first]
+        self._start = (self._start + length) % self._size
+        self._length -= length
+        return length
+
+    def read(self, size=-1):
+        """
+        Removes and returns the oldest data of the buffer.
+
+        @param (optional) int size: Maximum number of bytes to return. All the data is returned if negative.
+        @return bytes: Data read.
+        """
+        data = bytearray(self._length if size < 0 else min(size, self._length))
+        self.readinto(data)
+        return bytes(data)
+
+    def _drop(self, length):
+        self._start = (self._start + length) % self._size
+        self._length -= length
+        self.overflow_bytes += length
+        self.overflow_count += 1
+
+
+class LineFramer(object):
+    """
+    Incremental splitter of a byte stream into lines. Text is decoded with an incremental decoder, so multi-byte characters split across chunks are decoded correctly.
+
+    """
+    def __init__(self, encoding='utf-8', errors='replace', keepends=False):
+        """
+        Constructor.
+
+        @param (optional) str or None encoding: Encoding of the text. The lines are returned as bytes if None.
+        @param (optional) str errors: Error handler of the decoder, see codecs.
+        @param (optional) bool keepends: If True, the lines are returned with their line terminator.
+        """
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors) if encoding is not None else None
+        self._newline = '\n' if encoding is not None else b'\n'
+        self._empty = '' if encoding is not None else b''
+        self._keepends = keepends
+        self._pending = []
+
+    def feed(self, data):
+        """
+        Adds a chunk of the stream. The chunks of an incomplete line are kept in a list and only joined once the line is complete, so a long line fed in small chunks costs time linear in its length.
+
+        @param bytes-like data: Chunk of the stream.
+        @return list: Lines completed by the chunk.
+        """
+        if self._decoder is not None:
+            text = self._decoder.decode(data)
+        else:
+            text = data.tobytes() if isinstance(data, memoryview) else bytes(data)
+
+        if self._newline not in text:
+            if text:
+                self._pending.append(text)
+            return []
+
+        self._pending.append(text)
+        lines = self._empty.join(self._pending).split(self._newline)
+        rest = lines.pop()
+        self._pending = [rest] if rest else []
+        if self._keepends:
+            lines = [line + self._newline for line in lines]
+        return lines
+
+
+class LengthPrefixFramer(object):
+    """
+    Incremental splitter of a byte stream into records that start with their length.
+
+    """
+    def __init__(self, header_format='<H', max_length=None):
+        """
+        Constructor.
+
+        @param (optional) str header_format: struct format of the length that precedes each record, i.e. '<H' or '<I'.
+        @param (optional) int max_length: Maximum length of a record. A longer length in the stream is taken as corrupted data. Defaults to the largest length the header can hold.
+        """
+        self._header = struct.Struct(header_format)
+        self._max_length = (1 << 8 * self._header.size) - 1 if max_length is None else max_length
+        self._pending = bytearray()
+
+    def feed(self, data):
+        """
+        Adds a chunk of the stream.
+
+        @param bytes-like data: Chunk of the stream.
+        @return [bytes]: Records completed by the chunk, without their length.
+        @raise ValueError: A record is longer than max_length. The pending data is discarded, so the framer can be fed again from the start of a record.
+        """
+        self._pending += data
+
+        records = []
+        start = 0
+        while len(self._pending) - start >= self._header.size:
+            length = self._header.unpack_from(self._pending, start)[0]
+            if length > self._max_length:
+                del self._pending[:]
+                raise ValueError('A record of {} bytes is longer than the maximum of {}.'.format(length, self._max_length))
+            end = start + self._header.size + length
+            if end > len(self._pending):
+                break
+            records.append(bytes(self._pending[start + self._header.size:end]))
+            start = end
+
+        del self._pending[:start]
+        return records
+
+    def encode(self, record):
+        """
+        Returns a record prefixed with its length, i.e. to be written to a down channel.
+
+        @param bytes-like record: Record to encode.
+        @return bytes: Encoded record.
+        """
+        if len(record) > self._max_length:
+            raise ValueError('The record must be at most {} bytes long.'.format(self._max_length))
+
+        return self._header.pack(len(record)) + bytes(record)
+
+
+class COBSFramer(object):
+    """
+    Incremental splitter of a byte stream into records encoded with Consistent Overhead Byte Stuffing and delimited by zero bytes. Records that are not valid COBS are counted in errors and skipped.
+
+    """
+    def __init__(self):
+        self._pending = bytearray()
+        self.errors = 0
+
+    def feed(self, data):
+        """
+        Adds a chunk of the stream.
+
+        @param bytes-like data: Chunk of the stream.
+        @return [bytes]: Decoded records completed by the chunk.
+        """
+        searched = len(self._pending)
+        self._pending += data
+
+        records = []
+        start = 0
+        end = self._pending.find(b'\0', searched)
+        while end >= 0:
+            if end > start:
+                record = self._decode(start, end)
+                if record is None:
+                    self.errors += 1
+                else:
+                    records.append(record)
+            start = end + 1
+            end = self._pending.find(b'\0', start)
+
+        del self._pending[:start]
+        return records
+
+    @staticmethod
+    def encode(record):
+        """
+        Returns a record encoded with COBS and terminated by a zero byte, i.e. to be written to a down channel.
+
+        @param bytes-like record: Record to encode.
+        @return bytes: Encoded record.
+        """
+        encoded = bytearray([0])
+        code_index = 0
+        for byte in bytearray(record):
+            if byte:
+                encoded.append(byte)
+            if not byte or len(encoded) - code_index == 0xFF:
+                encoded[code_index] = len(encoded) - code_index
+                code_index = len(encoded)
+                encoded.append(0)
+        encoded[code_index] = len(encoded) - code_index
+        encoded.append(0)
+        return bytes(encoded)
+
+    def _decode(self, start, end):
+        record = bytearray()
+        while start < end:
+            code = self._pending[start]
+            if start + code > end:
+                return None
+            record += self._pending[start + 1:start + code]
+            start += code
+            if code < 0xFF and start < end:
+                record.append(0)
+        return bytes(record)
+
+
+class RTTChannelStats(object):
+    """
+    Counters of one up channel of an RTTStream.
+
+    """
+    def __init__(self, bytes_received, bytes_buffered, overflow_bytes, overflow_count):
+        self.bytes_received = bytes_received
+        self.bytes_buffered = bytes_buffered
+        self.overflow_bytes = overflow_bytes
+        self.overflow_count = overflow_count
+
+    def __repr__(self):
+        return 'RTTChannelStats(received={}, buffered={}, overflow_bytes={}, overflow_count={})'.format(self.bytes_received, self.bytes_buffered, self.overflow_bytes, self.overflow_count)
+
+
+class RTTStream(object):
+    """
+    Polls RTT up channels from a background thread into one ring buffer per channel. By default every up channel is drained in one pass with api.rtt_read_all(), which costs a single round trip to the subprocess of a MultiAPI. The thread polls again right away while a channel has data and backs off exponentially up to max_interval while all channels are idle. When the reader falls behind, the oldest data of the channel is dropped and counted, see stats().
+
+    RTT must have been started on the API instance, and while the stream runs the instance must only be used by the stream. Writes to down channels are queued with write() and done by the polling thread.
+    """
+
+    def __init__(self, api, channels=None, buffer_size=DEFAULT_BUFFER_SIZE, read_size=DEFAULT_READ_SIZE, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL):
+        """
+        Constructor.
+
+        @param API or MultiAPI api: API instance with RTT started.
+        @param (optional) sequence channels: Indexes of the up channels to read, each with its own call to api.rtt_read_into(). All the up channels that have a buffer on the device are read with api.rtt_read_all() if None.
+        @param (optional) int buffer_size: Size of the ring buffer of each channel in bytes.
+        @param (optional) int read_size: Maximum number of bytes read from a channel with each call to api.rtt_read_into(). Not used if channels is None.
+        @param (optional) float min_interval: Poll interval [s] after the first idle poll.
+        @param (optional) float max_interval: Maximum poll interval [s] while all channels are idle.
+        """
+        if channels is not None and not channels:
+            raise ValueError('The channels parameter must contain at least one channel index.')
+
+        if read_size < 1:
+            raise ValueError('The read_size parameter must be at least 1.')
+
+        if not 0 < min_interval <= max_interval:
+            raise ValueError('The min_interval and max_interval parameters must satisfy 0 < min_interval <= max_interval.')
+
+        self._api = api
+        self._read_all = channels is None
+        self._channels = [index for index, name, size in api.rtt_up_channels()] if channels is None else list(channels)
+        self._buffers = dict((channel, RingBuffer(buffer_size)) for channel in self._channels)
+        self._received = dict((channel, 0) for channel in self._channels)
+        self._scratch = dict((channel, bytearray(read_size)) for channel in self._channels) if channels is not None else None
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._writes = collections.deque()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._polling = False
+        self.error = None
+
+    def start(self):
+        """
+        Starts the polling thread.
+
+        """
+        if self._thread is not None:
+            raise RuntimeError('The stream has already been started.')
+
+        self._polling = True
+        self._thread = threading.Thread(target=self._poll)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the polling thread. Data already buffered can still be read.
+
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def running(self):
+        return self._polling
+
+    def read(self, channel, size=-1, timeout=None):
+        """
+        Reads buffered data of a channel, waiting for data if there is none.
+
+        @param int channel: Up channel to read.
+        @param (optional) int size: Maximum number of bytes to return. All the buffered data is returned if negative.
+        @param (optional) float timeout: Maximum time to wait for data [s]. Waits until data arrives or the stream stops if None.
+        @return bytes: Data read. Empty if the timeout expired or the stream stopped without more data.
+        """
+        with self._condition:
+            if self._wait_for_data(channel, timeout):
+                return self._buffers[channel].read(size)
+            return b''
+
+    def readinto(self, channel, buf, timeout=None):
+        """
+        Reads buffered data of a channel into buf, waiting for data if there is none.
+
+        @param int channel: Up channel to read.
+        @param writable buffer buf: Destination of the data.
+        @param (optional) float timeout: Maximum time to wait for data [s]. Waits until data arrives or the stream stops if None.
+        @return int: Number of bytes read. 0 if the timeout expired or the stream stopped without more data.
+        """
+        with self._condition:
+            if self._wait_for_data(channel, timeout):
+                return self._buffers[channel].readinto(buf)
+            return 0
+
+    def iter_chunks(self, channel):
+        """
+        Generator of the data of a channel, in chunks as they arrive. Ends when the stream stops and the buffered data has been consumed.
+
+        @param int channel: Up channel to read.
+        """
+        while True:
+            data = self.read(channel)
+            if not data:
+                return
+            yield data
+
+    def iter_records(self, channel, framer):
+        """
+        Generator of the records of a channel, split by a framer as the data arrives. Ends when the stream stops and the buffered data has been consumed.
+
+        @param int channel: Up channel to read.
+        @param LineFramer, LengthPrefixFramer or COBSFramer framer: Framer that splits the data of the channel into records.
+        """
+        for data in self.iter_chunks(channel):
+            for record in framer.feed(data):
+                yield record
+
+    def channel(self, channel):
+        """
+        Returns a file-like object that reads a channel. It is buffered, so readline() and iteration over lines work as for a file opened in binary mode. Reaches end of file when the stream stops and the buffered data has been consumed.
+
+        @param int channel: Up channel to read.
+        @return io.BufferedReader: Reader of the channel.
+        """
+        return io.BufferedReader(_RTTChannelIO(self, channel))
+
+    def write(self, channel, data):
+        """
+        Queues data to be written to a down channel by the polling thread. Data that does not fit in the down buffer of the device is retried on the next polls, in order.
+
+        @param int channel: Down channel to write.
+        @param bytes-like data: Data to write.
+        """
+        data = bytearray(data)
+        if data:
+            with self._condition:
+                self._writes.append((channel, data))
+
+    def stats(self, channel):
+        """
+        Returns the counters of a channel.
+
+        @param int channel: Up channel.
+        @return RTTChannelStats: Counters of the channel.
+        """
+        with self._condition:
+            buffer = self._buffers[channel]
+            return RTTChannelStats(self._received[channel], len(buffer), buffer.overflow_bytes, buffer.overflow_count)
+
+    def _wait_for_data(self, channel, timeout):
+        """
+        Waits until the channel has data. Must be called with self._condition held. Raises the error that stopped the polling thread once the buffered data is consumed.
+
+        """
+        buffer = self._buffers[channel]
+        deadline = None if timeout is None else time.time() + timeout
+        while not buffer and self._polling:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            self._condition.wait(remaining)
+        if not buffer and self.error is not None:
+            raise self.error
+        return len(buffer) > 0
+
+    def _poll(self):
+        interval = 0.0
+        try:
+            while not self._stop_event.is_set():
+                self._flush_writes()
+
+                if self._read_all:
+                    data = self._api.rtt_read_all()
+                else:
+                    data = {}
+                    for channel in self._channels:
+                        length = self._api.rtt_read_into(channel, self._scratch[channel])
+                        if length:
+                            data[channel] = memoryview(self._scratch[channel])[:length]
+
+                received = 0
+                if data:
+                    with self._condition:
+                        for channel, chunk in data.items():
+                            if channel in self._buffers:
+                                self._buffers[channel].write(chunk)
+                                self._received[channel] += len(chunk)
+                                received += len(chunk)
+                        self._condition.notify_all()
+
+                interval = 0.0 if received else min(max(interval * 2, self._min_interval), self._max_interval)
+                if interval:
+                    self._stop_event.wait(interval)
+        except Exception as error:
+            self.error = error
+        finally:
+            with self._condition:
+                self._polling = False
+                self._condition.notify_all()
+
+    def _flush_writes(self):
+        while True:
+            with self._condition:
+                if not self._writes:
+                    return
+                channel, data = self._writes[0]
+
+            written = self._api.rtt_write(channel, data, None)
+
+            with self._condition:
+                del data[:written]
+                if data:
+                    return
+                self._writes.popleft()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+
+class _RTTChannelIO(io.RawIOBase):
+    """
+    Raw binary stream over one up channel of an RTTStream, used by RTTStream.channel().
+
+    """
+    def __init__(self, stream, channel):
+        io.RawIOBase.__init__(self)
+        self._stream = stream
+        self._channel = channel
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        return self._stream.readinto(self._channel, buf)
+
+
+class ControlBlockCache(object):
+    """
+    Addresses of RTT control blocks by firmware build, optionally persisted to a JSON file.
+
+    """
+    def __init__(self, path=None):
+        """
+        Constructor.
+
+        @param (optional) str path: If present, the addresses are loaded from and stored to this file.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._addresses = {}
+        if path is not None and os.path.isfile(path):
+            with open(path) as file:
+                self._addresses = json.load(file)
+
+    def get(self, build_id):
+        """
+        Returns the control block address of a firmware build, or None if not known.
+
+        @param str build_id: Identifier of the firmware build, see firmware_build_id().
+        @return int or None: Address of the control block.
+        """
+        with self._lock:
+            return self._addresses.get(build_id)
+
+    def set(self, build_id, address):
+        """
+        Stores the control block address of a firmware build.
+
+        @param str build_id: Identifier of the firmware build, see firmware_build_id().
+        @param int address: Address of the control block.
+        """
+        with self._lock:
+            if self._addresses.get(build_id) == address:
+                return
+            self._addresses[build_id] = address
+            if self._path is not None:
+                self._store()
+
+    def _store(self):
+        """
+        Writes the addresses under a unique temporary name and renames the file, so that concurrent readers never see a partial file. A file that cannot be written is skipped, the addresses are then only kept in memory.
+
+        """
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(self._path)))
+        except (IOError, OSError):
+            return
+
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self._addresses, file)
+            getattr(os, 'replace', os.rename)(tmp_path, self._path)
+        except (IOError, OSError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_default_cache = ControlBlockCache()
+
+
+def firmware_build_id(path):
+    """
+    Returns an identifier of a firmware build: the GNU build ID of an ELF file that has one, otherwise the SHA-1 of the file.
+
+    @param str path: Path of the firmware file (ELF, hex or binary).
+    @return str: Identifier of the build.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    if data[:4] == b'\x7fELF':
+        build_id = _elf_build_id(data)
+        if build_id is not None:
+            return build_id
+
+    return hashlib.sha1(data).hexdigest()
+
+
+def find_control_block_in_elf(path, symbol=CONTROL_BLOCK_SYMBOL):
+    """
+    Returns the address of the RTT control block from the symbol table of an ELF file.
+
+    @param str path: Path of the ELF file.
+    @param (optional) str symbol: Name of the control block symbol.
+    @return int or None: Address of the control block, or None if the symbol is not found.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    if data[:4] != b'\x7fELF':
+        raise ValueError('{} is not an ELF file.'.format(path))
+
+    return _elf_symbol_address(data, symbol.encode('ascii'))
+
+
+def find_control_block(api, ram_start=RAM_START, ram_size=None, chunk_size=0x10000):
+    """
+    Searches the RAM of the device for the RTT control block, reading it in large chunks.
+
+    @param API or MultiAPI api: Connected API instance.
+    @param (optional) int ram_start: Start address of the RAM.
+    @param (optional) int ram_size: Size of the RAM in bytes. Read with api.read_ram_sections_size() if not given.
+    @param (optional) int chunk_size: Number of bytes read with each call to api.read_into().
+    @return int or None: Address of the control block, or None if it is not found.
+    """
+    if ram_size is None:
+        ram_size = sum(api.read_ram_sections_size())
+
+    if chunk_size < _CONTROL_BLOCK_HEADER.size:
+        raise ValueError('The chunk_size parameter must be at least {}.'.format(_CONTROL_BLOCK_HEADER.size))
+
+    # Consecutive chunks overlap by the size of the header minus one, so a control block across a chunk boundary is found in the second one.
+    overlap = _CONTROL_BLOCK_HEADER.size - 1
+    buf = bytearray(chunk_size)
+    offset = 0
+    while offset < ram_size:
+        length = min(chunk_size, ram_size - offset)
+        if length < _CONTROL_BLOCK_HEADER.size:
+            break
+        if length < len(buf):
+            buf = bytearray(length)
+        api.read_into(ram_start + offset, buf)
+
+        index = buf.find(CONTROL_BLOCK_ID, 0, length)
+        while index >= 0:
+            if index + _CONTROL_BLOCK_HEADER.size <= length and _is_control_block(buf, index):
+                return ram_start + offset + index
+            index = buf.find(CONTROL_BLOCK_ID, index + 1, length)
+
+        offset += length - overlap
+
+    return None
+
+
+def start_rtt(api, firmware_path=None, build_id=None, cache=None, timeout=1.0, **find_args):
+    """
+    Starts RTT with the address of the control block given to the dll, so that the dll does not search the RAM for it. The address is taken from the ELF symbol table when an ELF file is given, otherwise from the cache when the build is known, otherwise it is searched for with find_control_block() and cached for the build.
+
+    @param API or MultiAPI api: Connected API instance.
+    @param (optional) str firmware_path: Path of the firmware running on the device. Used for the control block symbol if it is an ELF file, and to identify the build if build_id is not given.
+    @param (optional) str build_id: Identifier of the firmware build, used as cache key.
+    @param (optional) ControlBlockCache cache: Cache of control block addresses. The module's default in-memory cache is used if not given.
+    @param (optional) float timeout: Maximum time to wait for the dll to find the control block [s].
+    @param find_args: Parameters passed on to find_control_block().
+    @return int: Address of the control block.
+    """
+    cache = cache if cache is not None else _default_cache
+    if build_id is None and firmware_path is not None:
+        build_id = firmware_build_id(firmware_path)
+
+    address = None
+    if firmware_path is not None and _is_elf(firmware_path):
+        address = find_control_block_in_elf(firmware_path)
+
+    if address is None and build_id is not None:
+        address = cache.get(build_id)
+        if address is not None:
+            header = api.read(address, _CONTROL_BLOCK_HEADER.size, True)
+            if not _is_control_block(header, 0):
+                address = None
+
+    if address is None:
+        address = find_control_block(api, **find_args)
+        if address is None:
+            raise RuntimeError('The RTT control block was not found in RAM.')
+
+    if build_id is not None:
+        cache.set(build_id, address)
+
+    api.rtt_set_control_block_address(address)
+    api.rtt_start()
+
+    deadline = time.time() + timeout
+    while not api.rtt_is_control_block_found():
+        if time.time() > deadline:
+            raise RuntimeError('The dll did not find the RTT control block at 0x{:08X}.'.format(address))
+        time.sleep(0.01)
+
+    return address
+
+
+def _is_control_block(data, offset):
+    """
+    Checks that the ID at offset is followed by its zero padding and sane buffer counts, to skip copies of the ID string in other data.
+
+    """
+    id, up_buffers, down_buffers = _CONTROL_BLOCK_HEADER.unpack_from(data, offset)
+    return id.rstrip(b'\0') == CONTROL_BLOCK_ID and 0 < up_buffers <= _MAX_BUFFERS and 0 <= down_buffers <= _MAX_BUFFERS
+
+
+def _is_elf(path):
+    with open(path, 'rb') as file:
+        return file.read(4) == b'\x7fELF'
+
+
+def _elf_sections(data):
+    """
+    Returns the byte order prefix, the word size and the (type, offset, size, link) of the sections of an ELF image.
+
+    """
+    is_64 = bytearray(data[4:5])[0] == 2
+    order = '<' if bytearray(data[5:6])[0] == 1 else '>'
+    if is_64:
+        shoff, = struct.unpack_from(order + 'Q', data, 0x28)
+        shentsize, shnum = struct.unpack_from(order + 'HH', data, 0x3A)
+        section = struct.Struct(order + 'IIQQQQIIQQ')
+    else:
+        shoff, = struct.unpack_from(order + 'I', data, 0x20)
+        shentsize, shnum = struct.unpack_from(order + 'HH', data, 0x2E)
+        section = struct.Struct(order + 'IIIIIIIIII')
+
+    sections = []
+    for index in range(shnum):
+        name, type, flags, addr, offset, size, link, info, addralign, entsize = section.unpack_from(data, shoff + index * shentsize)
+        sections.append((type, offset, size, link))
+    return order, is_64, sections
+
+
+def _elf_symbol_address(data, name):
+    order, is_64, sections = _elf_sections(data)
+    symbol = struct.Struct(order + ('IBBHQQ' if is_64 else 'IIIBBH'))
+    for type, offset, size, link in sections:
+        if type not in (2, 11):  # SHT_SYMTAB, SHT_DYNSYM
+            continue
+        strtab_offset = sections[link][1]
+        for entry in range(offset, offset + size - symbol.size + 1, symbol.size):
+            fields = symbol.unpack_from(data, entry)
+            name_offset, value = (fields[0], fields[4]) if is_64 else (fields[0], fields[1])
+            if data[strtab_offset + name_offset:strtab_offset + name_offset + len(name) + 1] == name + b'\0':
+                return value
+    return None
+
+
+def _elf_build_id(data):
+    order, is_64, sections = _elf_sections(data)
+    note = struct.Struct(order + 'III')
+    for type, offset, size, link in sections:
+        if type != 7:  # SHT_NOTE
+            continue
+        position = offset
+        while position + note.size <= offset + size:
+            namesz, descsz, note_type = note.unpack_from(data, position)
+            name_start = position + note.size
+            desc_start = name_start + ((namesz + 3) & ~3)
+            if note_type == 3 and data[name_start:name_start + namesz] == b'GNU\0':  # NT_GNU_BUILD_ID
+                return codecs.encode(data[desc_start:desc_start + descsz], 'hex').decode('ascii')
+            position = desc_start + ((descsz + 3) & ~3)
+    return None
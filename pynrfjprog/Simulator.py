@@ -0,0 +1,799 @@
+"""
+Simulator module. Pure-Python stand-in for the nrfjprog DLL, for testing and benchmarking the Python layers without an emulator or a device.
+
+Pass a Simulator as the backend parameter of API, MultiAPI or GangProgrammer. It implements the NRFJPROG_* functions with the calling convention of nrfjprogdll.h and models one nRF51 or nRF52 device: code flash pages, UICR, FICR, RAM, the NVMC, RTT channels and an external QSPI flash. The CRC32 routine of API.verify_image() and the flash loader of API.program_image() are recognized when started with run() and replaced by Python equivalents. Their Thumb machine code is never executed, so tests against the simulator do not cover it.
+"""
+
+from __future__ import division
+
+import ctypes
+import struct
+import time
+import zlib
+
+try:
+    from . import API
+except Exception:
+    import API
+
+Err = API.NrfjprogdllErr
+
+DEFAULT_SERIAL_NUMBER = 682000001
+
+_FICR_ADDR = 0x10000000
+_UICR_ADDR = 0x10001000
+_INFO_SIZE = 0x1000
+_RAM_ADDR = 0x20000000
+_PERIPHERAL_ADDR = 0x40000000
+
+_NVMC_READY_ADDR = 0x4001E400
+_NVMC_CONFIG_ADDR = 0x4001E504
+_NVMC_ERASEPAGE_ADDR = 0x4001E508
+_NVMC_ERASEALL_ADDR = 0x4001E50C
+_NVMC_ERASEUICR_ADDR = 0x4001E514
+_NVMC_WEN = 1
+_NVMC_EEN = 2
+
+_QSPI_ERASE_SIZES = {API.QSPIEraseLen.ERASE4KB: 0x1000, API.QSPIEraseLen.ERASE32KB: 0x8000, API.QSPIEraseLen.ERASE64KB: 0x10000}
+
+_DEVICES = {
+    API.DeviceFamily.NRF51: (API.DeviceVersion.NRF51xxx_xxAC_REV3, 0x40000, 0x400, 0x8000, 0x1000),
+    API.DeviceFamily.NRF52: (API.DeviceVersion.NRF52832_xxAA_REV1, 0x80000, 0x1000, 0x10000, 0x2000),
+}
+
+
+class Simulator(object):
+    """
+    Simulated nrfjprog DLL with one emulator and one device attached. The functions check their arguments like the DLL does and return its error codes, all memory starts erased.
+
+    """
+
+    def __init__(self, device_family=API.DeviceFamily.NRF52, serial_number=DEFAULT_SERIAL_NUMBER, rtt_channels=(('Terminal', 0x400, 0x10),), qspi_size=0x800000, swd_bytes_per_second=None, call_latency=0.0):
+        """
+        Constructor.
+
+        @param (optional) DeviceFamily device_family: Family of the simulated device. Its flash, page and RAM sizes are those of an nRF51822 xxAC or an nRF52832 xxAA.
+        @param (optional) int serial_number: Serial number of the simulated emulator.
+        @param (optional) sequence rtt_channels: (name, up buffer size, down buffer size) of each RTT channel.
+        @param (optional) int qspi_size: Size of the external QSPI flash in bytes.
+        @param (optional) float swd_bytes_per_second: If present, memory and QSPI transfers are slowed down to this throughput.
+        @param (optional) float call_latency: Time [s] each call takes, on top of its transfer time. A USB round trip to a J-Link takes about 0.0005 s.
+        """
+        self.device_family = API.DeviceFamily(device_family)
+        self.device_version, flash_size, self.page_size, ram_size, self.ram_section_size = _DEVICES[self.device_family]
+        self.serial_number = serial_number
+        self.swd_bytes_per_second = swd_bytes_per_second
+        self.call_latency = call_latency
+
+        self.flash = bytearray(b'\xFF') * flash_size
+        self.uicr = bytearray(b'\xFF') * _INFO_SIZE
+        self.ficr = bytearray(b'\xFF') * _INFO_SIZE
+        struct.pack_into('<II', self.ficr, 0x10, self.page_size, flash_size // self.page_size)
+        self.ram = bytearray(ram_size)
+        self.qspi = bytearray(b'\xFF') * qspi_size
+        self.registers = {}
+        self.cpu_registers = dict((register, 0) for register in API.CpuRegister)
+        self.debug_port_registers = {}
+        self.access_port_registers = {}
+        self.ram_power = [API.RamPower.ON] * (ram_size // self.ram_section_size)
+
+        self.rtt_channels = [(name, bytearray(), up_size, bytearray(), down_size) for name, up_size, down_size in rtt_channels]
+
+        self.protection = API.ReadbackProtection.NONE
+        self.halted = False
+        self.dll_open = False
+        self.emu_connected = False
+        self.device_connected = False
+        self.rtt_started = False
+        self.qspi_initialized = False
+        self.calls = 0
+        self.flash_word_writes = 0
+
+        self._loader = None
+        self._busy_until = 0.0
+
+    def target_rtt_write(self, channel_index, data):
+        """
+        Writes data to an RTT up channel as the firmware would. Data that does not fit into the up buffer is dropped.
+
+        @param int channel_index: RTT channel to write.
+        @param bytes-like data: Data to write.
+        @return int: Number of bytes written.
+        """
+        name, up, up_size, down, down_size = self.rtt_channels[channel_index]
+        data = bytes(data)[:max(0, up_size - 1 - len(up))]
+        up.extend(data)
+        return len(data)
+
+    def target_rtt_read(self, channel_index):
+        """
+        Reads the data written to an RTT down channel as the firmware would.
+
+        @param int channel_index: RTT channel to read.
+        @return bytes: Data read.
+        """
+        down = self.rtt_channels[channel_index][3]
+        data = bytes(down)
+        del down[:]
+        return data
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    """
+    nrfjprog DLL functions.
+
+    """
+    def NRFJPROG_dll_version(self, major, minor, revision):
+        _out(major, 6)
+        _out(minor, 20)
+        _out(revision, ord('a'))
+        return Err.SUCCESS
+
+    def NRFJPROG_is_dll_open(self, opened):
+        _out(opened, self.dll_open)
+        return Err.SUCCESS
+
+    def NRFJPROG_open_dll(self, jlink_arm_dll_path, log_str_cb, device_family):
+        if self.dll_open:
+            return Err.INVALID_OPERATION
+        if _int(device_family) not in (self.device_family, API.DeviceFamily.UNKNOWN):
+            return Err.WRONG_FAMILY_FOR_DEVICE
+        self.dll_open = True
+        return Err.SUCCESS
+
+    def NRFJPROG_close_dll(self):
+        self.dll_open = self.emu_connected = self.device_connected = self.rtt_started = self.qspi_initialized = False
+
+    def NRFJPROG_enum_emu_snr(self, serial_numbers, serial_numbers_len, num_available):
+        if not self.dll_open:
+            return Err.INVALID_OPERATION
+        if _int(serial_numbers_len) > 0:
+            _deref(serial_numbers)[0] = self.serial_number
+        _out(num_available, 1)
+        return Err.SUCCESS
+
+    def NRFJPROG_is_connected_to_emu(self, is_connected_to_emu):
+        if not self.dll_open:
+            return Err.INVALID_OPERATION
+        _out(is_connected_to_emu, self.emu_connected)
+        return Err.SUCCESS
+
+    def NRFJPROG_connect_to_emu_with_snr(self, serial_number, jlink_speed_khz):
+        if not self.dll_open or self.emu_connected:
+            return Err.INVALID_OPERATION
+        if _int(serial_number) != self.serial_number:
+            return Err.EMULATOR_NOT_CONNECTED
+        self.emu_connected = True
+        return Err.SUCCESS
+
+    def NRFJPROG_connect_to_emu_without_snr(self, jlink_speed_khz):
+        return self.NRFJPROG_connect_to_emu_with_snr(self.serial_number, jlink_speed_khz)
+
+    def NRFJPROG_read_connected_emu_snr(self, serial_number):
+        error = self._check(device=False)
+        if error:
+            return error
+        _out(serial_number, self.serial_number)
+        return Err.SUCCESS
+
+    def NRFJPROG_read_connected_emu_fwstr(self, fwstr, buffer_size):
+        error = self._check(device=False)
+        if error:
+            return error
+        _store(fwstr, b'Simulated J-Link\0'[:_int(buffer_size)])
+        return Err.SUCCESS
+
+    def NRFJPROG_disconnect_from_emu(self):
+        if not self.dll_open:
+            return Err.INVALID_OPERATION
+        self.emu_connected = self.device_connected = self.rtt_started = self.qspi_initialized = False
+        return Err.SUCCESS
+
+    def NRFJPROG_recover(self):
+        error = self._check(device=False)
+        if error:
+            return error
+        self._erase_all()
+        self.ram[:] = bytearray(len(self.ram))
+        self.device_connected = True
+        return Err.SUCCESS
+
+    def NRFJPROG_is_connected_to_device(self, is_connected_to_device):
+        error = self._check(device=False)
+        if error:
+            return error
+        _out(is_connected_to_device, self.device_connected)
+        return Err.SUCCESS
+
+    def NRFJPROG_connect_to_device(self):
+        error = self._check(device=False)
+        if error:
+            return error
+        self.device_connected = True
+        return Err.SUCCESS
+
+    def NRFJPROG_disconnect_from_device(self):
+        error = self._check(device=False)
+        if error:
+            return error
+        self.device_connected = False
+        return Err.SUCCESS
+
+    def NRFJPROG_readback_protect(self, desired_protection_level):
+        error = self._check()
+        if error:
+            return error
+        self.protection = API.ReadbackProtection(_int(desired_protection_level))
+        return Err.SUCCESS
+
+    def NRFJPROG_readback_status(self, status):
+        error = self._check(protection=False)
+        if error:
+            return error
+        _out(status, self.protection)
+        return Err.SUCCESS
+
+    def NRFJPROG_read_region_0_size_and_source(self, size, source):
+        error = self._check()
+        if error:
+            return error
+        _out(size, 0)
+        _out(source, API.Region0Source.NO_REGION_0)
+        return Err.SUCCESS
+
+    def NRFJPROG_debug_reset(self):
+        return self._reset()
+
+    def NRFJPROG_sys_reset(self):
+        return self._reset()
+
+    def NRFJPROG_pin_reset(self):
+        return self._reset()
+
+    def NRFJPROG_disable_bprot(self):
+        return self._check()
+
+    def NRFJPROG_erase_all(self):
+        error = self._check(protection=False)
+        if error:
+            return error
+        self._erase_all()
+        return Err.SUCCESS
+
+    def NRFJPROG_erase_page(self, addr):
+        error = self._check()
+        if error:
+            return error
+        addr = _int(addr)
+        if addr >= len(self.flash):
+            return Err.INVALID_PARAMETER
+        self._erase_page(addr)
+        return Err.SUCCESS
+
+    def NRFJPROG_erase_uicr(self):
+        error = self._check()
+        if error:
+            return error
+        self._delay(0)
+        self.uicr[:] = bytearray(b'\xFF') * _INFO_SIZE
+        return Err.SUCCESS
+
+    def NRFJPROG_write_u32(self, addr, data, control):
+        return self.NRFJPROG_write(addr, ctypes.byref(ctypes.c_uint32(_int(data))), 4, control)
+
+    def NRFJPROG_read_u32(self, addr, data):
+        value = ctypes.c_uint32()
+        error = self.NRFJPROG_read(addr, ctypes.byref(value), 4)
+        _out(data, value.value)
+        return error
+
+    def NRFJPROG_write(self, addr, data, data_len, control):
+        error = self._check()
+        if error:
+            return error
+        addr, data_len = _int(addr), _int(data_len)
+        self._delay(data_len)
+        return self._write_memory(addr, _load(data, data_len), bool(_int(control)))
+
+    def NRFJPROG_read(self, addr, data, data_len):
+        error = self._check()
+        if error:
+            return error
+        addr, data_len = _int(addr), _int(data_len)
+        self._step_loader()
+        self._delay(data_len)
+        value = self._read_memory(addr, data_len)
+        if value is None:
+            return Err.INVALID_PARAMETER
+        _store(data, value)
+        return Err.SUCCESS
+
+    def NRFJPROG_is_halted(self, is_halted):
+        error = self._check()
+        if error:
+            return error
+        self._step_loader()
+        _out(is_halted, self.halted)
+        return Err.SUCCESS
+
+    def NRFJPROG_halt(self):
+        error = self._check()
+        if error:
+            return error
+        self._loader = None
+        self.halted = True
+        return Err.SUCCESS
+
+    def NRFJPROG_run(self, pc, sp):
+        error = self._check()
+        if error:
+            return error
+        self.cpu_registers[API.CpuRegister.R15] = _int(pc)
+        self.cpu_registers[API.CpuRegister.R13] = self.cpu_registers[API.CpuRegister.MSP] = _int(sp)
+        return self._start_cpu()
+
+    def NRFJPROG_go(self):
+        error = self._check()
+        if error:
+            return error
+        return self._start_cpu()
+
+    def NRFJPROG_step(self):
+        return self._check()
+
+    def NRFJPROG_read_ram_sections_count(self, count):
+        error = self._check()
+        if error:
+            return error
+        _out(count, len(self.ram_power))
+        return Err.SUCCESS
+
+    def NRFJPROG_read_ram_sections_size(self, sections_size, sections_size_list_size):
+        error = self._check()
+        if error:
+            return error
+        for index in range(min(len(self.ram_power), _int(sections_size_list_size))):
+            _deref(sections_size)[index] = self.ram_section_size
+        return Err.SUCCESS
+
+    def NRFJPROG_read_ram_sections_power_status(self, status, status_size):
+        error = self._check()
+        if error:
+            return error
+        for index in range(min(len(self.ram_power), _int(status_size))):
+            _deref(status)[index] = self.ram_power[index]
+        return Err.SUCCESS
+
+    def NRFJPROG_is_ram_powered(self, status, status_size, number, size):
+        error = self.NRFJPROG_read_ram_sections_power_status(status, status_size)
+        if error:
+            return error
+        _out(number, len(self.ram_power))
+        _out(size, self.ram_section_size)
+        return Err.SUCCESS
+
+    def NRFJPROG_power_ram_all(self):
+        error = self._check()
+        if error:
+            return error
+        self.ram_power = [API.RamPower.ON] * len(self.ram_power)
+        return Err.SUCCESS
+
+    def NRFJPROG_unpower_ram_section(self, section_index):
+        error = self._check()
+        if error:
+            return error
+        section_index = _int(section_index)
+        if section_index >= len(self.ram_power):
+            return Err.INVALID_PARAMETER
+        self.ram_power[section_index] = API.RamPower.OFF
+        self.ram[section_index * self.ram_section_size:(section_index + 1) * self.ram_section_size] = bytearray(self.ram_section_size)
+        return Err.SUCCESS
+
+    def NRFJPROG_read_cpu_register(self, register_name, value):
+        error = self._check()
+        if error:
+            return error
+        _out(value, self.cpu_registers[API.CpuRegister(_int(register_name))])
+        return Err.SUCCESS
+
+    def NRFJPROG_write_cpu_register(self, register_name, value):
+        error = self._check()
+        if error:
+            return error
+        self.cpu_registers[API.CpuRegister(_int(register_name))] = _int(value)
+        return Err.SUCCESS
+
+    def NRFJPROG_read_device_version(self, version):
+        error = self._check(protection=False)
+        if error:
+            return error
+        _out(version, self.device_version)
+        return Err.SUCCESS
+
+    def NRFJPROG_read_device_family(self, family):
+        error = self._check(protection=False)
+        if error:
+            return error
+        _out(family, self.device_family)
+        return Err.SUCCESS
+
+    def NRFJPROG_read_debug_port_register(self, addr, data):
+        error = self._check(protection=False)
+        if error:
+            return error
+        _out(data, self.debug_port_registers.get(_int(addr), 0))
+        return Err.SUCCESS
+
+    def NRFJPROG_write_debug_port_register(self, addr, data):
+        error = self._check(protection=False)
+        if error:
+            return error
+        self.debug_port_registers[_int(addr)] = _int(data)
+        return Err.SUCCESS
+
+    def NRFJPROG_read_access_port_register(self, ap_index, addr, data):
+        error = self._check(protection=False)
+        if error:
+            return error
+        _out(data, self.access_port_registers.get((_int(ap_index), _int(addr)), 0))
+        return Err.SUCCESS
+
+    def NRFJPROG_write_access_port_register(self, ap_index, addr, data):
+        error = self._check(protection=False)
+        if error:
+            return error
+        self.access_port_registers[(_int(ap_index), _int(addr))] = _int(data)
+        return Err.SUCCESS
+
+    def NRFJPROG_is_rtt_started(self, started):
+        error = self._check()
+        if error:
+            return error
+        _out(started, self.rtt_started)
+        return Err.SUCCESS
+
+    def NRFJPROG_rtt_set_control_block_address(self, addr):
+        return self._check()
+
+    def NRFJPROG_rtt_start(self):
+        error = self._check()
+        if error:
+            return error
+        self.rtt_started = True
+        return Err.SUCCESS
+
+    def NRFJPROG_rtt_is_control_block_found(self, is_control_block_found):
+        error = self._check()
+        if error:
+            return error
+        _out(is_control_block_found, self.rtt_started)
+        return Err.SUCCESS
+
+    def NRFJPROG_rtt_stop(self):
+        error = self._check()
+        if error:
+            return error
+        self.rtt_started = False
+        return Err.SUCCESS
+
+    def NRFJPROG_rtt_read(self, channel_index, data, data_len, data_read):
+        error = self._check_rtt(channel_index)
+        if error:
+            return error
+        up = self.rtt_channels[_int(channel_index)][1]
+        chunk = bytes(up[:_int(data_len)])
+        del up[:len(chunk)]
+        self._delay(len(chunk))
+        _store(data, chunk)
+        _out(data_read, len(chunk))
+        return Err.SUCCESS
+
+    def NRFJPROG_rtt_write(self, channel_index, data, data_len, data_written):
+        error = self._check_rtt(channel_index)
+        if error:
+            return error
+        name, up, up_size, down, down_size = self.rtt_channels[_int(channel_index)]
+        chunk = _load(data, min(_int(data_len), max(0, down_size - 1 - len(down))))
+        down.extend(chunk)
+        self._delay(len(chunk))
+        _out(data_written, len(chunk))
+        return Err.SUCCESS
+
+    def NRFJPROG_rtt_read_channel_count(self, down_channel_number, up_channel_number):
+        error = self._check_rtt(0)
+        if error:
+            return error
+        _out(down_channel_number, len(self.rtt_channels))
+        _out(up_channel_number, len(self.rtt_channels))
+        return Err.SUCCESS
+
+    def NRFJPROG_rtt_read_channel_info(self, channel_index, direction, name, name_len, size):
+        error = self._check_rtt(channel_index)
+        if error:
+            return error
+        channel = self.rtt_channels[_int(channel_index)]
+        _store(name, channel[0].encode('ascii')[:_int(name_len) - 1] + b'\0')
+        _out(size, channel[2] if _int(direction) == API.RTTChannelDirection.UP_DIRECTION else channel[4])
+        return Err.SUCCESS
+
+    def NRFJPROG_is_qspi_init(self, initialized):
+        error = self._check()
+        if error:
+            return error
+        _out(initialized, self.qspi_initialized)
+        return Err.SUCCESS
+
+    def NRFJPROG_qspi_init(self, retain_ram, qspi_init_params):
+        error = self._check()
+        if error:
+            return error
+        if self.qspi_initialized:
+            return Err.INVALID_OPERATION
+        self.qspi_initialized = True
+        return Err.SUCCESS
+
+    def NRFJPROG_qspi_uninit(self):
+        error = self._check_qspi()
+        if error:
+            return error
+        self.qspi_initialized = False
+        return Err.SUCCESS
+
+    def NRFJPROG_qspi_read(self, addr, data, data_len):
+        error = self._check_qspi()
+        if error:
+            return error
+        addr, data_len = _int(addr), _int(data_len)
+        if addr + data_len > len(self.qspi):
+            return Err.INVALID_PARAMETER
+        self._delay(data_len)
+        _store(data, self.qspi[addr:addr + data_len])
+        return Err.SUCCESS
+
+    def NRFJPROG_qspi_write(self, addr, data, data_len):
+        error = self._check_qspi()
+        if error:
+            return error
+        addr, data_len = _int(addr), _int(data_len)
+        if addr + data_len > len(self.qspi):
+            return Err.INVALID_PARAMETER
+        self._delay(data_len)
+        _program(self.qspi, addr, _load(data, data_len))
+        return Err.SUCCESS
+
+    def NRFJPROG_qspi_erase(self, addr, length):
+        error = self._check_qspi()
+        if error:
+            return error
+        addr, length = _int(addr), _int(length)
+        if length == API.QSPIEraseLen.ERASEALL:
+            addr, size = 0, len(self.qspi)
+        else:
+            size = _QSPI_ERASE_SIZES[API.QSPIEraseLen(length)]
+        if addr % size or addr + size > len(self.qspi):
+            return Err.INVALID_PARAMETER
+        self._delay(0)
+        self.qspi[addr:addr + size] = bytearray(b'\xFF') * size
+        return Err.SUCCESS
+
+    def NRFJPROG_qspi_custom(self, code, length, data_in, data_out):
+        error = self._check_qspi()
+        if error:
+            return error
+        self._delay(_int(length))
+        _store(data_out, bytearray(8))
+        return Err.SUCCESS
+
+    """
+    Simulation.
+
+    """
+    def _check(self, device=True, protection=True):
+        """
+        Returns the error code for a call that needs the emulator, the device or unprotected memory access, or SUCCESS. Each call is counted and takes call_latency.
+
+        """
+        self.calls += 1
+        if self.call_latency:
+            self._delay(0)
+        if not self.dll_open:
+            return Err.INVALID_OPERATION
+        if not self.emu_connected:
+            return Err.EMULATOR_NOT_CONNECTED
+        if device:
+            self.device_connected = True
+            if protection and self.protection != API.ReadbackProtection.NONE:
+                return Err.NOT_AVAILABLE_BECAUSE_PROTECTION
+        return Err.SUCCESS
+
+    def _check_rtt(self, channel_index):
+        error = self._check()
+        if error:
+            return error
+        if not self.rtt_started:
+            return Err.INVALID_OPERATION
+        if _int(channel_index) >= len(self.rtt_channels):
+            return Err.INVALID_PARAMETER
+        return Err.SUCCESS
+
+    def _check_qspi(self):
+        error = self._check()
+        if error:
+            return error
+        if not self.qspi_initialized:
+            return Err.INVALID_OPERATION
+        return Err.SUCCESS
+
+    def _delay(self, length):
+        """
+        Blocks for the time a call transferring length bytes takes. The delays are accumulated and slept in batches, so that the average throughput is right even for calls shorter than the resolution of time.sleep().
+
+        """
+        duration = self.call_latency + (length / self.swd_bytes_per_second if self.swd_bytes_per_second else 0.0)
+        if duration <= 0:
+            return
+        now = time.time()
+        self._busy_until = max(self._busy_until, now) + duration
+        if self._busy_until - now > 0.001:
+            time.sleep(self._busy_until - now)
+
+    def _memory(self, addr, length):
+        """
+        Returns the (bytearray, offset) of the memory that holds length bytes at addr, or None if they are not all in one memory.
+
+        """
+        for base, memory in [(0, self.flash), (_FICR_ADDR, self.ficr), (_UICR_ADDR, self.uicr), (_RAM_ADDR, self.ram)]:
+            if base <= addr and addr + length <= base + len(memory):
+                return memory, addr - base
+        return None
+
+    def _read_memory(self, addr, length):
+        if addr >= _PERIPHERAL_ADDR and addr % 4 == 0 and length % 4 == 0:
+            return struct.pack('<{}I'.format(length // 4), *[self._read_register(addr + offset) for offset in range(0, length, 4)])
+
+        memory = self._memory(addr, length)
+        if memory is None:
+            return None
+        memory, offset = memory
+        return memory[offset:offset + length]
+
+    def _write_memory(self, addr, data, control):
+        if addr >= _PERIPHERAL_ADDR and addr % 4 == 0 and len(data) % 4 == 0:
+            for offset, value in zip(range(0, len(data), 4), struct.unpack('<{}I'.format(len(data) // 4), data)):
+                self._write_register(addr + offset, value)
+            return Err.SUCCESS
+
+        memory = self._memory(addr, len(data))
+        if memory is None or memory[0] is self.ficr:
+            return Err.INVALID_PARAMETER
+        memory, offset = memory
+
+        if memory is self.ram:
+            memory[offset:offset + len(data)] = data
+        elif control or self.registers.get(_NVMC_CONFIG_ADDR) == _NVMC_WEN:
+            _program(memory, offset, data)
+            self.flash_word_writes += (offset + len(data) + 3) // 4 - offset // 4
+        else:
+            return Err.NVMC_ERROR
+        return Err.SUCCESS
+
+    def _read_register(self, addr):
+        if addr == _NVMC_READY_ADDR:
+            return 1
+        return self.registers.get(addr, 0)
+
+    def _write_register(self, addr, value):
+        self.registers[addr] = value
+        if self.registers.get(_NVMC_CONFIG_ADDR) != _NVMC_EEN:
+            return
+        if addr == _NVMC_ERASEPAGE_ADDR and value < len(self.flash):
+            self._erase_page(value)
+        elif addr == _NVMC_ERASEALL_ADDR and value == 1:
+            self._erase_all()
+        elif addr == _NVMC_ERASEUICR_ADDR and value == 1:
+            self.uicr[:] = bytearray(b'\xFF') * _INFO_SIZE
+
+    def _erase_page(self, addr):
+        page = addr - addr % self.page_size
+        self.flash[page:page + self.page_size] = bytearray(b'\xFF') * self.page_size
+
+    def _erase_all(self):
+        self.flash[:] = bytearray(b'\xFF') * len(self.flash)
+        self.uicr[:] = bytearray(b'\xFF') * _INFO_SIZE
+        self.protection = API.ReadbackProtection.NONE
+
+    def _reset(self):
+        error = self._check()
+        if error:
+            return error
+        self._loader = None
+        self.halted = False
+        self.registers = {}
+        return Err.SUCCESS
+
+    def _start_cpu(self):
+        """
+        Starts the CPU at PC. The CRC32 routine of API.verify_image() runs to its breakpoint at once and the flash loader of API.program_image() is serviced on every later is_halted() and read call, any other code runs until halted. Both routines are recognized by their code and replaced by Python equivalents, their machine code is not executed.
+
+        """
+        self.halted = False
+        pc = self.cpu_registers[API.CpuRegister.R15]
+        r0 = self.cpu_registers[API.CpuRegister.R0]
+
+        if self._code_at(pc, API.CRC32_STUB):
+            blocks_addr, block_count, table_addr = [self.cpu_registers[register] for register in (API.CpuRegister.R0, API.CpuRegister.R1, API.CpuRegister.R2)]
+            for index in range(block_count):
+                address, length = struct.unpack('<II', self._read_memory(blocks_addr + 12 * index, 8))
+                self._write_memory(blocks_addr + 12 * index + 8, struct.pack('<I', zlib.crc32(bytes(self._read_memory(address, length))) & 0xFFFFFFFF), False)
+            self.halted = True
+        elif self._code_at(pc, API.FLASH_LOADER_STUB):
+            config_addr, ready_addr = struct.unpack('<II', self._read_memory(r0 + 32, 8))
+            self._write_register(config_addr, _NVMC_WEN)
+            self._loader = [r0, r0, config_addr]
+
+        return Err.SUCCESS
+
+    def _code_at(self, pc, code):
+        return self._read_memory(pc, len(code)) == bytearray(code)
+
+    def _step_loader(self):
+        """
+        Programs the chunks queued for the flash loader, alternating between its two descriptors and skipping erased words like the loader does.
+
+        """
+        while self._loader is not None:
+            base, descriptor, config_addr = self._loader
+            state, address, length, buffer_addr = struct.unpack('<4I', self._read_memory(descriptor, 16))
+            if state == 0:
+                return
+            if state != 1:
+                self._write_register(config_addr, 0)
+                self._loader = None
+                self.halted = True
+                return
+
+            data = bytes(self._read_memory(buffer_addr, length))
+            for offset in range(0, length, 4):
+                if data[offset:offset + 4] != b'\xFF\xFF\xFF\xFF':
+                    self._write_memory(address + offset, data[offset:offset + 4], False)
+            self._write_memory(descriptor, struct.pack('<I', 0), False)
+            self._loader[1] = base + 16 if descriptor == base else base
+
+
+def _deref(arg):
+    """
+    Returns the ctypes object passed by reference with ctypes.byref() or directly.
+
+    """
+    return getattr(arg, '_obj', arg)
+
+
+def _int(arg):
+    return int(getattr(arg, 'value', arg))
+
+
+def _out(arg, value):
+    _deref(arg).value = value
+
+
+def _load(arg, length):
+    return ctypes.string_at(ctypes.addressof(_deref(arg)), length)
+
+
+def _store(arg, data):
+    data = bytes(data)
+    ctypes.memmove(ctypes.addressof(_deref(arg)), data, len(data))
+
+
+def _program(memory, offset, data):
+    """
+    Programs data into flash memory, which can only clear bits.
+
+    """
+    old = memory[offset:offset + len(data)]
+    if old.count(b'\xFF') == len(old):
+        memory[offset:offset + len(data)] = data
+    else:
+        memory[offset:offset + len(data)] = bytearray(a & b for a, b in zip(old, bytearray(data)))
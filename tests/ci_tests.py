@@ -4,12 +4,36 @@ Tests that can be run without a connected nRF5 device.
 Note: We have a large test framework internally that runs our tests on nRF5 devices - yet to be open sourced.
 """
 
+import ctypes
+import hashlib
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
-from pynrfjprog import API, JLink, MultiAPI
+from pynrfjprog import API, GangProgrammer, Hex, JLink, MemoryDump, MultiAPI, RTT, Simulator
+
+try:
+    import asyncio
+    from pynrfjprog import AsyncMultiAPI
+except (ImportError, SyntaxError):
+    AsyncMultiAPI = None
 
 JLINK_DUMMY_PATH = 'DUMMY'
 
+HEX_FILE_CONTENTS = """:020000040000FA
+:10000000000102030405060708090A0B0C0D0E0F78
+:10001000101112131415161718191A1B1C1D1E1F68
+:0400000500001000E7
+:02000004100AE0
+:04001400FFFFFFFFEC
+:00000001FF
+"""
+
 class CITests(unittest.TestCase):
     """
     This class will run pynrfjprog's continuous integration tests.
@@ -25,10 +49,36 @@ class CITests(unittest.TestCase):
         pass
 
     def setUp(self):
-        pass
+        self.tmp_dir = tempfile.mkdtemp()
 
     def tearDown(self):
-        pass
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_hex_file(self, contents):
+        path = os.path.join(self.tmp_dir, 'test.hex')
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def _write_elf_file(self, build_id, symbol, address):
+        """
+        Writes a little-endian ELF32 file with only a GNU build ID note, a symbol table with one symbol and its string table.
+
+        """
+        note = struct.pack('<III', 4, len(build_id), 3) + b'GNU\0' + build_id
+        symtab = b'\0' * 16 + struct.pack('<IIIBBH', 1, address, 0, 0, 0, 0)
+        strtab = b'\0' + symbol + b'\0'
+        offset = 52
+        headers = [struct.pack('<10I', *[0] * 10)]
+        for type, data, link, entsize in [(7, note, 0, 0), (2, symtab, 3, 16), (3, strtab, 0, 0)]:
+            headers.append(struct.pack('<10I', 0, type, 0, 0, offset, len(data), link, 0, 4, entsize))
+            offset += len(data)
+        header = b'\x7fELF\x01\x01\x01' + b'\0' * 9 + struct.pack('<HHIIIIIHHHHHH', 2, 40, 1, 0, 0, offset, 0, 52, 0, 0, 40, len(headers), 0)
+
+        path = os.path.join(self.tmp_dir, 'firmware.elf')
+        with open(path, 'wb') as f:
+            f.write(header + note + symtab + strtab + b''.join(headers))
+        return path
     
     def test_can_create_API_instance(self):
         api = API.API('NRF52', jlink_arm_dll_path=JLINK_DUMMY_PATH)
@@ -36,6 +86,478 @@ class CITests(unittest.TestCase):
     def test_can_create_MultiAPI_instance(self):
         api = MultiAPI.MultiAPI('NRF52', jlink_arm_dll_path=JLINK_DUMMY_PATH)
 
+    @unittest.skipIf(sys.platform.startswith('win'), 'Needs the symbols of the running process.')
+    def test_hot_functions_are_prototyped(self):
+        class Library(ctypes.CDLL):
+            def __getitem__(self, name):
+                # Stands in for the nrfjprog DLL with abs() from the C library, only the prototypes are checked.
+                return ctypes.CDLL.__getitem__(self, 'abs' if name.startswith('NRFJPROG_') else name)
+
+        api = API.API('NRF52', backend=Library(None))
+        self.assertEqual(list(api._write_u32_thunk.argtypes), API.NRFJPROG_PROTOTYPES['NRFJPROG_write_u32'][1])
+        self.assertRaises(ctypes.ArgumentError, api._read_u32_thunk, 'addr', None)
+        self.assertRaises(ctypes.ArgumentError, api._write_u32_thunk, 0x20000000, 'data', False)
+
+    def test_hex_parse(self):
+        hex_file = Hex.Hex(self._write_hex_file(HEX_FILE_CONTENTS))
+        segments = [(segment.address, segment.data) for segment in hex_file]
+        self.assertEqual(segments, [(0x0, bytearray(range(32))), (0x100A0014, bytearray(b'\xFF' * 4))])
+        self.assertEqual(hex_file.start_address, 0x1000)
+
+    def test_hex_iter_segments(self):
+        path = self._write_hex_file(HEX_FILE_CONTENTS)
+        self.assertEqual([(segment.address, segment.length) for segment in Hex.iter_segments(path)], [(0x0, 32), (0x100A0014, 4)])
+
+    def test_hex_cache(self):
+        path = self._write_hex_file(HEX_FILE_CONTENTS)
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        cache = Hex.HexCache(cache_dir=cache_dir)
+        self.assertIs(cache.load(path), cache.load(path))
+
+        hex_file = Hex.HexCache(cache_dir=cache_dir).load(path)
+        self.assertEqual([(segment.address, bytes(segment.data)) for segment in hex_file], [(segment.address, bytes(segment.data)) for segment in Hex.Hex(path)])
+        self.assertEqual(hex_file.start_address, 0x1000)
+
+        cache_file = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        for size in [os.path.getsize(cache_file) - 1, 20, 0]:
+            with open(cache_file, 'r+b') as f:
+                f.truncate(size)
+            hex_file = Hex.HexCache(cache_dir=cache_dir).load(path)
+            self.assertEqual([(segment.address, bytes(segment.data)) for segment in hex_file], [(segment.address, bytes(segment.data)) for segment in Hex.Hex(path)])
+
+        shutil.rmtree(cache_dir)
+        errors = []
+
+        def load(cache):
+            try:
+                cache.load(path)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=load, args=(Hex.HexCache(cache_dir=cache_dir),)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((errors, os.listdir(cache_dir)), ([], [os.path.basename(cache_file)]))
+
+        cache = Hex.HexCache(cache_dir=cache_dir)
+        shutil.rmtree(cache_dir)
+        self.assertEqual(cache.load(path).start_address, 0x1000)
+
+    def test_hex_checksum_error(self):
+        with self.assertRaises(ValueError):
+            Hex.Hex(self._write_hex_file(HEX_FILE_CONTENTS.replace('0F78', '0F79')))
+        for record in [':0100000400FB', ':0000000200FE']:
+            with self.assertRaises(ValueError):
+                Hex.Hex(self._write_hex_file(record + '\n' + HEX_FILE_CONTENTS))
+
+    def test_memory_dump(self):
+        class MemoryReader(object):
+            def read_into(self, addr, buf):
+                buf[:] = bytearray((addr + i) & 0xFF for i in range(len(buf)))
+
+        path = os.path.join(self.tmp_dir, 'dump.bin')
+        regions = MemoryDump.dump_regions(MemoryReader(), path, [('flash', 0x0, 0x3000), ('ram', 0x20000000, 0x100)], chunk_size=0x1000)
+        self.assertEqual([region.name for region in regions], ['flash', 'ram'])
+
+        with MemoryDump.MemoryDump(path) as dump:
+            self.assertEqual(dump.verify(), [])
+            self.assertEqual(bytes(dump['flash'][0x1FFE:0x2002]), b'\xfe\xff\x00\x01')
+            self.assertEqual(bytes(dump.read(0x20000010, 2)), b'\x10\x11')
+            view = dump.read(0x20000000, 4)
+        self.assertEqual(dump.regions, [])
+
+    def test_rtt_ring_buffer(self):
+        ring_buffer = RTT.RingBuffer(8)
+        ring_buffer.write(b'abcdef')
+        self.assertEqual(ring_buffer.read(4), b'abcd')
+        ring_buffer.write(b'ghijklmn')
+        self.assertEqual(ring_buffer.overflow_bytes, 2)
+        self.assertEqual(ring_buffer.read(), b'ghijklmn')
+
+    def test_rtt_framers(self):
+        line_framer = RTT.LineFramer()
+        data = u'\u00e9t\u00e9\nhiver\n'.encode('utf-8')
+        self.assertEqual(line_framer.feed(data[:2]), [])
+        self.assertEqual(line_framer.feed(data[2:]), [u'\u00e9t\u00e9', u'hiver'])
+
+        line_framer = RTT.LineFramer(encoding=None, keepends=True)
+        self.assertEqual([line for i in range(1000) for line in line_framer.feed(b'ab\n' if i % 500 == 499 else b'ab')], [b'ab' * 500 + b'\n'] * 2)
+
+        cobs_framer = RTT.COBSFramer()
+        data = RTT.COBSFramer.encode(b'\x11\x00\x22') + RTT.COBSFramer.encode(b'\x00')
+        self.assertEqual(data, b'\x02\x11\x02\x22\x00\x01\x01\x00')
+        self.assertEqual(cobs_framer.feed(data[:3]), [])
+        self.assertEqual(cobs_framer.feed(data[3:]), [b'\x11\x00\x22', b'\x00'])
+
+        length_framer = RTT.LengthPrefixFramer(max_length=8)
+        data = length_framer.encode(b'abc') + length_framer.encode(b'') + length_framer.encode(bytearray(b'defgh'))
+        self.assertEqual(data, b'\x03\x00abc\x00\x00\x05\x00defgh')
+        self.assertEqual(length_framer.feed(data[:1]), [])
+        self.assertEqual(length_framer.feed(memoryview(data)[1:9]), [b'abc', b''])
+        self.assertEqual(length_framer.feed(data[9:]), [b'defgh'])
+        self.assertRaises(ValueError, length_framer.encode, b'123456789')
+        self.assertRaises(ValueError, length_framer.feed, b'\x09\x00')
+        self.assertEqual(length_framer.feed(b'\x01\x00x'), [b'x'])
+
+    def test_rtt_stream(self):
+        simulator = Simulator.Simulator()
+        with API.API('NRF52', backend=simulator) as api:
+            api.connect_to_emu_without_snr()
+            api.rtt_start()
+            stream = RTT.RTTStream(api, min_interval=0.001, max_interval=0.01)
+            stream.start()
+            try:
+                simulator.target_rtt_write(0, b'first\nsec')
+                simulator.target_rtt_write(0, b'ond\n')
+                data = b''
+                deadline = time.time() + 5.0
+                while len(data) < 13 and time.time() < deadline:
+                    data += stream.read(0, timeout=0.1)
+                self.assertEqual(data, b'first\nsecond\n')
+
+                stream.write(0, b'hi')
+                received = b''
+                while len(received) < 2 and time.time() < deadline:
+                    received += simulator.target_rtt_read(0)
+                    time.sleep(0.001)
+                self.assertEqual(received, b'hi')
+            finally:
+                stream.stop()
+            self.assertEqual(stream.stats(0).bytes_received, 13)
+            self.assertIsNone(stream.error)
+
+    def test_rtt_find_control_block(self):
+        class MemoryReader(object):
+            def read_into(self, addr, buf):
+                memory = bytearray(0x1000)
+                memory[0x100:0x10A] = b'SEGGER RTT'
+                memory[0x7F8:0x810] = b'SEGGER RTT\0\0\0\0\0\0\x03\0\0\0\x03\0\0\0'
+                buf[:] = memory[addr - RTT.RAM_START:addr - RTT.RAM_START + len(buf)]
+
+        self.assertEqual(RTT.find_control_block(MemoryReader(), ram_size=0x1000, chunk_size=0x800), RTT.RAM_START + 0x7F8)
+
+    def test_rtt_start_with_cache(self):
+        class ReadCounter(object):
+            def __init__(self, api):
+                self.api = api
+                self.reads = 0
+
+            def read_into(self, addr, buf):
+                self.reads += 1
+                return self.api.read_into(addr, buf)
+
+            def __getattr__(self, name):
+                return getattr(self.api, name)
+
+        header = b'SEGGER RTT\0\0\0\0\0\0\x02\0\0\0\x02\0\0\0'
+        cache_path = os.path.join(self.tmp_dir, 'rtt.json')
+        with API.API('NRF52', backend=Simulator.Simulator()) as api:
+            api.connect_to_emu_without_snr()
+            api.write(RTT.RAM_START + 0x1000, header, False)
+
+            counter = ReadCounter(api)
+            self.assertEqual(RTT.start_rtt(counter, build_id='build', cache=RTT.ControlBlockCache(cache_path), ram_size=0x10000), RTT.RAM_START + 0x1000)
+            self.assertGreater(counter.reads, 0)
+
+            counter = ReadCounter(api)
+            self.assertEqual(RTT.start_rtt(counter, build_id='build', cache=RTT.ControlBlockCache(cache_path), ram_size=0x10000), RTT.RAM_START + 0x1000)
+            self.assertEqual(counter.reads, 0)
+
+            api.write(RTT.RAM_START + 0x1000, bytes(bytearray(len(header))), False)
+            api.write(RTT.RAM_START + 0x2000, header, False)
+            counter = ReadCounter(api)
+            self.assertEqual(RTT.start_rtt(counter, build_id='build', cache=RTT.ControlBlockCache(cache_path), ram_size=0x10000), RTT.RAM_START + 0x2000)
+            self.assertGreater(counter.reads, 0)
+            self.assertEqual(RTT.ControlBlockCache(cache_path).get('build'), RTT.RAM_START + 0x2000)
+
+            elf_path = self._write_elf_file(b'\x12\x34\xab\xcd', b'_SEGGER_RTT', RTT.RAM_START + 0x2000)
+            self.assertEqual(RTT.firmware_build_id(elf_path), '1234abcd')
+            self.assertEqual(RTT.find_control_block_in_elf(elf_path), RTT.RAM_START + 0x2000)
+            counter = ReadCounter(api)
+            self.assertEqual(RTT.start_rtt(counter, firmware_path=elf_path, cache=RTT.ControlBlockCache(cache_path)), RTT.RAM_START + 0x2000)
+            self.assertEqual(counter.reads, 0)
+            self.assertEqual(RTT.ControlBlockCache(cache_path).get('1234abcd'), RTT.RAM_START + 0x2000)
+
+        self.assertEqual(RTT.firmware_build_id(self._write_hex_file(HEX_FILE_CONTENTS)), hashlib.sha1(HEX_FILE_CONTENTS.encode('ascii')).hexdigest())
+        self.assertEqual(os.listdir(self.tmp_dir).count('rtt.json'), 1)
+        self.assertEqual([name for name in os.listdir(self.tmp_dir) if name.endswith('.tmp')], [])
+
+    def test_simulator_program_image(self):
+        # The simulator replaces the Thumb code of the flash loader and of the CRC32 routine with Python equivalents, so the machine code itself is not covered by these tests.
+        image = bytes(bytearray(i & 0xFF for i in range(0x2003)))
+        simulator = Simulator.Simulator()
+        with API.API('NRF52', backend=simulator) as api:
+            api.connect_to_emu_without_snr()
+            self.assertEqual(api.program_image([(0x1001, image), (0x10001080, b'\x01\x02\x03\x04')], ram_loader=True), len(image) + 4)
+            self.assertEqual(bytes(api.read(0x1001, len(image), True)), image)
+            writes = []
+            api.write = lambda *args: writes.append(args)
+            self.assertEqual(api.diff_program_image([(0x1001, image), (0x10001080, b'\x01\x02\x03\x04')]), (0, 3))
+            self.assertEqual(writes, [])
+            del api.write
+            api.verify_image([(0x1001, image)])
+            self.assertRaises(API.VerifyError, api.verify_image, [(0x1001, image[:-1] + b'\x00')])
+
+            self.assertRaises(ValueError, api.program_image, [(0x8000, image)], ram_loader=0)
+            self.assertRaises(ValueError, api.program_image, [(0x8000, image)], ram_loader=0x10001000)
+            self.assertRaises(ValueError, api.verify_image, [(0x1001, image)], ram_addr=0x0)
+
+            flash_word_writes = simulator.flash_word_writes
+            api.program_image([(0x8000, b'\x01' * 8 + b'\xFF' * 0x100 + b'\x02' * 8)], ram_loader=True)
+            self.assertEqual(simulator.flash_word_writes - flash_word_writes, 4)
+
+    def test_simulator_rtt_and_qspi(self):
+        simulator = Simulator.Simulator()
+        with API.API('NRF52', backend=simulator) as api:
+            api.connect_to_emu_without_snr()
+            api.rtt_start()
+            simulator.target_rtt_write(0, b'hello')
+            self.assertEqual(api.rtt_read_all(), {0: b'hello'})
+            self.assertEqual(api.rtt_write(0, b'hi', None), 2)
+            self.assertEqual(simulator.target_rtt_read(0), b'hi')
+
+            api.qspi_init()
+            api.qspi_program_image(0x1234, b'\xAA' * 0x2000)
+            self.assertEqual(bytes(api.qspi_read(0x1000, 0x236)), b'\xFF' * 0x234 + b'\xAA\xAA')
+
+    def test_qspi_read_chunks(self):
+        data = bytearray(i * 7 & 0xFF for i in range(0x1100))
+        with API.API('NRF52', backend=Simulator.Simulator()) as api:
+            api.connect_to_emu_without_snr()
+            api.qspi_init()
+            api.qspi_write(0x1000, data)
+            expected = bytes(api.qspi_read(0x1010, 0x1003))
+            self.assertEqual([len(chunk) for chunk in api.qspi_read_chunks(0x1010, 0x1003, 0x400)], [0x400, 0x400, 0x400, 0x400, 0x3])
+            self.assertEqual(b''.join(bytes(chunk) for chunk in api.qspi_read_chunks(0x1010, 0x1003, 0x400)), expected)
+
+        with MultiAPI.MultiAPI('NRF52', backend=Simulator.Simulator()) as api:
+            api.connect_to_emu_without_snr()
+            api.qspi_init()
+            api.qspi_write(0x1000, data)
+            self.assertEqual(b''.join(bytes(chunk) for chunk in api.qspi_read_chunks(0x1010, 0x1003, 0x400)), expected)
+
+        if AsyncMultiAPI is None:
+            return
+
+        def read_chunks(api, chunk_size):
+            chunks = api.qspi_read_chunks(0x1010, 0x1003, chunk_size)
+            data = b''
+            while True:
+                try:
+                    data += bytes(loop.run_until_complete(chunks.__anext__()))
+                except StopAsyncIteration:
+                    return data
+
+        loop = asyncio.new_event_loop()
+        api = AsyncMultiAPI.AsyncMultiAPI('NRF52', backend=Simulator.Simulator())
+        try:
+            loop.run_until_complete(api.open())
+            loop.run_until_complete(api.connect_to_emu_without_snr())
+            loop.run_until_complete(api.qspi_init())
+            loop.run_until_complete(api.qspi_write(0x1000, data))
+            self.assertEqual(read_chunks(api, 0x400), expected)
+        finally:
+            loop.run_until_complete(api.terminate())
+            loop.close()
+
+    def test_multiapi_round_trip(self):
+        progress = []
+        image = bytes(bytearray(i & 0xFF for i in range(MultiAPI.MultiAPI._SHARED_BUFFER_SIZE + 0x1003)))
+        with MultiAPI.MultiAPI('NRF52', backend=Simulator.Simulator()) as api:
+            api.connect_to_emu_without_snr()
+            self.assertEqual(api.read_device_version(), 'NRF52832_xxAA_REV1')
+            self.assertTrue(api.is_connected_to_emu())
+            self.assertIsNone(api.write_u32(0x20000000, 0xFFFFFFFF, False))
+            self.assertEqual(api.read_u32(0x20000000), 0xFFFFFFFF)
+
+            self.assertEqual(api.program_image([(0x1, image)], on_progress=progress.append), len(image))
+            self.assertEqual([(p.bytes_done, p.bytes_total) for p in progress[-1:]], [(len(image), len(image))])
+            self.assertEqual(bytes(api.read(0x1, len(image), True)), image)
+            buf = bytearray(0x10)
+            api.read_into(0x20000000, buf)
+            self.assertEqual(bytes(buf[:4]), b'\xFF' * 4)
+
+            with self.assertRaises(API.APIError):
+                api.read(0x30000000, 4)
+            self.assertEqual(api.read_u32(0x20000000), 0xFFFFFFFF)
+
+    def test_read_write_u32_many(self):
+        simulator = Simulator.Simulator()
+        with API.API('NRF52', backend=simulator) as api:
+            api.connect_to_emu_without_snr()
+            api.write_u32_many([(0x20000004, 2), (0x20000000, 1), (0x20000008, 3), (0x2000000C, 4), (0x20000000, 5)], False)
+            calls = simulator.calls
+            self.assertEqual(list(api.read_u32_many([0x2000000C, 0x20000000, 0x20000004, 0x20000000, 0x20000008])), [4, 5, 2, 5, 3])
+            self.assertEqual(simulator.calls - calls, 1)
+            self.assertEqual([api.read_u32(addr) for addr in range(0x20000000, 0x20000010, 4)], [5, 2, 3, 4])
+
+            self.assertRaises(ValueError, api.read_u32_many, [0x20000000, 0x20000002])
+            self.assertRaises(ValueError, api.write_u32_many, [(0x20000001, 0)], False)
+
+    def test_execute_script(self):
+        def check_script_error(context):
+            self.assertEqual((context.exception.index, context.exception.cmd, context.exception.results), (1, 'read', [7]))
+            self.assertIsInstance(context.exception.error, API.APIError)
+            self.assertEqual(context.exception.error.err_code, API.NrfjprogdllErr.INVALID_PARAMETER)
+
+        with API.API('NRF52', backend=Simulator.Simulator()) as api:
+            api.connect_to_emu_without_snr()
+            self.assertEqual(api.execute_script([('write_u32', 0x20000000, 7, False), ('read_u32', 0x20000000)]), [None, 7])
+            with self.assertRaises(API.ScriptError) as context:
+                api.execute_script([('read_u32', 0x20000000), ('read', 0x30000000, 4), ('write_u32', 0x20000000, 8, False)])
+            check_script_error(context)
+            self.assertEqual(api.read_u32(0x20000000), 7)
+
+        with MultiAPI.MultiAPI('NRF52', backend=Simulator.Simulator()) as api:
+            api.connect_to_emu_without_snr()
+            with api.batch() as batch:
+                batch.write_u32(0x20000000, 7, False)
+                batch.read_u32(0x20000000)
+            self.assertEqual(batch.results, [None, 7])
+            with self.assertRaises(API.ScriptError) as context:
+                with api.batch() as batch:
+                    batch.read_u32(0x20000000)
+                    batch.read(0x30000000, 4)
+                    batch.write_u32(0x20000000, 8, False)
+            check_script_error(context)
+            self.assertEqual(api.read_u32(0x20000000), 7)
+
+    def test_multiapi_pool(self):
+        serial_number = Simulator.DEFAULT_SERIAL_NUMBER
+        pool = MultiAPI.MultiAPIPool('NRF52', 2, backend=Simulator.Simulator())
+        try:
+            self.assertEqual(pool.enum_emu_snr(), [serial_number])
+
+            with pool.lease(serial_number) as session:
+                self.assertRaises(ValueError, pool.lease, serial_number)
+                session.write_u32(0x20000000, 0x12345678, False)
+                self.assertEqual(session.read_u32(0x20000000), 0x12345678)
+                session.disconnect_from_emu()
+                worker = session._worker
+            self.assertRaises(RuntimeError, getattr, session, 'read_u32')
+            self.assertIn(worker, pool._idle)
+
+            with pool.lease(serial_number) as session:
+                self.assertIs(session._worker, worker)
+                self.assertEqual(session.read_u32(0x20000000), 0x12345678)
+
+            self.assertRaises(API.APIError, pool.lease, serial_number + 1)
+            self.assertEqual(len(pool._idle), 2)
+        finally:
+            pool.close()
+        self.assertRaises(RuntimeError, pool.lease, serial_number)
+
+        pool = MultiAPI.MultiAPIPool('NRF52', 1, backend=Simulator.Simulator(), lazy=True)
+        try:
+            def fail():
+                raise RuntimeError('Simulated failure.')
+
+            session = pool.lease(serial_number)
+            session._worker.is_connected_to_emu = fail
+            spawn_worker, pool._spawn_worker = pool._spawn_worker, fail
+            self.assertRaises(RuntimeError, session.close)
+            self.assertEqual(pool._worker_count, 0)
+
+            pool._spawn_worker = spawn_worker
+            with pool.lease(serial_number, timeout=1) as session:
+                self.assertEqual(session.read_u32(0x20000000), 0)
+        finally:
+            pool.close()
+
+    def test_gang_programmer(self):
+        serial_number = Simulator.DEFAULT_SERIAL_NUMBER
+        image = bytearray(i & 0xFF for i in range(0x2100))
+        with GangProgrammer.GangProgrammer('NRF52', max_concurrency=4, backend=Simulator.Simulator()) as gang:
+            report = gang.program(image, 'all', verify=True)
+            self.assertEqual([(r.serial_number, r.success, r.bytes_written) for r in report.results], [(serial_number, True, len(image))])
+
+            report = gang.program([(0x0, image)], [serial_number, serial_number + 1], diff=True, verify=True)
+            self.assertEqual([(r.serial_number, r.success, r.pages_skipped) for r in report.results], [(serial_number, True, 3), (serial_number + 1, False, 0)])
+            self.assertIsInstance(report.failed[0].error, API.APIError)
+            self.assertEqual(gang._pool._worker_count, 2)
+            self.assertRaises(ValueError, gang.program, image, [serial_number, serial_number])
+
+    @unittest.skipIf(AsyncMultiAPI is None, 'AsyncMultiAPI requires Python 3.5 or later.')
+    def test_async_multiapi_cancelled_call(self):
+        loop = asyncio.new_event_loop()
+        api = AsyncMultiAPI.AsyncMultiAPI('NRF52', backend=Simulator.Simulator(call_latency=0.1))
+        try:
+            loop.run_until_complete(api.open())
+            loop.run_until_complete(api.connect_to_emu_without_snr())
+            with self.assertRaises(asyncio.TimeoutError):
+                loop.run_until_complete(asyncio.wait_for(api.read_device_version(), 0.01))
+            self.assertEqual(loop.run_until_complete(api.read_u32(0x20000000)), 0)
+            self.assertEqual(loop.run_until_complete(api.read_device_version()), API.DeviceVersion.NRF52832_xxAA_REV1.name)
+        finally:
+            loop.run_until_complete(api.terminate())
+            loop.close()
+
+    @unittest.skipIf(AsyncMultiAPI is None, 'AsyncMultiAPI requires Python 3.5 or later.')
+    def test_async_rtt_channel(self):
+        class RTTDevice(object):
+            def __init__(self, reads, write_sizes):
+                self.reads = reads
+                self.write_sizes = write_sizes
+                self.received = b''
+
+            def rtt_read_into(self, channel_index, buf):
+                data = self.reads.pop(0) if self.reads else b''
+                buf[:len(data)] = data
+                return self._done(len(data))
+
+            def rtt_write(self, channel_index, msg, encoding):
+                written = min(self.write_sizes.pop(0), len(msg))
+                self.received += msg[:written]
+                return self._done(written)
+
+            def _done(self, result):
+                future = loop.create_future()
+                future.set_result(result)
+                return future
+
+        def sleep(interval):
+            sleeps.append(interval)
+            return sleep_for_real(0)
+
+        loop = asyncio.new_event_loop()
+        sleeps = []
+        sleep_for_real, asyncio.sleep = asyncio.sleep, sleep
+        try:
+            device = RTTDevice([b'', b'', b'', b'', b'abc'], [3, 0, 0, 4, 5])
+            channel = AsyncMultiAPI.AsyncRTTChannel(device, 0, 16, 0.001, 0.004)
+            self.assertEqual(loop.run_until_complete(channel.__anext__()), b'abc')
+            self.assertEqual(sleeps, [0.001, 0.002, 0.004, 0.004])
+
+            del sleeps[:]
+            loop.run_until_complete(channel.write(bytearray(b'0123456789')))
+            self.assertEqual(device.received, b'0123456789')
+            self.assertEqual(sleeps, [0.0, 0.001, 0.002, 0.0])
+
+            channel.close()
+            self.assertRaises(StopAsyncIteration, loop.run_until_complete, channel.__anext__())
+        finally:
+            asyncio.sleep = sleep_for_real
+            loop.close()
+
+        loop = asyncio.new_event_loop()
+        api = AsyncMultiAPI.AsyncMultiAPI('NRF52', backend=Simulator.Simulator(call_latency=0.05))
+        try:
+            loop.run_until_complete(api.open())
+            loop.run_until_complete(api.connect_to_emu_without_snr())
+            loop.run_until_complete(api.write_u32(0x20000000, 0x12345678, False))
+            loop.run_until_complete(api.rtt_start())
+            channel = api.rtt_channel(0)
+            with self.assertRaises(asyncio.TimeoutError):
+                loop.run_until_complete(asyncio.wait_for(channel.__anext__(), 0.01))
+            self.assertEqual(loop.run_until_complete(api.read_u32(0x20000000)), 0x12345678)
+            loop.run_until_complete(channel.write(b'hi'))
+            self.assertTrue(loop.run_until_complete(api.rtt_is_control_block_found()))
+        finally:
+            loop.run_until_complete(api.terminate())
+            loop.close()
+
 if __name__ == '__main__':
     """
     Run the tests with specified options.